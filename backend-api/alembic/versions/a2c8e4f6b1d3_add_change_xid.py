@@ -0,0 +1,33 @@
+"""Record the writing transaction of each change feed row
+
+Revision ID: a2c8e4f6b1d3
+Revises: f1b5d9a3c7e2
+Create Date: 2026-10-23 09:14:08.305716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2c8e4f6b1d3'
+down_revision: Union[str, None] = 'f1b5d9a3c7e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CURRENT_XID = sa.text('pg_current_xact_id()::text::bigint')
+
+
+def upgrade() -> None:
+    # Existing rows get this migration's transaction id, so clients resync them once
+    for table in ('posts', 'impacts', 'deleted_records'):
+        op.add_column(table, sa.Column('change_xid', sa.BigInteger(), server_default=CURRENT_XID, nullable=False))
+        op.create_index(op.f(f'ix_{table}_change_xid'), table, ['change_xid'], unique=False)
+
+
+def downgrade() -> None:
+    for table in ('posts', 'impacts', 'deleted_records'):
+        op.drop_index(op.f(f'ix_{table}_change_xid'), table_name=table)
+        op.drop_column(table, 'change_xid')
@@ -0,0 +1,77 @@
+"""Add redactions, redacted renditions and the published file of a document
+
+Revision ID: a4d9e1c7b3f8
+Revises: f6c2a8e4d0b7
+Create Date: 2026-10-21 10:12:44.318507
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d9e1c7b3f8'
+down_revision: Union[str, None] = 'f6c2a8e4d0b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('redaction_hash', sa.String(length=64), nullable=True))
+    op.add_column('documents', sa.Column('published_sha256', sa.String(length=64), nullable=True))
+    op.add_column('documents', sa.Column('published_size', sa.BigInteger(), nullable=True))
+    # Nothing is redacted yet: every document publishes its original
+    op.execute('UPDATE documents SET published_sha256 = sha256, published_size = size')
+
+    op.create_table(
+        'redactions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('document_id', sa.Integer(), sa.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('page', sa.Integer(), nullable=False),
+        sa.Column('x', sa.Float(), nullable=False),
+        sa.Column('y', sa.Float(), nullable=False),
+        sa.Column('width', sa.Float(), nullable=False),
+        sa.Column('height', sa.Float(), nullable=False),
+        sa.Column('reason', sa.String(length=200), nullable=True),
+        sa.Column('created_by', sa.Integer(), sa.ForeignKey('users.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    )
+    op.create_index(op.f('ix_redactions_id'), 'redactions', ['id'], unique=False)
+    op.create_index(op.f('ix_redactions_document_id'), 'redactions', ['document_id'], unique=False)
+
+    op.create_table(
+        'redacted_documents',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('document_id', sa.Integer(), sa.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('redaction_hash', sa.String(length=64), nullable=False),
+        sa.Column('boxes', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(length=20), server_default='pending', nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('size', sa.BigInteger(), nullable=True),
+        sa.Column('storage_key', sa.String(length=200), nullable=True),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('available_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('rendered_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.UniqueConstraint('document_id', 'redaction_hash'),
+    )
+    op.create_index(op.f('ix_redacted_documents_id'), 'redacted_documents', ['id'], unique=False)
+    op.create_index(
+        'ix_redacted_documents_pending', 'redacted_documents', ['available_at', 'id'], unique=False,
+        postgresql_where=sa.text("status = 'pending'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_redacted_documents_pending', table_name='redacted_documents')
+    op.drop_index(op.f('ix_redacted_documents_id'), table_name='redacted_documents')
+    op.drop_table('redacted_documents')
+    op.drop_index(op.f('ix_redactions_document_id'), table_name='redactions')
+    op.drop_index(op.f('ix_redactions_id'), table_name='redactions')
+    op.drop_table('redactions')
+    op.drop_column('documents', 'published_size')
+    op.drop_column('documents', 'published_sha256')
+    op.drop_column('documents', 'redaction_hash')
@@ -0,0 +1,46 @@
+"""Add outbox_events table for publish-triggered side effects
+
+Revision ID: a7c3e9f5b2d4
+Revises: f2b8d6e4a1c9
+Create Date: 2026-10-19 18:02:44.518230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9f5b2d4'
+down_revision: Union[str, None] = 'f2b8d6e4a1c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'outbox_events',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('event_type', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('dedupe_key', sa.String(length=100), nullable=True),
+        sa.Column('status', sa.String(length=20), server_default='pending', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('completed_handlers', sa.JSON(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('available_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('last_attempt_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.UniqueConstraint('dedupe_key'),
+    )
+    op.create_index(
+        'ix_outbox_events_pending', 'outbox_events', ['available_at', 'id'],
+        unique=False, postgresql_where=sa.text("status = 'pending'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_events_pending', table_name='outbox_events')
+    op.drop_table('outbox_events')
@@ -0,0 +1,30 @@
+"""Give each uploader of a file their own document row
+
+Revision ID: b7d3f9a1c5e8
+Revises: a2c8e4f6b1d3
+Create Date: 2026-10-23 10:42:51.027364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3f9a1c5e8'
+down_revision: Union[str, None] = 'a2c8e4f6b1d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows stay as they are: they are unique per hash, so per uploader too
+    op.drop_constraint('documents_sha256_key', 'documents', type_='unique')
+    op.create_unique_constraint('documents_sha256_uploaded_by_key', 'documents', ['sha256', 'uploaded_by'])
+
+
+def downgrade() -> None:
+    # Fails while several uploaders have their own row for the same file
+    op.drop_constraint('documents_sha256_uploaded_by_key', 'documents', type_='unique')
+    op.create_unique_constraint('documents_sha256_key', 'documents', ['sha256'])
@@ -0,0 +1,51 @@
+"""Add digest_runs table for the weekly digest job
+
+Revision ID: b9d4f1a6c8e2
+Revises: a7c3e9f5b2d4
+Create Date: 2026-10-19 19:10:37.904126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d4f1a6c8e2'
+down_revision: Union[str, None] = 'a7c3e9f5b2d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'digest_runs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('week', sa.String(length=10), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('period_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('period_end', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('message', sa.JSON(), nullable=True),
+        sa.Column('checkpoint_id', sa.Integer(), nullable=False),
+        sa.Column('enqueued', sa.Integer(), nullable=False),
+        sa.Column('delivered', sa.Integer(), nullable=False),
+        sa.Column('metrics', sa.JSON(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.UniqueConstraint('week'),
+    )
+    op.create_index(op.f('ix_digest_runs_id'), 'digest_runs', ['id'], unique=False)
+    # Keyset scans over opted-in digest subscribers. push_subscriptions is created
+    # by create_all at startup, so it may not exist yet on a fresh database.
+    if 'push_subscriptions' in sa.inspect(op.get_bind()).get_table_names():
+        op.create_index(
+            'ix_push_subscriptions_weekly_digest', 'push_subscriptions', ['id'],
+            unique=False, postgresql_where=sa.text('is_active IS true AND notify_weekly_digest IS true')
+        )
+
+
+def downgrade() -> None:
+    op.execute('DROP INDEX IF EXISTS ix_push_subscriptions_weekly_digest')
+    op.drop_index(op.f('ix_digest_runs_id'), table_name='digest_runs')
+    op.drop_table('digest_runs')
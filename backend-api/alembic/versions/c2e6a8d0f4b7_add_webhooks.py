@@ -0,0 +1,67 @@
+"""Add webhooks and webhook_deliveries tables for partner notifications
+
+Revision ID: c2e6a8d0f4b7
+Revises: b9d4f1a6c8e2
+Create Date: 2026-10-19 20:14:52.117093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2e6a8d0f4b7'
+down_revision: Union[str, None] = 'b9d4f1a6c8e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'webhooks',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('url', sa.String(length=500), nullable=False),
+        sa.Column('secret', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.String(length=200), nullable=True),
+        sa.Column('event_types', sa.JSON(), nullable=False),
+        sa.Column('categories', sa.JSON(), nullable=True),
+        sa.Column('impact_types', sa.JSON(), nullable=True),
+        sa.Column('batch_size', sa.Integer(), nullable=False),
+        sa.Column('max_concurrency', sa.Integer(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('consecutive_failures', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('last_success_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('disabled_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    )
+    op.create_index(op.f('ix_webhooks_id'), 'webhooks', ['id'], unique=False)
+
+    op.create_table(
+        'webhook_deliveries',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('webhook_id', sa.Integer(), sa.ForeignKey('webhooks.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('event_key', sa.String(length=100), nullable=False),
+        sa.Column('event_type', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(length=20), server_default='pending', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('available_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('delivered_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.UniqueConstraint('webhook_id', 'event_key'),
+    )
+    op.create_index(
+        'ix_webhook_deliveries_pending', 'webhook_deliveries', ['available_at', 'id'],
+        unique=False, postgresql_where=sa.text("status = 'pending'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_deliveries_pending', table_name='webhook_deliveries')
+    op.drop_table('webhook_deliveries')
+    op.drop_index(op.f('ix_webhooks_id'), table_name='webhooks')
+    op.drop_table('webhooks')
@@ -0,0 +1,40 @@
+"""Add preview rendering state to documents
+
+Revision ID: c8f2b6d4e0a1
+Revises: a4d9e1c7b3f8
+Create Date: 2026-10-21 16:48:05.552130
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8f2b6d4e0a1'
+down_revision: Union[str, None] = 'a4d9e1c7b3f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # preview_sha256 starts out NULL, so the worker renders previews of existing documents too
+    op.add_column('documents', sa.Column('preview_sha256', sa.String(length=64), nullable=True))
+    op.add_column('documents', sa.Column('preview_attempts', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('documents', sa.Column('preview_error', sa.Text(), nullable=True))
+    op.add_column('documents', sa.Column('preview_available_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.create_index('ix_documents_published_sha256', 'documents', ['published_sha256'], unique=False)
+    op.create_index(
+        'ix_documents_preview_pending', 'documents', ['preview_available_at', 'id'], unique=False,
+        postgresql_where=sa.text('published_sha256 IS NOT NULL AND preview_sha256 IS DISTINCT FROM published_sha256')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_documents_preview_pending', table_name='documents')
+    op.drop_index('ix_documents_published_sha256', table_name='documents')
+    op.drop_column('documents', 'preview_available_at')
+    op.drop_column('documents', 'preview_error')
+    op.drop_column('documents', 'preview_attempts')
+    op.drop_column('documents', 'preview_sha256')
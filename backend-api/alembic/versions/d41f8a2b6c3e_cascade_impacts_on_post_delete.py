@@ -0,0 +1,33 @@
+"""Cascade impact deletes from posts at the database level
+
+Revision ID: d41f8a2b6c3e
+Revises: b36c3c192e3d
+Create Date: 2026-10-19 09:12:44.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f8a2b6c3e'
+down_revision: Union[str, None] = 'b36c3c192e3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Let Postgres remove a post's impacts instead of the ORM loading and deleting them
+    op.drop_constraint('impacts_post_id_fkey', 'impacts', type_='foreignkey')
+    op.create_foreign_key(
+        'impacts_post_id_fkey', 'impacts', 'posts', ['post_id'], ['id'], ondelete='CASCADE'
+    )
+    op.create_index(op.f('ix_impacts_post_id'), 'impacts', ['post_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_impacts_post_id'), table_name='impacts')
+    op.drop_constraint('impacts_post_id_fkey', 'impacts', type_='foreignkey')
+    op.create_foreign_key('impacts_post_id_fkey', 'impacts', 'posts', ['post_id'], ['id'])
@@ -0,0 +1,46 @@
+"""Add refresh_tokens table for rotating refresh tokens
+
+Revision ID: d8f3b5a1e7c6
+Revises: c2e6a8d0f4b7
+Create Date: 2026-10-19 23:05:41.630218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f3b5a1e7c6'
+down_revision: Union[str, None] = 'c2e6a8d0f4b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'refresh_tokens',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('token_hash', sa.String(length=64), nullable=False),
+        sa.Column('session_id', sa.String(length=32), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('used_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('revoked_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.UniqueConstraint('token_hash'),
+    )
+    op.create_index(op.f('ix_refresh_tokens_user_id'), 'refresh_tokens', ['user_id'], unique=False)
+    op.create_index(op.f('ix_refresh_tokens_session_id'), 'refresh_tokens', ['session_id'], unique=False)
+    op.create_index(
+        'ix_refresh_tokens_revoked_at', 'refresh_tokens', ['revoked_at'], unique=False,
+        postgresql_where=sa.text('revoked_at IS NOT NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_refresh_tokens_revoked_at', table_name='refresh_tokens')
+    op.drop_index(op.f('ix_refresh_tokens_session_id'), table_name='refresh_tokens')
+    op.drop_index(op.f('ix_refresh_tokens_user_id'), table_name='refresh_tokens')
+    op.drop_table('refresh_tokens')
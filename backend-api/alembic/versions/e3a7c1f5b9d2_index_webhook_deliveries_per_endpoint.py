@@ -0,0 +1,35 @@
+"""Index pending webhook deliveries per endpoint
+
+Revision ID: e3a7c1f5b9d2
+Revises: c8f2b6d4e0a1
+Create Date: 2026-10-22 09:31:17.204836
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a7c1f5b9d2'
+down_revision: Union[str, None] = 'c8f2b6d4e0a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The dispatcher now claims each endpoint's due deliveries separately (see app/webhooks.py)
+    op.create_index(
+        'ix_webhook_deliveries_webhook_pending', 'webhook_deliveries', ['webhook_id', 'available_at', 'id'],
+        unique=False, postgresql_where=sa.text("status = 'pending'")
+    )
+    op.drop_index('ix_webhook_deliveries_pending', table_name='webhook_deliveries')
+
+
+def downgrade() -> None:
+    op.create_index(
+        'ix_webhook_deliveries_pending', 'webhook_deliveries', ['available_at', 'id'],
+        unique=False, postgresql_where=sa.text("status = 'pending'")
+    )
+    op.drop_index('ix_webhook_deliveries_webhook_pending', table_name='webhook_deliveries')
@@ -0,0 +1,49 @@
+"""Add documents and post_documents tables for uploaded documents
+
+Revision ID: e3b7d1f5a9c2
+Revises: d8f3b5a1e7c6
+Create Date: 2026-10-20 09:12:27.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b7d1f5a9c2'
+down_revision: Union[str, None] = 'd8f3b5a1e7c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'documents',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('page_count', sa.Integer(), nullable=True),
+        sa.Column('content_type', sa.String(length=100), nullable=False),
+        sa.Column('storage_key', sa.String(length=200), nullable=False),
+        sa.Column('uploaded_by', sa.Integer(), sa.ForeignKey('users.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.UniqueConstraint('sha256'),
+    )
+    op.create_index(op.f('ix_documents_id'), 'documents', ['id'], unique=False)
+    op.create_table(
+        'post_documents',
+        sa.Column('post_id', sa.Integer(), sa.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('document_id', sa.Integer(), sa.ForeignKey('documents.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    )
+    op.create_index(op.f('ix_post_documents_document_id'), 'post_documents', ['document_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_post_documents_document_id'), table_name='post_documents')
+    op.drop_table('post_documents')
+    op.drop_index(op.f('ix_documents_id'), table_name='documents')
+    op.drop_table('documents')
@@ -0,0 +1,44 @@
+"""Track updated_at on every write and add deletion tombstones for the change feed
+
+Revision ID: e5a9c3d7f1b2
+Revises: d41f8a2b6c3e
+Create Date: 2026-10-19 11:03:27.640915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a9c3d7f1b2'
+down_revision: Union[str, None] = 'd41f8a2b6c3e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # updated_at is now set on insert too, so the feed can order by it alone
+    for table in ('posts', 'impacts'):
+        op.execute(f"UPDATE {table} SET updated_at = created_at WHERE updated_at IS NULL")
+        op.alter_column(table, 'updated_at', server_default=sa.text('now()'))
+        op.create_index(op.f(f'ix_{table}_updated_at'), table, ['updated_at'], unique=False)
+
+    op.create_table(
+        'deleted_records',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('entity_type', sa.String(length=20), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_index(op.f('ix_deleted_records_deleted_at'), 'deleted_records', ['deleted_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_deleted_records_deleted_at'), table_name='deleted_records')
+    op.drop_table('deleted_records')
+
+    for table in ('posts', 'impacts'):
+        op.drop_index(op.f(f'ix_{table}_updated_at'), table_name=table)
+        op.alter_column(table, 'updated_at', server_default=None)
@@ -0,0 +1,30 @@
+"""Index post slugs for prefix matches
+
+Revision ID: f1b5d9a3c7e2
+Revises: e3a7c1f5b9d2
+Create Date: 2026-10-22 11:05:42.917364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b5d9a3c7e2'
+down_revision: Union[str, None] = 'e3a7c1f5b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The unique index only serves LIKE 'base-%' under the C collation
+    op.create_index(
+        'ix_posts_slug_pattern', 'posts', ['slug'], unique=False,
+        postgresql_ops={'slug': 'varchar_pattern_ops'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_slug_pattern', table_name='posts')
@@ -0,0 +1,57 @@
+"""Add text extraction state to documents and the document_pages table
+
+Revision ID: f6c2a8e4d0b7
+Revises: e3b7d1f5a9c2
+Create Date: 2026-10-20 14:37:52.906114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6c2a8e4d0b7'
+down_revision: Union[str, None] = 'e3b7d1f5a9c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing documents start out pending, so the worker extracts them too
+    op.add_column('documents', sa.Column('text_status', sa.String(length=20), server_default='pending', nullable=False))
+    op.add_column('documents', sa.Column('text_pages', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('documents', sa.Column('text_attempts', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('documents', sa.Column('text_error', sa.Text(), nullable=True))
+    op.add_column('documents', sa.Column('text_available_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.add_column('documents', sa.Column('text_extracted_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(
+        'ix_documents_text_pending', 'documents', ['text_available_at', 'id'], unique=False,
+        postgresql_where=sa.text("text_status = 'pending'")
+    )
+
+    op.create_table(
+        'document_pages',
+        sa.Column('document_id', sa.Integer(), sa.ForeignKey('documents.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('page_number', sa.Integer(), primary_key=True),
+        sa.Column('text', sa.Text(), nullable=False),
+    )
+    # Lets search's ILIKE '%term%' use an index instead of scanning every page
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_document_pages_text_trgm', 'document_pages', ['text'], unique=False,
+        postgresql_using='gin', postgresql_ops={'text': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_document_pages_text_trgm', table_name='document_pages')
+    op.drop_table('document_pages')
+    op.drop_index('ix_documents_text_pending', table_name='documents')
+    op.drop_column('documents', 'text_extracted_at')
+    op.drop_column('documents', 'text_available_at')
+    op.drop_column('documents', 'text_error')
+    op.drop_column('documents', 'text_attempts')
+    op.drop_column('documents', 'text_pages')
+    op.drop_column('documents', 'text_status')
@@ -0,0 +1,270 @@
+"""
+Admission control: per-lane concurrency limits, deadlines and load shedding.
+
+Every API request is put in a lane by `classify`:
+
+- critical: writes carrying a valid access token (editor and admin work);
+- high:     single-post reads (slug and id lookups);
+- normal:   everything else, including listings and auth;
+- low:      search and deep pages (skip >= ADMISSION_DEEP_OFFSET);
+- export:   full exports, which are few but long-running;
+- upload:   document uploads and NDJSON imports, likewise.
+
+Each lane has its own slots, so a flood in one lane cannot take the capacity
+reserved for another. A request waits for a slot at most its lane's queue
+time and is otherwise refused with a fast 503 and Retry-After. Low-priority
+requests never queue, and they and exports are refused outright while
+higher lanes have requests waiting: when the database slows down they are
+shed first.
+
+Admitted requests get a deadline (arrival + the lane's budget). Each
+database transaction they start sets `statement_timeout` to the time left,
+so a slow query is cancelled when the request can no longer succeed rather
+than after the global DB_STATEMENT_TIMEOUT_MS. A request whose budget runs
+out, in the queue or in the database, gets a 503 as well.
+
+The deadline covers producing a response, not sending it: once the response
+has started a 503 is no longer possible, so the rest of the body (a streamed
+listing or export) runs without one, bounded only by DB_STATEMENT_TIMEOUT_MS.
+Work that fans out in batches from a request, such as sending a push
+notification to every subscriber, runs in `without_deadline()` for the same
+reason: its length depends on the data, not on how busy the server is.
+
+Live streams (/api/stream), document downloads and previews, health checks
+and docs bypass admission.
+"""
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from . import auth
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_DEEP_OFFSET = int(os.getenv("ADMISSION_DEEP_OFFSET", "500"))
+
+BYPASS_PREFIXES = ("/api/stream", "/health", "/docs", "/redoc", "/openapi.json")
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# NDJSON bulk imports: long, data-sized bodies written in many transactions
+IMPORT_PATHS = ("/api/posts/import", "/api/impacts/import")
+# Postgres SQLSTATE for a statement cancelled by statement_timeout
+QUERY_CANCELED = "57014"
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's budget ran out before it could finish"""
+
+
+class Lane:
+    def __init__(self, name: str, limit: int, queue_seconds: float, budget_seconds: float):
+        self.name = name
+        self.limit = int(os.getenv(f"ADMISSION_{name.upper()}_LIMIT", str(limit)))
+        self.queue_seconds = float(os.getenv(f"ADMISSION_{name.upper()}_QUEUE_SECONDS", str(queue_seconds)))
+        self.budget_seconds = float(os.getenv(f"ADMISSION_{name.upper()}_BUDGET_SECONDS", str(budget_seconds)))
+        self._slots = asyncio.Semaphore(self.limit)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting at most queue_seconds; False if the request should be shed"""
+        if not self._slots.locked():
+            await self._slots.acquire()
+        elif self.queue_seconds <= 0:
+            return False
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_seconds)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit, "active": self.active, "waiting": self.waiting,
+            "admitted": self.admitted, "shed": self.shed,
+        }
+
+
+# Sized to stay below the default threadpool of 40 threads that sync routes run in
+# (6 + 12 + 10 + 4 + 2 + 4 = 38)
+LANES: Dict[str, Lane] = {
+    "critical": Lane("critical", limit=6, queue_seconds=5, budget_seconds=30),
+    "high": Lane("high", limit=12, queue_seconds=1, budget_seconds=5),
+    "normal": Lane("normal", limit=10, queue_seconds=0.5, budget_seconds=10),
+    "low": Lane("low", limit=4, queue_seconds=0, budget_seconds=30),
+    # Budget covers the export's first rows; the rest streams without a deadline
+    "export": Lane("export", limit=2, queue_seconds=2, budget_seconds=30),
+    # Budget covers streaming a maximum-size body over a slow link; imports write
+    # their batches without a deadline (see ndjson.py)
+    "upload": Lane("upload", limit=4, queue_seconds=2, budget_seconds=900),
+}
+# Lanes whose queued requests make the low lane shed immediately
+PROTECTED_LANES = ("critical", "high", "normal")
+# Lanes shed while a protected lane has requests waiting
+SHEDDABLE_LANES = ("low", "export")
+
+
+def classify(scope) -> Optional[str]:
+    """Lane name for a request, or None to bypass admission"""
+    path: str = scope["path"]
+    method: str = scope["method"]
+    if method == "OPTIONS" or not path.startswith("/api") or path.startswith(BYPASS_PREFIXES):
+        return None
+    if method == "POST" and (
+        (path.startswith("/api/posts/") and path.endswith("/documents"))
+        or path in IMPORT_PATHS
+    ):
+        return "upload"
+    if method in ("GET", "HEAD") and path.startswith(("/api/documents/", "/api/previews/")):
+        # Transfers after one cached lookup; a slow reader must not hold a lane slot
+        # (preview renders have their own limit, see previews.py)
+        return None
+    if method in MUTATING_METHODS:
+        if path.startswith("/api/auth"):
+            return "normal"
+        # Only a token that verifies takes a critical slot; checking the signature
+        # and the in-memory revocation list costs no query
+        authorization = dict(scope["headers"]).get(b"authorization")
+        if authorization and auth.bearer_subject(authorization) is not None:
+            return "critical"
+        return "normal"
+    if path.startswith("/api/export"):
+        return "export"
+    if path == "/api/posts/search":
+        return "low"
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    if "search" in query:
+        return "low"
+    skip = query.get("skip", ["0"])[0]
+    if skip.isdigit() and int(skip) >= ADMISSION_DEEP_OFFSET:
+        return "low"
+    if path.startswith("/api/posts/slug/") or path.removeprefix("/api/posts/").isdigit():
+        return "high"
+    return "normal"
+
+
+@contextlib.contextmanager
+def without_deadline():
+    """Run a block, and the threads and sessions it starts, without the request's deadline"""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_seconds() -> Optional[float]:
+    """Time left in the current request's budget, or None outside admitted requests"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+@event.listens_for(SessionLocal, "after_begin")
+def _apply_deadline(session: Session, transaction, connection):
+    remaining = remaining_seconds()
+    if remaining is None:
+        return
+    if remaining <= 0:
+        raise DeadlineExceeded()
+    # SET LOCAL lasts until the end of this transaction only
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(remaining * 1000))}")
+
+
+def is_deadline_error(error: BaseException) -> bool:
+    if isinstance(error, DeadlineExceeded):
+        return True
+    return isinstance(error, OperationalError) and getattr(error.orig, "pgcode", None) == QUERY_CANCELED
+
+
+async def _send_busy(send, lane: Lane, detail: str):
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    # Shed low-priority clients back off for longer
+    retry_after = b"5" if lane.name in SHEDDABLE_LANES else b"1"
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", retry_after),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying lanes, deadlines and load shedding"""
+
+    def __init__(self, app, lanes: Dict[str, Lane] = None):
+        self.app = app
+        self.lanes = lanes or LANES
+
+    async def __call__(self, scope, receive, send):
+        lane_name = classify(scope) if scope["type"] == "http" and ADMISSION_ENABLED else None
+        if lane_name is None:
+            await self.app(scope, receive, send)
+            return
+
+        lane = self.lanes[lane_name]
+        arrived = time.monotonic()
+        if lane_name in SHEDDABLE_LANES and any(self.lanes[name].waiting for name in PROTECTED_LANES):
+            admitted = False
+        else:
+            admitted = await lane.acquire()
+        if not admitted:
+            lane.shed += 1
+            await _send_busy(send, lane, "Server busy, please retry")
+            return
+
+        lane.admitted += 1
+        token = _deadline.set(arrived + lane.budget_seconds)
+        started = False
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                # The body is sent in this context: let it stream past the budget
+                _deadline.set(None)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, tracking_send)
+        except Exception as e:
+            if started or not is_deadline_error(e):
+                raise
+            logger.warning("%s %s exceeded its %.1fs budget", scope["method"], scope["path"], lane.budget_seconds)
+            await _send_busy(send, lane, "Request deadline exceeded")
+        finally:
+            _deadline.reset(token)
+            lane.release()
+
+
+def stats() -> dict:
+    return {name: lane.stats() for name, lane in LANES.items()}
@@ -1,5 +1,8 @@
+import logging
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Set
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -8,20 +11,29 @@ import os
 from dotenv import load_dotenv
 
 from . import crud, schemas
-from .database import get_db
+from .database import SessionLocal, get_db
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # JWT Configuration
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+# A rotated refresh token presented again within this window is a concurrent refresh, not theft
+REFRESH_REUSE_GRACE_SECONDS = int(os.getenv("REFRESH_REUSE_GRACE_SECONDS", "10"))
+# How often each worker reloads revoked sessions written by other workers
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "10"))
 
 if not SECRET_KEY:
     raise ValueError("SECRET_KEY environment variable is not set")
 
 # Security scheme
 security = HTTPBearer()
+# Same scheme for endpoints that also accept anonymous requests
+optional_security = HTTPBearer(auto_error=False)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -37,6 +49,116 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+class RevocationList:
+    """
+    Login sessions revoked within the last access-token lifetime, kept in memory
+    so checking a token costs no query. Revocations made by this worker apply at
+    once; other workers' are picked up every REVOCATION_REFRESH_SECONDS.
+
+    Checks never wait for the database: a stale list is reloaded in a background
+    thread while checks go on against the current one, and a failed reload
+    (the database is down) keeps it and is retried after the next interval.
+    """
+
+    def __init__(self):
+        self._sessions: Set[str] = set()
+        # Sessions added here since the last reload started, by when (monotonic)
+        self._added: Dict[str, float] = {}
+        self._checked_at = float("-inf")
+        # Held for a whole reload, so only one runs at a time
+        self._lock = threading.Lock()
+        # Held briefly by add() and by a reload swapping in its result, so neither loses the other's update
+        self._update_lock = threading.Lock()
+
+    def add(self, session_id: str):
+        with self._update_lock:
+            self._added[session_id] = time.monotonic()
+            self._sessions.add(session_id)
+
+    def is_revoked(self, session_id: str) -> bool:
+        if time.monotonic() - self._checked_at > REVOCATION_REFRESH_SECONDS and self._lock.acquire(blocking=False):
+            # The lock is held until the reload finishes, so only one runs at a time
+            self._checked_at = time.monotonic()
+            threading.Thread(target=self._reload_and_release, name="revocation-reload", daemon=True).start()
+        return session_id in self._sessions
+
+    def reload(self) -> bool:
+        """Load the revoked sessions now; False (keeping the current set) if the database fails"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            return self._reload()
+
+    def _reload_and_release(self):
+        try:
+            self._reload()
+        finally:
+            self._lock.release()
+
+    def _reload(self) -> bool:
+        started = time.monotonic()
+        try:
+            db = SessionLocal()
+            try:
+                revoked = set(crud.get_revoked_sessions(db, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)))
+            finally:
+                db.close()
+        except Exception:
+            logger.warning("Reloading revoked sessions failed; keeping the current list", exc_info=True)
+            return False
+        # Keep what was added while the query ran, which it may not have seen
+        with self._update_lock:
+            self._added = {session_id: at for session_id, at in self._added.items() if at >= started}
+            self._sessions = revoked | set(self._added)
+        return True
+
+
+revocations = RevocationList()
+
+
+def create_session_tokens(db: Session, user, session_id: Optional[str] = None) -> dict:
+    """Access token plus a fresh refresh token for a login session (no password hashing)"""
+    refresh_token, session_id = crud.create_refresh_token(
+        db, user.id, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS), session_id=session_id
+    )
+    return {
+        "access_token": create_access_token(data={"sub": user.username, "sid": session_id}),
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+def refresh_session_tokens(db: Session, refresh_token: str) -> Optional[dict]:
+    """Rotate a refresh token; returns new tokens, or None if it is not (or no longer) valid"""
+    try:
+        rotated = crud.rotate_refresh_token(
+            db, refresh_token,
+            expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+            reuse_grace=timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS)
+        )
+    except crud.RefreshTokenReused as e:
+        # The leaked session's access tokens stop working here now, not at the next reload
+        revocations.add(e.session_id)
+        return None
+    if rotated is None:
+        return None
+    username, session_id, new_refresh_token = rotated
+    return {
+        "access_token": create_access_token(data={"sub": username, "sid": session_id}),
+        "token_type": "bearer",
+        "refresh_token": new_refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+def revoke_session(db: Session, refresh_token: str):
+    """Log a session out everywhere: its refresh tokens and its unexpired access tokens"""
+    session_id = crud.get_refresh_session(db, refresh_token)
+    if session_id is not None:
+        crud.revoke_refresh_session(db, session_id)
+        revocations.add(session_id)
+
+
 def verify_token(token: str) -> Optional[str]:
     """Verify and decode JWT token"""
     try:
@@ -44,11 +166,22 @@ def verify_token(token: str) -> Optional[str]:
         username: str = payload.get("sub")
         if username is None:
             return None
+        session_id = payload.get("sid")
+        if session_id is not None and revocations.is_revoked(session_id):
+            return None
         return username
     except JWTError:
         return None
 
 
+def bearer_subject(authorization: bytes) -> Optional[str]:
+    """Username from a raw Authorization header value, or None unless it is a valid Bearer token"""
+    scheme, _, token = authorization.decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return verify_token(token.strip())
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
@@ -74,6 +207,19 @@ async def get_current_user(
     return user
 
 
+async def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: Session = Depends(get_db)
+):
+    """Dependency returning the authenticated user, or None for anonymous requests"""
+    if credentials is None:
+        return None
+    username = verify_token(credentials.credentials)
+    if username is None:
+        return None
+    return crud.get_user_by_username(db, username=username)
+
+
 # Optional: Admin-only dependency
 async def get_current_admin_user(
     current_user = Depends(get_current_user)
@@ -89,4 +235,12 @@ async def get_current_admin_user(
             detail="Not enough permissions"
         )
     
-    return current_user 
\ No newline at end of file
+    return current_user
+
+
+def post_author_scope(current_user) -> Optional[int]:
+    """Author id that post writes must be restricted to, or None for the admin"""
+    admin_username = os.getenv("ADMIN_USERNAME", "admin")
+    if current_user.username == admin_username:
+        return None
+    return current_user.id
@@ -0,0 +1,397 @@
+"""
+Two-tier read cache that stays coherent across workers and instances.
+
+- L1: per-process LRU with a short TTL (CACHE_L1_SIZE, CACHE_L1_TTL_SECONDS).
+- L2 (optional): a store shared by every instance, chosen with CACHE_L2:
+  "redis" (any Redis-protocol server at CACHE_REDIS_URL, needs the `redis`
+  package) or "memory" (an in-process fake with the same operations, for
+  tests and single-process runs). Unset disables L2.
+
+Entries carry tags such as "posts" or "post:<id>". Write paths in crud call
+`invalidate(db, *tags)` before committing. Once the transaction commits, the
+tagged L2 entries are deleted and every instance drops its tagged L1 entries.
+The message travels over CACHE_BUS:
+
+- memory (default): this process only, for a single worker;
+- postgres: pg_notify inside the transaction, read by a LISTEN thread in
+  each worker (the same mechanism as EVENTS_BACKEND=postgres);
+- redis: the L2 store's pub/sub, published after commit.
+
+A read that started before a write can still store the old value after the
+invalidation; the TTLs bound how long that can last.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, func
+from sqlalchemy import select as sql_select
+from sqlalchemy.orm import Session
+
+from . import singleflight
+from .database import SessionLocal
+from .events import PostgresListener
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_L1_SIZE = int(os.getenv("CACHE_L1_SIZE", "2000"))
+CACHE_L1_TTL_SECONDS = float(os.getenv("CACHE_L1_TTL_SECONDS", "30"))
+CACHE_L2 = os.getenv("CACHE_L2", "")  # "", redis, memory
+CACHE_L2_TTL_SECONDS = int(os.getenv("CACHE_L2_TTL_SECONDS", "300"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_BUS = os.getenv("CACHE_BUS", "memory")  # memory, postgres, redis
+CACHE_CHANNEL = os.getenv("CACHE_CHANNEL", "lexleaks_cache")
+
+# Tags of an entry, or a function computing them from its value
+Tags = Union[Iterable[str], Callable[[Any], Iterable[str]]]
+
+KEY_PREFIX = "lexleaks:cache:"
+TAG_PREFIX = "lexleaks:tag:"
+
+# Tags used by the post and impact read paths
+POSTS = "posts"  # listings, including impact counts
+POST_DETAILS = "post-details"  # every single-post entry, for bulk writes
+
+
+def post_tag(post_id: int) -> str:
+    return f"post:{post_id}"
+
+
+def document_tag(document_id: int) -> str:
+    return f"document:{document_id}"
+
+
+class LocalCache:
+    """Thread-safe LRU of decoded values with per-entry TTL and a tag index"""
+
+    def __init__(self, max_entries: int = CACHE_L1_SIZE, ttl: float = CACHE_L1_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[1]
+
+    def set(self, key: str, value: Any, tags: Iterable[str]):
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._tags[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def drop_tags(self, tags: Iterable[str]) -> int:
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._tags.pop(tag, set())
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class MemoryStore:
+    """In-process fake of the shared store: the same operations as RedisStore, pub/sub included"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[float, bytes]] = {}
+        self._sets: Dict[str, Set[str]] = defaultdict(set)
+        self._subscribers: Dict[str, List[Callable[[str], None]]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._data.pop(key, None)
+                return None
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: int, tags: Iterable[str]):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            for tag in tags:
+                self._sets[TAG_PREFIX + tag].add(key)
+
+    def delete_tags(self, tags: Iterable[str]) -> int:
+        with self._lock:
+            deleted = 0
+            for tag in tags:
+                for key in self._sets.pop(TAG_PREFIX + tag, set()):
+                    deleted += self._data.pop(key, None) is not None
+            return deleted
+
+    def publish(self, channel: str, message: str):
+        for callback in list(self._subscribers[channel]):
+            callback(message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> Callable[[], None]:
+        self._subscribers[channel].append(callback)
+        return lambda: self._subscribers[channel].remove(callback)
+
+
+class RedisStore:
+    """Shared store on a Redis-protocol server; tag membership is kept in sets"""
+
+    def __init__(self, url: str = CACHE_REDIS_URL):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_L2=redis requires the redis package (pip install redis)")
+        # Short timeouts: a slow cache must not be slower than the database it fronts
+        self._client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int, tags: Iterable[str]):
+        pipe = self._client.pipeline(transaction=False)
+        pipe.set(key, value, ex=ttl)
+        for tag in tags:
+            pipe.sadd(TAG_PREFIX + tag, key)
+            # Tag sets outlive their entries slightly; stale members are harmless
+            pipe.expire(TAG_PREFIX + tag, ttl * 2)
+        pipe.execute()
+
+    def delete_tags(self, tags: Iterable[str]) -> int:
+        tag_keys = [TAG_PREFIX + tag for tag in tags]
+        if not tag_keys:
+            return 0
+        pipe = self._client.pipeline(transaction=False)
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        keys = set().union(*pipe.execute())
+        self._client.delete(*keys, *tag_keys)
+        return len(keys)
+
+    def publish(self, channel: str, message: str):
+        self._client.publish(channel, message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> Callable[[], None]:
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{channel: lambda message: callback(message["data"].decode())})
+        thread = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+        return thread.stop
+
+
+def create_store():
+    if CACHE_L2 == "redis":
+        return RedisStore()
+    if CACHE_L2 == "memory":
+        return MemoryStore()
+    return None
+
+
+class Cache:
+    """L1 in front of an optional L2, with tag invalidation applied on every instance"""
+
+    def __init__(self, local: LocalCache, shared=None, l2_ttl: int = CACHE_L2_TTL_SECONDS, flights: SingleFlight = None):
+        self.local = local
+        self.shared = shared
+        self.l2_ttl = l2_ttl
+        self.flights = flights or SingleFlight()
+        # Lets an instance ignore its own broadcasts, which it already applied
+        self.origin = uuid.uuid4().hex
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "invalidations": 0, "l2_errors": 0}
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], tags: Tags) -> Any:
+        """
+        Return the cached value for `key`, else store and return `loader()` (a
+        JSON-able value). `tags` may be a function of the value, for entries
+        whose tags are only known once loaded (e.g. a post looked up by slug).
+        """
+        tags_for = tags if callable(tags) else lambda value: tags
+        found, value = self.local.get(key)
+        if found:
+            self.stats["l1_hits"] += 1
+            return value
+        # Concurrent misses for the same key share one L2 read and one load
+        return self.flights.do(key, lambda: self._load(key, loader, tags_for))
+
+    async def get_or_load_async(self, key: str, loader: Callable[[], Any], tags: Tags) -> Any:
+        """get_or_load for async routes: the (sync) loader runs in the threadpool, followers wait on the loop"""
+        tags_for = tags if callable(tags) else lambda value: tags
+        found, value = self.local.get(key)
+        if found:
+            self.stats["l1_hits"] += 1
+            return value
+        return await self.flights.do_async(
+            key, lambda: run_in_threadpool(self._load, key, loader, tags_for)
+        )
+
+    def _load(self, key: str, loader: Callable[[], Any], tags_for: Callable[[Any], Iterable[str]]) -> Any:
+        if self.shared is not None:
+            try:
+                raw = self.shared.get(KEY_PREFIX + key)
+            except Exception:
+                self.stats["l2_errors"] += 1
+                logger.warning("Cache L2 read failed for %s", key, exc_info=True)
+                raw = None
+            if raw is not None:
+                self.stats["l2_hits"] += 1
+                value = json.loads(raw)
+                self.local.set(key, value, tags_for(value))
+                return value
+
+        self.stats["misses"] += 1
+        value = loader()
+        tags = list(tags_for(value))
+        self.local.set(key, value, tags)
+        if self.shared is not None:
+            try:
+                encoded = json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+                self.shared.set(KEY_PREFIX + key, encoded, self.l2_ttl, tags)
+            except Exception:
+                self.stats["l2_errors"] += 1
+                logger.warning("Cache L2 write failed for %s", key, exc_info=True)
+        return value
+
+    def apply(self, tags: Iterable[str], shared: bool = True):
+        """Drop tagged entries: from L2 (unless already done by the writer), then from L1"""
+        tags = list(tags)
+        self.stats["invalidations"] += 1
+        if shared and self.shared is not None:
+            try:
+                self.shared.delete_tags(tags)
+            except Exception:
+                self.stats["l2_errors"] += 1
+                logger.warning("Cache L2 invalidation failed for %s", tags, exc_info=True)
+        self.local.drop_tags(tags)
+
+    def encode(self, tags: Iterable[str]) -> str:
+        return json.dumps({"origin": self.origin, "tags": sorted(tags)}, separators=(",", ":"))
+
+    def receive(self, message: str):
+        """Bus callback: apply another instance's invalidation"""
+        decoded = json.loads(message)
+        if decoded["origin"] == self.origin:
+            return
+        # Over NOTIFY the L2 delete is repeated here, after the commit is visible,
+        # so no instance can refill L1 from an L2 entry the writer has yet to delete
+        self.apply(decoded["tags"], shared=CACHE_BUS == "postgres")
+
+
+cache = Cache(LocalCache(), create_store(), flights=singleflight.group)
+
+
+def get_or_load(key: str, loader: Callable[[], Any], tags: Tags) -> Any:
+    if not CACHE_ENABLED:
+        # Still coalesce identical concurrent reads
+        return singleflight.group.do(key, loader)
+    return cache.get_or_load(key, loader, tags)
+
+
+async def get_or_load_async(key: str, loader: Callable[[], Any], tags: Tags) -> Any:
+    if not CACHE_ENABLED:
+        return await singleflight.group.do_async(key, lambda: run_in_threadpool(loader))
+    return await cache.get_or_load_async(key, loader, tags)
+
+
+def stats() -> dict:
+    """Per-process hit, miss and coalescing counters"""
+    return {
+        "l1_entries": len(cache.local),
+        **cache.stats,
+        "in_flight": singleflight.group.in_flight,
+        **{f"singleflight_{name}": value for name, value in singleflight.group.stats.items()},
+    }
+
+
+def invalidate(db: Session, *tags: str):
+    """Drop entries with any of `tags` on every instance once the session's transaction commits"""
+    if CACHE_BUS == "postgres":
+        # NOTIFY is transactional: other instances only see it after COMMIT
+        db.execute(sql_select(func.pg_notify(CACHE_CHANNEL, cache.encode(tags))))
+    # Remember the savepoint (if any) so a rolled back savepoint drops only its own tags
+    db.info.setdefault("pending_invalidations", []).append((db.get_nested_transaction(), tags))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_pending_invalidations(session: Session):
+    pending = session.info.pop("pending_invalidations", [])
+    if not pending:
+        return
+    tags = {tag for _, entry_tags in pending for tag in entry_tags}
+    cache.apply(tags)
+    if CACHE_BUS == "redis" and cache.shared is not None:
+        try:
+            cache.shared.publish(CACHE_CHANNEL, cache.encode(tags))
+        except Exception:
+            logger.warning("Cache invalidation broadcast failed for %s", tags, exc_info=True)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_pending_invalidations(session: Session, previous_transaction):
+    if previous_transaction.nested:
+        pending = session.info.get("pending_invalidations", [])
+        session.info["pending_invalidations"] = [
+            (savepoint, tags) for savepoint, tags in pending
+            if savepoint is not previous_transaction
+        ]
+    else:
+        session.info.pop("pending_invalidations", None)
+
+
+_stop_listening: Optional[Callable[[], None]] = None
+
+
+def start():
+    """Subscribe this process to other instances' invalidations"""
+    global _stop_listening
+    if _stop_listening is not None:
+        return
+    if CACHE_BUS == "postgres":
+        listener = PostgresListener(CACHE_CHANNEL, cache.receive, name="cache-listener")
+        listener.start()
+        _stop_listening = listener.stop
+    elif CACHE_BUS == "redis":
+        if cache.shared is None:
+            raise RuntimeError("CACHE_BUS=redis requires CACHE_L2")
+        _stop_listening = cache.shared.subscribe(CACHE_CHANNEL, cache.receive)
+
+
+def stop():
+    global _stop_listening
+    if _stop_listening is not None:
+        _stop_listening()
+        _stop_listening = None
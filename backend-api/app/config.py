@@ -18,3 +18,8 @@ ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "LexLeaks2024!")
 
 # CORS configuration
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
+
+# Listing page budgets
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))  # Larger limits are clamped
+STREAM_PAGE_THRESHOLD = int(os.getenv("STREAM_PAGE_THRESHOLD", "200"))  # Larger pages are streamed
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "200"))  # Rows fetched per round trip when streaming
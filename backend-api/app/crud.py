@@ -1,13 +1,14 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, asc, func
-from datetime import datetime, date
-from typing import List, Optional
-from . import models, schemas
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, or_, desc, asc, func, select, insert, update, delete, true, literal, tuple_, case, BigInteger, Text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, date, timedelta
+from typing import Iterator, List, Optional, Tuple
+from . import cache, models, schemas, outbox, passwords, previews, redaction
+from .events import emit
 from .schemas import generate_slug
-from passlib.context import CryptContext
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import hashlib
+import secrets
 
 
 # User CRUD operations
@@ -23,7 +24,7 @@ def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
 
 def create_user(db: Session, user: schemas.UserCreate) -> models.User:
     """Create a new user"""
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = passwords.hash_password(user.password)
     db_user = models.User(
         username=user.username,
         email=user.email,
@@ -37,7 +38,7 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return passwords.verify_password(plain_password, hashed_password)[0]
 
 
 def authenticate_user(db: Session, username: str, password: str) -> Optional[models.User]:
@@ -45,11 +46,141 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[mod
     user = get_user_by_username(db, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, stale = passwords.verify_password(password, user.hashed_password)
+    if not valid:
         return None
+    if stale:
+        passwords.schedule_rehash(user.id, password, user.hashed_password)
     return user
 
 
+def hash_refresh_token(token: str) -> str:
+    """Refresh tokens are 256-bit random strings, so a fast unsalted hash is enough"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_refresh_token(
+    db: Session,
+    user_id: int,
+    expires_delta: timedelta,
+    session_id: Optional[str] = None
+) -> Tuple[str, str]:
+    """Store a new refresh token (starting a session unless one is given); returns (token, session_id)"""
+    token = secrets.token_urlsafe(32)
+    session_id = session_id or secrets.token_hex(16)
+    db.execute(
+        insert(models.RefreshToken).values(
+            user_id=user_id,
+            token_hash=hash_refresh_token(token),
+            session_id=session_id,
+            expires_at=func.now() + expires_delta
+        )
+    )
+    db.commit()
+    return token, session_id
+
+
+class RefreshTokenReused(Exception):
+    """A rotated refresh token was presented again; its session has been revoked"""
+
+    def __init__(self, session_id: str):
+        super().__init__(session_id)
+        self.session_id = session_id
+
+
+def rotate_refresh_token(
+    db: Session,
+    token: str,
+    expires_delta: timedelta,
+    reuse_grace: timedelta
+) -> Optional[Tuple[str, str, str]]:
+    """
+    Exchange a live refresh token for a new one in the same session, in one
+    statement; returns (username, session_id, new_token) or None.
+    Presenting an already rotated token again (outside `reuse_grace`, which
+    covers two tabs refreshing at once) means it leaked: the session is revoked
+    and RefreshTokenReused raised.
+    """
+    token_hash = hash_refresh_token(token)
+    new_token = secrets.token_urlsafe(32)
+    used = (
+        update(models.RefreshToken)
+        .where(
+            models.RefreshToken.token_hash == token_hash,
+            models.RefreshToken.used_at.is_(None),
+            models.RefreshToken.revoked_at.is_(None),
+            models.RefreshToken.expires_at > func.now(),
+            models.User.id == models.RefreshToken.user_id
+        )
+        .values(used_at=func.now())
+        .returning(models.RefreshToken.user_id, models.RefreshToken.session_id, models.User.username)
+        .cte("used")
+    )
+    rotated = (
+        insert(models.RefreshToken)
+        .from_select(
+            ["user_id", "session_id", "token_hash", "expires_at"],
+            select(used.c.user_id, used.c.session_id, literal(hash_refresh_token(new_token)), func.now() + expires_delta)
+        )
+        .returning(models.RefreshToken.id)
+        .cte("rotated")
+    )
+    row = db.execute(select(used.c.username, used.c.session_id).add_cte(rotated)).first()
+    if row is not None:
+        db.commit()
+        return row.username, row.session_id, new_token
+
+    db.rollback()
+    reused = db.execute(
+        select(models.RefreshToken.session_id)
+        .where(
+            models.RefreshToken.token_hash == token_hash,
+            models.RefreshToken.revoked_at.is_(None),
+            models.RefreshToken.used_at < func.now() - reuse_grace
+        )
+    ).scalar()
+    if reused is not None:
+        revoke_refresh_session(db, reused)
+        raise RefreshTokenReused(reused)
+    return None
+
+
+def get_refresh_session(db: Session, token: str) -> Optional[str]:
+    """Session id of a refresh token, used or not"""
+    return db.scalar(
+        select(models.RefreshToken.session_id)
+        .where(models.RefreshToken.token_hash == hash_refresh_token(token))
+    )
+
+
+def revoke_refresh_session(db: Session, session_id: str):
+    """Revoke every refresh token of a login session (logout, or detected token reuse)"""
+    db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.session_id == session_id, models.RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=func.now())
+    )
+    db.commit()
+
+
+def get_revoked_sessions(db: Session, within: timedelta) -> List[str]:
+    """Sessions revoked recently enough that their access tokens may still be unexpired"""
+    return db.scalars(
+        select(models.RefreshToken.session_id)
+        .where(models.RefreshToken.revoked_at >= func.now() - within)
+        .distinct()
+    ).all()
+
+
+def purge_refresh_tokens(db: Session, retention: timedelta) -> int:
+    """Drop tokens expired for longer than `retention`"""
+    result = db.execute(
+        delete(models.RefreshToken).where(models.RefreshToken.expires_at < func.now() - retention)
+    )
+    db.commit()
+    return result.rowcount
+
+
 # Post CRUD operations
 def get_post(db: Session, post_id: int) -> Optional[models.Post]:
     """Get post by ID"""
@@ -61,6 +192,39 @@ def get_post_by_slug(db: Session, slug: str) -> Optional[models.Post]:
     return db.query(models.Post).filter(models.Post.slug == slug).first()
 
 
+def get_posts_by_ids_or_slugs(
+    db: Session,
+    ids: Optional[List[int]] = None,
+    slugs: Optional[List[str]] = None
+) -> List[models.Post]:
+    """Get several posts (with authors) by id and/or slug in a single IN-query"""
+    conditions = []
+    if ids:
+        conditions.append(models.Post.id.in_(ids))
+    if slugs:
+        conditions.append(models.Post.slug.in_(slugs))
+    if not conditions:
+        return []
+    
+    return (
+        db.query(models.Post)
+        .options(joinedload(models.Post.author))
+        .filter(or_(*conditions))
+        .all()
+    )
+
+
+def _document_text_match(pattern: str):
+    """Posts with an attached document whose extracted text matches the ILIKE `pattern`"""
+    return (
+        select(literal(1))
+        .select_from(models.PostDocument)
+        .join(models.DocumentPage, models.DocumentPage.document_id == models.PostDocument.document_id)
+        .where(models.PostDocument.post_id == models.Post.id, models.DocumentPage.text.ilike(pattern))
+        .exists()
+    )
+
+
 def get_posts(
     db: Session, 
     skip: int = 0, 
@@ -107,7 +271,8 @@ def get_posts(
         search_filter = or_(
             models.Post.title.ilike(f"%{search}%"),
             models.Post.content.ilike(f"%{search}%"),
-            models.Post.excerpt.ilike(f"%{search}%")
+            models.Post.excerpt.ilike(f"%{search}%"),
+            _document_text_match(f"%{search}%")
         )
         query = query.filter(search_filter)
     
@@ -149,10 +314,8 @@ def get_posts(
     return query.offset(skip).limit(limit).all()
 
 
-def get_posts_with_counts(
+def _posts_with_counts_query(
     db: Session, 
-    skip: int = 0, 
-    limit: int = 100, 
     status: Optional[str] = None,
     verification_status: Optional[str] = None,
     search: Optional[str] = None,
@@ -162,9 +325,9 @@ def get_posts_with_counts(
     date_to: Optional[date] = None,
     sort_by: Optional[str] = 'newest',
     impact_level: Optional[str] = None
-) -> List[dict]:
+):
     """
-    Get posts with impact counts and advanced filtering.
+    Build the (Post, impact_count) query shared by the buffered and streamed listings.
     """
     # Create a subquery to count impacts per post
     impact_count_subquery = (
@@ -179,7 +342,8 @@ def get_posts_with_counts(
     # Main query with impact count
     query = db.query(
         models.Post,
-        func.coalesce(impact_count_subquery.c.impact_count, 0).label('impact_count')
+        func.coalesce(impact_count_subquery.c.impact_count, 0).label('impact_count'),
+        _preview_sha256_column()
     ).outerjoin(
         impact_count_subquery,
         models.Post.id == impact_count_subquery.c.post_id
@@ -212,7 +376,8 @@ def get_posts_with_counts(
         search_filter = or_(
             models.Post.title.ilike(f"%{search}%"),
             models.Post.content.ilike(f"%{search}%"),
-            models.Post.excerpt.ilike(f"%{search}%")
+            models.Post.excerpt.ilike(f"%{search}%"),
+            _document_text_match(f"%{search}%")
         )
         query = query.filter(search_filter)
     
@@ -233,28 +398,63 @@ def get_posts_with_counts(
     else: # Default to newest
         query = query.order_by(desc(models.Post.published_at))
 
-    results = query.offset(skip).limit(limit).all()
+    return query
+
+
+def _post_with_count_dict(post: models.Post, impact_count: int, preview_sha256: Optional[str]) -> dict:
+    return {
+        "id": post.id,
+        "title": post.title,
+        "slug": post.slug,
+        "excerpt": post.excerpt,
+        "status": post.status,
+        "verification_status": post.verification_status,
+        "category": post.category,
+        "document_url": post.document_url,
+        "published_at": post.published_at,
+        "created_at": post.created_at,
+        "author": post.author,
+        "impact_count": impact_count,
+        "preview_url": previews.card_url(preview_sha256) if preview_sha256 else None
+    }
+
+
+def get_posts_with_counts(
+    db: Session, 
+    skip: int = 0, 
+    limit: int = 100, 
+    **filters
+) -> List[dict]:
+    """
+    Get posts with impact counts and advanced filtering.
+    Accepts the same filters as _posts_with_counts_query.
+    """
+    results = _posts_with_counts_query(db, **filters).offset(skip).limit(limit).all()
     
     # Convert to list of dicts with impact_count
-    posts_with_counts = []
-    for post, impact_count in results:
-        post_dict = {
-            "id": post.id,
-            "title": post.title,
-            "slug": post.slug,
-            "excerpt": post.excerpt,
-            "status": post.status,
-            "verification_status": post.verification_status,
-            "category": post.category,
-            "document_url": post.document_url,
-            "published_at": post.published_at,
-            "created_at": post.created_at,
-            "author": post.author,
-            "impact_count": impact_count
-        }
-        posts_with_counts.append(post_dict)
-    
-    return posts_with_counts
+    return [_post_with_count_dict(*row) for row in results]
+
+
+def iter_posts_with_counts(
+    db: Session, 
+    skip: int = 0, 
+    limit: int = 100, 
+    batch_size: int = 200,
+    **filters
+) -> Iterator[dict]:
+    """
+    Stream posts with impact counts, fetching batch_size rows per round trip
+    through a server-side cursor instead of materializing the whole page.
+    """
+    query = (
+        _posts_with_counts_query(db, **filters)
+        .options(joinedload(models.Post.author))
+        .offset(skip)
+        .limit(limit)
+        .yield_per(batch_size)
+    )
+    for row in query:
+        yield _post_with_count_dict(*row)
 
 
 def get_published_posts(db: Session, skip: int = 0, limit: int = 100) -> List[models.Post]:
@@ -270,23 +470,81 @@ def get_published_posts(db: Session, skip: int = 0, limit: int = 100) -> List[mo
     )
 
 
-def create_post(db: Session, post: schemas.PostCreate, author_id: int) -> models.Post:
-    """Create a new post"""
-    # Generate unique slug
-    base_slug = generate_slug(post.title)
+def resolve_slug(db: Session, title: str, exclude_post_id: Optional[int] = None) -> str:
+    """Pick the first free slug for a title with a single query"""
+    base_slug = generate_slug(title)
+    query = select(models.Post.slug).where(
+        or_(
+            models.Post.slug == base_slug,
+            models.Post.slug.startswith(f"{base_slug}-", autoescape=True)
+        )
+    )
+    if exclude_post_id is not None:
+        query = query.where(models.Post.id != exclude_post_id)
+    taken = set(db.scalars(query))
+    
     slug = base_slug
     counter = 1
-    
-    while get_post_by_slug(db, slug):
+    while slug in taken:
         slug = f"{base_slug}-{counter}"
         counter += 1
-    
+    return slug
+
+
+def _is_unique_violation(error: IntegrityError) -> bool:
+    return getattr(error.orig, "pgcode", None) == "23505"
+
+
+def _is_foreign_key_violation(error: IntegrityError) -> bool:
+    return getattr(error.orig, "pgcode", None) == "23503"
+
+
+def _owned_by(author_id: Optional[int]):
+    """WHERE clause restricting a post write to its author (None means no restriction)"""
+    if author_id is None:
+        return true()
+    return models.Post.author_id == author_id
+
+
+def _tombstoned_delete(entity_type: str, entity_id_column, delete_stmt):
+    """
+    Turn a DELETE ... RETURNING into a CTE that also writes a deleted_records
+    tombstone per removed row, so the change feed sees deletions (one statement).
+    Returns (deleted CTE, tombstones CTE); select from the former and add_cte the latter.
+    """
+    deleted = delete_stmt.returning(entity_id_column.label("entity_id")).cte("deleted")
+    tombstones = (
+        insert(models.DeletedRecord)
+        .from_select(["entity_type", "entity_id"], select(literal(entity_type), deleted.c.entity_id))
+        .cte("tombstones")
+    )
+    return deleted, tombstones
+
+
+def _enqueue_published(db: Session, db_post: models.Post):
+    # Deduplicated per post: re-publishing does not notify subscribers again
+    outbox.enqueue(
+        db, "post.published", dedupe_key=f"post.published:{db_post.id}",
+        id=db_post.id, slug=db_post.slug, title=db_post.title, category=db_post.category
+    )
+
+
+# Post and impact write functions take commit=False when they are composed into a
+# larger transaction (see routers/batch.py); errors then propagate to the caller's
+# savepoint instead of rolling back the whole session.
+
+def create_post(
+    db: Session,
+    post: schemas.PostCreate,
+    author_id: int,
+    commit: bool = True
+) -> models.Post:
+    """Create a new post"""
     # Set published_at if status is published
     published_at = datetime.utcnow() if post.status == "published" else None
     
-    db_post = models.Post(
+    values = dict(
         title=post.title,
-        slug=slug,
         content=post.content,
         excerpt=post.excerpt,
         status=post.status,
@@ -295,63 +553,286 @@ def create_post(db: Session, post: schemas.PostCreate, author_id: int) -> models
         published_at=published_at
     )
     
-    db.add(db_post)
-    db.commit()
-    db.refresh(db_post)
+    # Resolve the slug in one query, then let ON CONFLICT catch a concurrent writer
+    # that grabbed the same slug in between; retry in that (rare) case.
+    while True:
+        values["slug"] = resolve_slug(db, post.title)
+        stmt = (
+            pg_insert(models.Post)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=[models.Post.slug])
+            .returning(models.Post)
+        )
+        db_post = db.scalars(stmt).first()
+        if db_post is not None:
+            break
+    
+    cache.invalidate(db, cache.POSTS)
+    if db_post.status == "published":
+        emit(db, "post.published", id=db_post.id, slug=db_post.slug, title=db_post.title)
+        _enqueue_published(db, db_post)
+    if commit:
+        db.commit()
     return db_post
 
 
 def update_post(
     db: Session, 
     post_id: int, 
-    post_update: schemas.PostUpdate
+    post_update: schemas.PostUpdate,
+    author_id: Optional[int] = None,
+    commit: bool = True
 ) -> Optional[models.Post]:
-    """Update an existing post"""
-    db_post = get_post(db, post_id)
-    if not db_post:
-        return None
-    
+    """
+    Update an existing post with a single UPDATE ... RETURNING.
+    When author_id is given the update only applies to posts owned by that author.
+    Returns None if no row matched (missing post or not owned).
+    """
     update_data = post_update.model_dump(exclude_unset=True)
     
-    # Handle slug regeneration if title changed
-    if "title" in update_data:
-        new_slug = generate_slug(update_data["title"])
-        if new_slug != db_post.slug:
-            # Ensure slug uniqueness
-            base_slug = new_slug
-            counter = 1
-            while get_post_by_slug(db, new_slug) and new_slug != db_post.slug:
-                new_slug = f"{base_slug}-{counter}"
-                counter += 1
-            update_data["slug"] = new_slug
-    
     # Handle published_at timestamp
     if "status" in update_data:
-        if update_data["status"] == "published" and not db_post.published_at:
-            update_data["published_at"] = datetime.utcnow()
-        elif update_data["status"] != "published":
+        if update_data["status"] == "published":
+            update_data["published_at"] = func.coalesce(models.Post.published_at, func.now())
+        else:
             update_data["published_at"] = None
     
-    # Apply updates
-    for field, value in update_data.items():
-        setattr(db_post, field, value)
+    if not update_data:
+        return db.scalars(
+            select(models.Post).where(models.Post.id == post_id, _owned_by(author_id))
+        ).first()
     
-    db.commit()
-    db.refresh(db_post)
+    # The status before this update, read under the row lock the UPDATE takes anyway,
+    # so concurrent saves cannot both see a draft and both announce the publication
+    previous = (
+        select(models.Post.id, models.Post.status)
+        .where(models.Post.id == post_id)
+        .with_for_update()
+        .subquery("previous")
+    )
+    while True:
+        # Handle slug regeneration if title changed
+        if "title" in update_data:
+            update_data["slug"] = resolve_slug(db, update_data["title"], exclude_post_id=post_id)
+        
+        stmt = (
+            update(models.Post)
+            .where(models.Post.id == previous.c.id, _owned_by(author_id))
+            .values(**update_data)
+            .returning(models.Post, previous.c.status)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        try:
+            row = db.execute(stmt).first()
+        except IntegrityError as e:
+            # Retry a lost slug race, unless an outer transaction owns the rollback
+            if commit and "slug" in update_data and _is_unique_violation(e):
+                db.rollback()
+                continue
+            raise
+        break
+    
+    if row is None:
+        return None
+    db_post, previous_status = row
+    
+    cache.invalidate(db, cache.POSTS, cache.post_tag(db_post.id))
+    # Drafts stay silent; a post leaving "published" is announced so clients can drop it
+    if db_post.status == "published" or "status" in update_data:
+        newly_published = db_post.status == "published" and previous_status != "published"
+        event_type = "post.published" if newly_published else "post.updated"
+        emit(db, event_type, id=db_post.id, slug=db_post.slug, status=db_post.status)
+        if newly_published:
+            _enqueue_published(db, db_post)
+    if commit:
+        db.commit()
     return db_post
 
 
-def delete_post(db: Session, post_id: int) -> bool:
-    """Delete a post"""
-    db_post = get_post(db, post_id)
-    if not db_post:
+def delete_post(
+    db: Session,
+    post_id: int,
+    author_id: Optional[int] = None,
+    commit: bool = True
+) -> bool:
+    """Delete a post without loading it first (impacts go via ON DELETE CASCADE)"""
+    deleted, tombstones = _tombstoned_delete(
+        "post",
+        models.Post.id,
+        delete(models.Post)
+        .where(models.Post.id == post_id, _owned_by(author_id))
+        .returning(models.Post.status)
+    )
+    deleted_status = db.scalars(select(deleted.c.status).add_cte(tombstones)).first()
+    if deleted_status is None:
         return False
     
-    db.delete(db_post)
-    db.commit()
+    cache.invalidate(db, cache.POSTS, cache.post_tag(post_id))
+    if deleted_status == "published":
+        emit(db, "post.deleted", id=post_id)
+    if commit:
+        db.commit()
     return True
 
 
+def resolve_slugs(db: Session, titles: List[str]) -> List[str]:
+    """
+    Pick free slugs for a batch of titles with one set-based query.
+    Slugs are also kept unique within the batch itself.
+    """
+    bases = [generate_slug(title) for title in titles]
+    # The same condition as resolve_slug's per base: index range scans (ix_posts_slug_pattern)
+    taken = set(db.scalars(
+        select(models.Post.slug).where(
+            or_(*(
+                or_(models.Post.slug == base_slug, models.Post.slug.startswith(f"{base_slug}-", autoescape=True))
+                for base_slug in set(bases)
+            ))
+        )
+    ))
+    
+    slugs = []
+    for base_slug in bases:
+        slug = base_slug
+        counter = 1
+        while slug in taken:
+            slug = f"{base_slug}-{counter}"
+            counter += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def import_posts(
+    db: Session,
+    records: List[tuple],
+    author_id: int
+) -> List[schemas.ImportResult]:
+    """
+    Insert a batch of (line, PostImport) records in one transaction with a
+    single multi-row INSERT. Returns one result per record.
+    """
+    if not records:
+        return []
+    
+    slugs = resolve_slugs(db, [post.title for _, post in records])
+    now = datetime.utcnow()
+    rows = []
+    for (_, post), slug in zip(records, slugs):
+        published_at = post.published_at
+        if post.status == "published" and published_at is None:
+            published_at = now
+        rows.append(dict(
+            title=post.title,
+            slug=slug,
+            content=post.content,
+            excerpt=post.excerpt,
+            status=post.status,
+            verification_status=post.verification_status,
+            category=post.category,
+            document_url=post.document_url,
+            author_id=author_id,
+            published_at=published_at
+        ))
+    
+    posts_table = models.Post.__table__
+    inserted = db.execute(
+        pg_insert(posts_table)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[posts_table.c.slug])
+        .returning(posts_table.c.id, posts_table.c.slug)
+    ).all()
+    if inserted:
+        cache.invalidate(db, cache.POSTS)
+        emit(db, "posts.changed", action="import", count=len(inserted))
+    db.commit()
+    
+    # A slug missing from RETURNING lost a race with a concurrent writer
+    ids_by_slug = {slug: post_id for post_id, slug in inserted}
+    results = []
+    for (line, _), slug in zip(records, slugs):
+        if slug in ids_by_slug:
+            results.append(schemas.ImportResult(
+                line=line, status="created", id=ids_by_slug[slug], slug=slug
+            ))
+        else:
+            results.append(schemas.ImportResult(
+                line=line, status="error", slug=slug, error="Slug conflict, retry this record"
+            ))
+    return results
+
+
+def _bulk_selection(ids: Optional[List[int]], post_filter: Optional[schemas.PostBulkFilter]) -> list:
+    """WHERE clauses for a bulk action; an empty list means nothing was selected"""
+    conditions = []
+    if ids:
+        conditions.append(models.Post.id.in_(ids))
+    if post_filter:
+        if post_filter.status:
+            conditions.append(models.Post.status == post_filter.status)
+        if post_filter.verification_status:
+            conditions.append(models.Post.verification_status == post_filter.verification_status)
+        if post_filter.category:
+            conditions.append(models.Post.category == post_filter.category)
+        if post_filter.author_id is not None:
+            conditions.append(models.Post.author_id == post_filter.author_id)
+        if post_filter.created_before:
+            conditions.append(models.Post.created_at < post_filter.created_before)
+        if post_filter.updated_before:
+            conditions.append(
+                func.coalesce(models.Post.updated_at, models.Post.created_at) < post_filter.updated_before
+            )
+    return conditions
+
+
+def bulk_post_action(db: Session, bulk: schemas.PostBulkAction) -> int:
+    """
+    Publish, archive, re-draft, re-verify or delete every selected post with one
+    set-based statement. Returns the number of posts affected.
+    """
+    conditions = _bulk_selection(bulk.ids, bulk.filter)
+    if not conditions:
+        raise ValueError("Select posts by ids or by at least one filter field")
+    
+    if bulk.action == "delete":
+        # Impacts are removed by ON DELETE CASCADE
+        deleted, tombstones = _tombstoned_delete(
+            "post", models.Post.id, delete(models.Post).where(*conditions)
+        )
+        matched = db.scalar(select(func.count()).select_from(deleted).add_cte(tombstones))
+    else:
+        if bulk.action == "publish":
+            values = {
+                "status": "published",
+                "published_at": func.coalesce(models.Post.published_at, func.now())
+            }
+        elif bulk.action == "archive":
+            values = {"status": "archived", "published_at": None}
+        elif bulk.action == "draft":
+            values = {"status": "draft", "published_at": None}
+        else:
+            if not bulk.verification_status:
+                raise ValueError("verification_status is required for the verify action")
+            values = {"verification_status": bulk.verification_status}
+        stmt = update(models.Post).where(*conditions).values(**values)
+        if bulk.action == "publish":
+            # Enqueue the outbox events for the published posts in the same statement
+            published = stmt.returning(
+                models.Post.id, models.Post.slug, models.Post.title, models.Post.category
+            ).cte("published")
+            enqueued = outbox.enqueue_rows("post.published", published).cte("enqueued")
+            matched = db.scalar(select(func.count()).select_from(published).add_cte(enqueued))
+        else:
+            result = db.execute(stmt.execution_options(synchronize_session=False))
+            matched = result.rowcount
+    
+    if matched:
+        cache.invalidate(db, cache.POSTS, cache.POST_DETAILS)
+        emit(db, "posts.changed", action=bulk.action, count=matched)
+    db.commit()
+    return matched
+
+
 def search_posts(
     db: Session, 
     query: str, 
@@ -362,7 +843,8 @@ def search_posts(
     """Search posts by title or content"""
     search_filter = or_(
         models.Post.title.ilike(f"%{query}%"),
-        models.Post.content.ilike(f"%{query}%")
+        models.Post.content.ilike(f"%{query}%"),
+        _document_text_match(f"%{query}%")
     )
     
     db_query = db.query(models.Post).filter(search_filter)
@@ -385,70 +867,688 @@ def get_impacts(
     limit: int = 100,
     post_id: Optional[int] = None,
     type: Optional[str] = None,
-    status: Optional[str] = None
+    status: Optional[str] = None,
+    post_ids: Optional[List[int]] = None
 ) -> List[models.Impact]:
-    """Get impacts with optional filtering"""
+    """
+    Get impacts with optional filtering.
+    With post_ids, impacts of all those posts come back from one IN-query, grouped by post.
+    """
     query = db.query(models.Impact)
     
     if post_id:
         query = query.filter(models.Impact.post_id == post_id)
+    if post_ids:
+        query = query.filter(models.Impact.post_id.in_(post_ids))
     if type:
         query = query.filter(models.Impact.type == type)
     if status:
         query = query.filter(models.Impact.status == status)
     
-    return query.order_by(desc(models.Impact.date)).offset(skip).limit(limit).all()
+    if post_ids:
+        query = query.order_by(models.Impact.post_id, desc(models.Impact.date))
+    else:
+        query = query.order_by(desc(models.Impact.date))
+    
+    return query.offset(skip).limit(limit).all()
+
+
+def _post_status(post_id):
+    """Status of the post a written impact belongs to, returned by the same statement"""
+    return select(models.Post.status).where(models.Post.id == post_id).scalar_subquery()
 
 
-def create_impact(db: Session, impact: schemas.ImpactCreate) -> models.Impact:
+def _emit_impact_event(db: Session, event_type: str, post_status: Optional[str], **data):
+    # Drafts stay silent: impacts of unpublished posts are not announced on the public stream
+    if post_status == "published":
+        emit(db, event_type, **data)
+
+
+def create_impact(db: Session, impact: schemas.ImpactCreate, commit: bool = True) -> models.Impact:
     """Create a new impact"""
-    # Verify post exists
-    post = get_post(db, impact.post_id)
-    if not post:
-        raise ValueError("Post not found")
-    
-    db_impact = models.Impact(
-        title=impact.title,
-        description=impact.description,
-        date=impact.date,
-        type=impact.type,
-        status=impact.status,
-        post_id=impact.post_id
+    stmt = (
+        insert(models.Impact)
+        .values(
+            title=impact.title,
+            description=impact.description,
+            date=impact.date,
+            type=impact.type,
+            status=impact.status,
+            post_id=impact.post_id
+        )
+        # INSERT ... RETURNING does not correlate subqueries; the post id is known anyway
+        .returning(models.Impact, _post_status(impact.post_id))
     )
     
-    db.add(db_impact)
-    db.commit()
-    db.refresh(db_impact)
+    # The post_id foreign key doubles as the existence check for the post
+    try:
+        db_impact, post_status = db.execute(stmt).one()
+    except IntegrityError as e:
+        if commit:
+            db.rollback()
+        if _is_foreign_key_violation(e):
+            raise ValueError("Post not found")
+        raise
+    
+    # Listings carry impact counts
+    cache.invalidate(db, cache.POSTS)
+    _emit_impact_event(db, "impact.created", post_status, id=db_impact.id, post_id=db_impact.post_id,
+                       impact_type=db_impact.type, status=db_impact.status)
+    outbox.enqueue(
+        db, "impact.created", dedupe_key=f"impact.created:{db_impact.id}",
+        id=db_impact.id, post_id=db_impact.post_id, title=db_impact.title,
+        type=db_impact.type, status=db_impact.status, date=db_impact.date.isoformat()
+    )
+    if commit:
+        db.commit()
     return db_impact
 
 
 def update_impact(
     db: Session,
     impact_id: int,
-    impact_update: schemas.ImpactUpdate
+    impact_update: schemas.ImpactUpdate,
+    commit: bool = True
 ) -> Optional[models.Impact]:
-    """Update an existing impact"""
-    db_impact = get_impact(db, impact_id)
-    if not db_impact:
-        return None
-    
+    """Update an existing impact with a single UPDATE ... RETURNING"""
     update_data = impact_update.model_dump(exclude_unset=True)
+    if not update_data:
+        return get_impact(db, impact_id)
     
-    # Apply updates
-    for field, value in update_data.items():
-        setattr(db_impact, field, value)
+    stmt = (
+        update(models.Impact)
+        .where(models.Impact.id == impact_id)
+        .values(**update_data)
+        .returning(models.Impact, _post_status(models.Impact.post_id))
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    row = db.execute(stmt).first()
+    if row is None:
+        return None
+    db_impact, post_status = row
     
-    db.commit()
-    db.refresh(db_impact)
+    cache.invalidate(db, cache.POSTS)
+    _emit_impact_event(db, "impact.updated", post_status, id=db_impact.id, post_id=db_impact.post_id,
+                       impact_type=db_impact.type, status=db_impact.status)
+    if commit:
+        db.commit()
     return db_impact
 
 
-def delete_impact(db: Session, impact_id: int) -> bool:
-    """Delete an impact"""
-    db_impact = get_impact(db, impact_id)
-    if not db_impact:
+def delete_impact(db: Session, impact_id: int, commit: bool = True) -> bool:
+    """Delete an impact without loading it first"""
+    deleted, tombstones = _tombstoned_delete(
+        "impact",
+        models.Impact.id,
+        delete(models.Impact).where(models.Impact.id == impact_id).returning(models.Impact.post_id)
+    )
+    row = db.execute(
+        select(deleted.c.entity_id, _post_status(deleted.c.post_id)).add_cte(tombstones)
+    ).first()
+    if row is None:
         return False
     
-    db.delete(db_impact)
+    cache.invalidate(db, cache.POSTS)
+    _emit_impact_event(db, "impact.deleted", row[1], id=impact_id)
+    if commit:
+        db.commit()
+    return True
+
+
+def import_impacts(db: Session, records: List[tuple]) -> List[schemas.ImportResult]:
+    """
+    Insert a batch of (line, ImpactCreate) records in one transaction.
+    Missing posts are found with one IN-query instead of per-row FK failures.
+    """
+    if not records:
+        return []
+    
+    post_ids = {impact.post_id for _, impact in records}
+    existing = set(db.scalars(select(models.Post.id).where(models.Post.id.in_(post_ids))))
+    
+    valid = [(line, impact) for line, impact in records if impact.post_id in existing]
+    ids_by_line = {}
+    if valid:
+        impacts_table = models.Impact.__table__
+        inserted = db.execute(
+            insert(impacts_table).returning(impacts_table.c.id, sort_by_parameter_order=True),
+            [impact.model_dump() for _, impact in valid]
+        ).scalars().all()
+        ids_by_line = {line: impact_id for (line, _), impact_id in zip(valid, inserted)}
+        cache.invalidate(db, cache.POSTS)
+        emit(db, "impacts.changed", action="import", count=len(inserted))
+    db.commit()
+    
+    results = []
+    for line, impact in records:
+        if line in ids_by_line:
+            results.append(schemas.ImportResult(line=line, status="created", id=ids_by_line[line]))
+        else:
+            results.append(schemas.ImportResult(line=line, status="error", error="Post not found"))
+    return results
+
+
+# Change feed
+# Sources are merged in (change_xid, source rank, id) order; the rank breaks ties
+# between rows of different sources written by the same transaction.
+CHANGE_SOURCES = ("post", "impact", "deleted")
+
+
+def _after_cursor(change_xid, id_column, rank: int, since: Optional[tuple]):
+    """Rows of source `rank` that sort after the (change_xid, rank, id) cursor"""
+    if since is None:
+        return true()
+    since_xid, since_rank, since_id = since
+    if rank == since_rank:
+        return tuple_(change_xid, id_column) > tuple_(literal(since_xid), literal(since_id))
+    if rank > since_rank:
+        return change_xid >= since_xid
+    return change_xid > since_xid
+
+
+def get_changes(
+    db: Session,
+    since: Optional[tuple] = None,
+    limit: int = 500
+) -> Tuple[List[dict], Optional[tuple], bool]:
+    """
+    Posts and impacts changed or deleted after the `since` cursor, in the order of
+    the transactions that wrote them. Rows written by transactions at or after the
+    oldest one still running are held back: every transaction before it has
+    finished, so nothing can later commit behind the cursor, however long it ran.
+    Returns (changes, next cursor, has_more).
+    Posts that are no longer published are reported as deletions.
+    """
+    horizon = func.pg_snapshot_xmin(func.pg_current_snapshot()).cast(Text).cast(BigInteger)
+    changes = []
+    
+    posts = (
+        db.query(models.Post)
+        .options(joinedload(models.Post.author))
+        .filter(
+            models.Post.change_xid < horizon,
+            _after_cursor(models.Post.change_xid, models.Post.id, 0, since)
+        )
+        .order_by(models.Post.change_xid, models.Post.id)
+        .limit(limit + 1)
+    )
+    for post in posts:
+        published = post.status == "published"
+        changes.append({
+            "key": (post.change_xid, 0, post.id),
+            "entity": "post",
+            "op": "upsert" if published else "delete",
+            "id": post.id,
+            "changed_at": post.updated_at,
+            "post": post if published else None
+        })
+    
+    impacts = (
+        db.query(models.Impact)
+        .join(models.Post, models.Post.id == models.Impact.post_id)
+        .filter(
+            models.Post.status == "published",
+            models.Impact.change_xid < horizon,
+            _after_cursor(models.Impact.change_xid, models.Impact.id, 1, since)
+        )
+        .order_by(models.Impact.change_xid, models.Impact.id)
+        .limit(limit + 1)
+    )
+    for impact in impacts:
+        changes.append({
+            "key": (impact.change_xid, 1, impact.id),
+            "entity": "impact",
+            "op": "upsert",
+            "id": impact.id,
+            "changed_at": impact.updated_at,
+            "impact": impact
+        })
+    
+    tombstones = (
+        db.query(models.DeletedRecord)
+        .filter(
+            models.DeletedRecord.change_xid < horizon,
+            _after_cursor(models.DeletedRecord.change_xid, models.DeletedRecord.id, 2, since)
+        )
+        .order_by(models.DeletedRecord.change_xid, models.DeletedRecord.id)
+        .limit(limit + 1)
+    )
+    for tombstone in tombstones:
+        changes.append({
+            "key": (tombstone.change_xid, 2, tombstone.id),
+            "entity": tombstone.entity_type,
+            "op": "delete",
+            "id": tombstone.entity_id,
+            "changed_at": tombstone.deleted_at
+        })
+    
+    changes.sort(key=lambda change: change["key"])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    next_cursor = changes[-1]["key"] if changes else since
+    return changes, next_cursor, has_more
+
+
+# Push subscription operations
+PUSH_PREFERENCES = {
+    "new_posts": models.PushSubscription.notify_new_posts,
+    "updates": models.PushSubscription.notify_updates,
+    "weekly_digest": models.PushSubscription.notify_weekly_digest,
+}
+
+
+def upsert_push_subscription(
+    db: Session,
+    subscription: schemas.PushSubscriptionCreate,
+    user_id: Optional[int] = None
+) -> models.PushSubscription:
+    """Create or refresh the subscription for a push endpoint in one statement"""
+    stmt = pg_insert(models.PushSubscription).values(
+        endpoint=subscription.subscription.endpoint,
+        p256dh=subscription.subscription.keys.p256dh,
+        auth=subscription.subscription.keys.auth,
+        user_agent=subscription.userAgent,
+        user_id=user_id,
+        is_active=True,
+        notify_new_posts=True,
+        notify_updates=True,
+        notify_weekly_digest=False,
+    )
+    # Browsers rotate keys for the same endpoint; keep preferences, refresh the rest
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.PushSubscription.endpoint],
+        set_={
+            "p256dh": stmt.excluded.p256dh,
+            "auth": stmt.excluded.auth,
+            "user_agent": stmt.excluded.user_agent,
+            "user_id": func.coalesce(stmt.excluded.user_id, models.PushSubscription.user_id),
+            "is_active": True,
+            "updated_at": func.now(),
+        },
+    ).returning(models.PushSubscription)
+    db_subscription = db.scalars(stmt).one()
+    db.commit()
+    return db_subscription
+
+
+def deactivate_push_subscription(db: Session, endpoint: str) -> bool:
+    """Stop sending to an endpoint; returns False if it is unknown"""
+    result = db.execute(
+        update(models.PushSubscription)
+        .where(models.PushSubscription.endpoint == endpoint)
+        .values(is_active=False)
+    )
+    db.commit()
+    return result.rowcount > 0
+
+
+def update_push_preferences(
+    db: Session,
+    endpoint: str,
+    preferences: schemas.PushSubscriptionUpdate
+) -> Optional[models.PushSubscription]:
+    """Update the notification preferences of the subscription for an endpoint"""
+    values = preferences.model_dump(exclude_unset=True, exclude={"endpoint"})
+    stmt = update(models.PushSubscription).where(models.PushSubscription.endpoint == endpoint)
+    if values:
+        stmt = stmt.values(**values)
+    else:
+        stmt = stmt.values(updated_at=func.now())
+    db_subscription = db.scalars(stmt.returning(models.PushSubscription)).first()
+    db.commit()
+    return db_subscription
+
+
+def get_push_targets(
+    db: Session,
+    after_id: int = 0,
+    limit: int = 1000,
+    preference: Optional[str] = None,
+    user_ids: Optional[List[int]] = None,
+    subscription_ids: Optional[List[int]] = None
+) -> List[tuple]:
+    """
+    One keyset page of active subscriptions as (id, endpoint, p256dh, auth) rows,
+    ordered by id; pass the last id back as after_id for the next page.
+    """
+    stmt = (
+        select(
+            models.PushSubscription.id,
+            models.PushSubscription.endpoint,
+            models.PushSubscription.p256dh,
+            models.PushSubscription.auth,
+        )
+        .where(models.PushSubscription.is_active.is_(True), models.PushSubscription.id > after_id)
+        .order_by(models.PushSubscription.id)
+        .limit(limit)
+    )
+    if preference:
+        stmt = stmt.where(PUSH_PREFERENCES[preference].is_(True))
+    if user_ids is not None:
+        stmt = stmt.where(models.PushSubscription.user_id.in_(user_ids))
+    if subscription_ids is not None:
+        stmt = stmt.where(models.PushSubscription.id.in_(subscription_ids))
+    return [tuple(row) for row in db.execute(stmt)]
+
+
+def delete_push_subscriptions(db: Session, subscription_ids: List[int]) -> int:
+    """Prune subscriptions the push service reported as gone, in one statement"""
+    if not subscription_ids:
+        return 0
+    result = db.execute(
+        delete(models.PushSubscription).where(models.PushSubscription.id.in_(subscription_ids))
+    )
+    db.commit()
+    return result.rowcount
+
+
+# Weekly digest queries
+def get_top_posts(db: Session, since: datetime, until: datetime, limit: int = 5) -> List[dict]:
+    """Posts published in [since, until) ranked by impact count, verified first among equals"""
+    impact_count = func.count(models.Impact.id)
+    rows = db.execute(
+        select(
+            models.Post.id,
+            models.Post.slug,
+            models.Post.title,
+            models.Post.verification_status,
+            impact_count.label("impact_count")
+        )
+        .outerjoin(models.Impact, models.Impact.post_id == models.Post.id)
+        .where(
+            models.Post.status == "published",
+            models.Post.published_at >= since,
+            models.Post.published_at < until
+        )
+        .group_by(models.Post.id)
+        .order_by(
+            impact_count.desc(),
+            (models.Post.verification_status == "verified").desc(),
+            models.Post.published_at.desc()
+        )
+        .limit(limit)
+    ).mappings()
+    return [dict(row) for row in rows]
+
+
+def _digest_subscribers():
+    return (
+        models.PushSubscription.is_active.is_(True),
+        models.PushSubscription.notify_weekly_digest.is_(True)
+    )
+
+
+def next_digest_page(db: Session, after_id: int, limit: int) -> Tuple[int, Optional[int]]:
+    """(count, last id) of the next keyset page of digest subscribers, without loading rows"""
+    page = (
+        select(models.PushSubscription.id)
+        .where(*_digest_subscribers(), models.PushSubscription.id > after_id)
+        .order_by(models.PushSubscription.id)
+        .limit(limit)
+        .subquery()
+    )
+    count, last_id = db.execute(select(func.count(), func.max(page.c.id))).one()
+    return count, last_id
+
+
+def get_digest_targets(db: Session, after_id: int, last_id: int) -> List[tuple]:
+    """Digest subscribers with id in (after_id, last_id] as (id, endpoint, p256dh, auth, username)"""
+    rows = db.execute(
+        select(
+            models.PushSubscription.id,
+            models.PushSubscription.endpoint,
+            models.PushSubscription.p256dh,
+            models.PushSubscription.auth,
+            models.User.username
+        )
+        .outerjoin(models.User, models.User.id == models.PushSubscription.user_id)
+        .where(
+            *_digest_subscribers(),
+            models.PushSubscription.id > after_id,
+            models.PushSubscription.id <= last_id
+        )
+        .order_by(models.PushSubscription.id)
+    )
+    return [tuple(row) for row in rows]
+
+
+# Webhook operations
+def get_webhooks(db: Session) -> List[models.Webhook]:
+    return db.query(models.Webhook).order_by(models.Webhook.id).all()
+
+
+def get_webhook(db: Session, webhook_id: int) -> Optional[models.Webhook]:
+    return db.query(models.Webhook).filter(models.Webhook.id == webhook_id).first()
+
+
+def create_webhook(db: Session, webhook: schemas.WebhookCreate) -> models.Webhook:
+    values = webhook.model_dump(exclude={"secret"})
+    db_webhook = models.Webhook(**values, secret=webhook.secret or secrets.token_urlsafe(32))
+    db.add(db_webhook)
+    db.commit()
+    db.refresh(db_webhook)
+    return db_webhook
+
+
+def update_webhook(
+    db: Session,
+    webhook_id: int,
+    webhook_update: schemas.WebhookUpdate
+) -> Optional[models.Webhook]:
+    update_data = webhook_update.model_dump(exclude_unset=True)
+    if update_data.get("is_active"):
+        # Re-enabling a disabled endpoint starts it with a clean slate
+        update_data.update(consecutive_failures=0, disabled_at=None)
+    if not update_data:
+        return get_webhook(db, webhook_id)
+    db_webhook = db.scalars(
+        update(models.Webhook)
+        .where(models.Webhook.id == webhook_id)
+        .values(**update_data)
+        .returning(models.Webhook)
+        .execution_options(populate_existing=True)
+    ).first()
+    db.commit()
+    return db_webhook
+
+
+def delete_webhook(db: Session, webhook_id: int) -> bool:
+    """Delete a webhook; its queued deliveries go via ON DELETE CASCADE"""
+    result = db.execute(delete(models.Webhook).where(models.Webhook.id == webhook_id))
+    db.commit()
+    return result.rowcount > 0
+
+
+# Document operations
+def get_document(db: Session, document_id: int) -> Optional[models.Document]:
+    return db.get(models.Document, document_id)
+
+
+def get_document_by_hash(db: Session, sha256: str, uploaded_by: int) -> Optional[models.Document]:
+    """The user's own document for a file, if they uploaded it before"""
+    return db.scalars(
+        select(models.Document).where(models.Document.sha256 == sha256, models.Document.uploaded_by == uploaded_by)
+    ).first()
+
+
+def get_published_document(db: Session, sha256: str) -> Optional[models.Document]:
+    """A document whose readers currently get the file with this hash"""
+    return db.scalars(select(models.Document).where(models.Document.published_sha256 == sha256)).first()
+
+
+def _preview_sha256_column():
+    """Published hash of a post's first document with a rendered preview (see previews.py), for listings"""
+    return (
+        select(models.Document.published_sha256)
+        .join(models.PostDocument, models.PostDocument.document_id == models.Document.id)
+        .where(
+            models.PostDocument.post_id == models.Post.id,
+            models.Document.preview_sha256 == models.Document.published_sha256,
+            models.Document.preview_error.is_(None),
+        )
+        .order_by(models.PostDocument.created_at, models.PostDocument.document_id)
+        .limit(1)
+        .correlate(models.Post)
+        .scalar_subquery()
+        .label("preview_sha256")
+    )
+
+
+def create_document(db: Session, **values) -> models.Document:
+    """Record a stored document; a concurrent upload of the same file by the same user gets the same row"""
+    stmt = pg_insert(models.Document).values(**values)
+    db_document = db.scalars(
+        stmt.on_conflict_do_update(
+            index_elements=[models.Document.sha256, models.Document.uploaded_by],
+            set_={"storage_key": stmt.excluded.storage_key},
+        )
+        .returning(models.Document)
+        .execution_options(populate_existing=True)
+    ).one()
+    db.commit()
+    return db_document
+
+
+def attach_document(db: Session, post_id: int, document_id: int, filename: str) -> models.PostDocument:
+    """Attach a document to a post; attaching it again only renames it"""
+    stmt = pg_insert(models.PostDocument).values(post_id=post_id, document_id=document_id, filename=filename)
+    db_link = db.scalars(
+        stmt.on_conflict_do_update(
+            index_elements=[models.PostDocument.post_id, models.PostDocument.document_id],
+            set_={"filename": stmt.excluded.filename},
+        )
+        .returning(models.PostDocument)
+        .execution_options(populate_existing=True)
+    ).one()
+    db.commit()
+    return db_link
+
+
+def get_post_documents(db: Session, post_id: int) -> List[models.PostDocument]:
+    return db.scalars(
+        select(models.PostDocument)
+        .options(joinedload(models.PostDocument.document))
+        .where(models.PostDocument.post_id == post_id)
+        .order_by(models.PostDocument.created_at, models.PostDocument.document_id)
+    ).all()
+
+
+def detach_document(db: Session, post_id: int, document_id: int) -> bool:
+    """Remove a document from a post; the stored file stays for other posts using it"""
+    result = db.execute(
+        delete(models.PostDocument)
+        .where(models.PostDocument.post_id == post_id, models.PostDocument.document_id == document_id)
+    )
+    db.commit()
+    return result.rowcount > 0
+
+
+def document_attached_to_author(db: Session, document_id: int, author_id: int) -> bool:
+    """Whether the document is attached to one of the author's posts"""
+    return db.scalar(
+        select(
+            select(models.PostDocument.document_id)
+            .join(models.Post, models.Post.id == models.PostDocument.post_id)
+            .where(models.PostDocument.document_id == document_id, models.Post.author_id == author_id)
+            .exists()
+        )
+    )
+
+
+def document_attached_to_others(db: Session, document_id: int, author_id: int) -> bool:
+    """Whether the document is also attached to a post that is not the author's"""
+    return db.scalar(
+        select(
+            select(models.PostDocument.document_id)
+            .join(models.Post, models.Post.id == models.PostDocument.post_id)
+            .where(models.PostDocument.document_id == document_id, models.Post.author_id != author_id)
+            .exists()
+        )
+    )
+
+
+def get_redactions(db: Session, document_id: int) -> List[models.Redaction]:
+    return db.scalars(
+        select(models.Redaction).where(models.Redaction.document_id == document_id).order_by(models.Redaction.id)
+    ).all()
+
+
+def get_rendition(db: Session, document_id: int, redaction_hash: str) -> Optional[models.RedactedDocument]:
+    return db.scalars(
+        select(models.RedactedDocument).where(
+            models.RedactedDocument.document_id == document_id,
+            models.RedactedDocument.redaction_hash == redaction_hash,
+        )
+    ).first()
+
+
+def _queue_rendition(
+    db: Session, document: models.Document, redaction_hash: str, boxes: List[dict]
+) -> models.RedactedDocument:
+    """The rendition of a redaction set, queued unless it already exists; a failed one is retried"""
+    stmt = pg_insert(models.RedactedDocument).values(
+        document_id=document.id,
+        redaction_hash=redaction_hash,
+        boxes=boxes,
+    )
+    failed = models.RedactedDocument.status == "failed"
+    return db.scalars(
+        stmt.on_conflict_do_update(
+            index_elements=[models.RedactedDocument.document_id, models.RedactedDocument.redaction_hash],
+            set_={
+                "status": case((failed, "pending"), else_=models.RedactedDocument.status),
+                "attempts": case((failed, 0), else_=models.RedactedDocument.attempts),
+                "available_at": case((failed, func.now()), else_=models.RedactedDocument.available_at),
+            },
+        )
+        .returning(models.RedactedDocument)
+        .execution_options(populate_existing=True)
+    ).one()
+
+
+def replace_redactions(
+    db: Session, document_id: int, redactions: List[schemas.RedactionCreate], user_id: int
+) -> Tuple[models.Document, Optional[models.RedactedDocument]]:
+    """
+    Replace a document's redaction set and publish accordingly (see redaction.py);
+    returns the document and the rendition of the new set, if any
+    """
+    # Serialises concurrent saves for the same document
+    document = db.get(models.Document, document_id, with_for_update=True, populate_existing=True)
+    boxes = redaction.canonical_boxes(redactions)
+    redaction_hash = redaction.redaction_set_hash(boxes)
+
+    db.execute(delete(models.Redaction).where(models.Redaction.document_id == document_id))
+    if redactions:
+        db.execute(insert(models.Redaction), [
+            {**item.model_dump(), "document_id": document_id, "created_by": user_id} for item in redactions
+        ])
+
+    rendition = None
+    if redaction_hash is None:
+        published = (document.sha256, document.size)
+    else:
+        rendition = _queue_rendition(db, document, redaction_hash, boxes)
+        # Until it is ready there is nothing to publish: readers must not get the original
+        published = (rendition.sha256, rendition.size) if rendition.status == "ready" else (None, None)
+
+    if redaction_hash != document.redaction_hash:
+        # Searchable text must come from the file readers get; it is extracted again once that is ready
+        db.execute(delete(models.DocumentPage).where(models.DocumentPage.document_id == document_id))
+        document.text_status = "pending" if published[0] else "waiting"
+        document.text_pages = 0
+        document.text_attempts = 0
+        document.text_error = None
+        document.text_available_at = func.now()
+        document.text_extracted_at = None
+        # Previews are rendered again for the new published file (see previews.py)
+        document.preview_attempts = 0
+        document.preview_error = None
+        document.preview_available_at = func.now()
+        cache.invalidate(db, cache.POSTS)
+    document.redaction_hash = redaction_hash
+    document.published_sha256, document.published_size = published
+    cache.invalidate(db, cache.document_tag(document_id))
     db.commit()
-    return True 
\ No newline at end of file
+    db.refresh(document)
+    return document, rendition
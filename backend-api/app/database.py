@@ -13,6 +13,10 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set")
 
+# Upper bound for any statement; requests under admission control get a tighter
+# per-transaction timeout from their remaining budget (see app/admission.py)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
 # Add connection pool and timeout settings for better reliability
 engine = create_engine(
     DATABASE_URL,
@@ -21,12 +25,14 @@ engine = create_engine(
     max_overflow=10,     # Maximum overflow connections allowed
     connect_args={
         "connect_timeout": 30,  # Connection timeout in seconds
-        "options": "-c statement_timeout=30000"  # Query timeout in milliseconds
+        "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"  # Query timeout in milliseconds
     }
 )
 
 # Create SessionLocal class for database sessions
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False keeps RETURNING-populated objects usable after commit
+# instead of re-SELECTing them on first attribute access.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Create Base class for our models
 Base = declarative_base()
@@ -0,0 +1,228 @@
+"""
+Weekly digest of the top posts for subscribers with notify_weekly_digest.
+
+Run once a week from a scheduler (cron, Cloud Scheduler, ...), from backend-api/:
+    python -m app.digest                  # digest of the last complete ISO week
+    python -m app.digest --week 2026-W42  # a given week; resumes it if interrupted
+
+A run has three phases, each timed into digest_runs.metrics:
+
+1. rank    - the week's top posts are computed once and stored on the run;
+2. render  - the shared notification is rendered once; only the title varies
+             per subscriber (a greeting for signed-in users) and is applied
+             at delivery time;
+3. enqueue - opted-in subscriptions are walked in keyset pages without
+             loading them; each page becomes one "digest.deliver" outbox
+             event, committed together with the run's checkpoint.
+
+An interrupted run resumes from its checkpoint. The outbox worker performs
+the deliveries (deliver_batch) and adds them to the run's delivered count.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import crud, models, outbox, push
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+DIGEST_TOP_POSTS = int(os.getenv("DIGEST_TOP_POSTS", "5"))
+# Subscriptions per enqueued delivery event
+DIGEST_BATCH_SIZE = int(os.getenv("DIGEST_BATCH_SIZE", "1000"))
+# A digest is stale after a couple of days; let push services drop it
+DIGEST_TTL_SECONDS = 2 * 24 * 3600
+
+
+def iso_week(moment: datetime) -> str:
+    year, week, _ = moment.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def week_bounds(week: str) -> Tuple[datetime, datetime]:
+    year, number = week.split("-W")
+    start = datetime.fromisocalendar(int(year), int(number), 1).replace(tzinfo=timezone.utc)
+    return start, start + timedelta(days=7)
+
+
+def render_message(week: str, top_posts: List[dict]) -> dict:
+    """The notification shared by every subscriber of this run"""
+    titles = [post["title"] for post in top_posts]
+    body = " · ".join(titles)
+    if len(body) > 180:
+        body = body[:177] + "..."
+    return {
+        "title": "This week on LexLeaks",
+        "body": body,
+        "icon": "/icon-192x192.png",
+        "badge": "/icon-96x96.png",
+        "tag": f"digest-{week}",
+        "data": {
+            "url": "/",
+            "week": week,
+            # Kept small: push services cap payloads at about 4KB
+            "posts": [
+                {
+                    "id": post["id"],
+                    "slug": post["slug"],
+                    "title": post["title"][:100],
+                    "impact_count": post["impact_count"],
+                    "verified": post["verification_status"] == "verified",
+                }
+                for post in top_posts
+            ],
+        },
+    }
+
+
+def personalize(target: tuple) -> Optional[dict]:
+    """Per-subscriber fields; target is (id, endpoint, p256dh, auth, username)"""
+    username = target[4]
+    if username:
+        return {"title": f"{username}, this week on LexLeaks"}
+    return None
+
+
+def _start_run(db: Session, week: str) -> models.DigestRun:
+    """Create the week's run, or return the existing one to resume it"""
+    period_start, period_end = week_bounds(week)
+    db.execute(
+        pg_insert(models.DigestRun.__table__)
+        .values(
+            week=week, status="running", period_start=period_start, period_end=period_end,
+            checkpoint_id=0, enqueued=0, delivered=0
+        )
+        .on_conflict_do_nothing(index_elements=["week"])
+    )
+    db.commit()
+    return db.scalars(select(models.DigestRun).where(models.DigestRun.week == week)).one()
+
+
+def run_digest(
+    week: str,
+    batch_size: int = DIGEST_BATCH_SIZE,
+    top_n: int = DIGEST_TOP_POSTS
+) -> dict:
+    """Build the digest for `week` and enqueue its deliveries; returns a summary with phase timings"""
+    db = SessionLocal()
+    try:
+        run = _start_run(db, week)
+        metrics = dict(run.metrics or {})
+        resumed = run.message is not None
+
+        if run.status != "completed" and run.message is None:
+            started = time.perf_counter()
+            top_posts = crud.get_top_posts(db, run.period_start, run.period_end, limit=top_n)
+            metrics["rank_seconds"] = round(time.perf_counter() - started, 4)
+
+            started = time.perf_counter()
+            run.message = render_message(week, top_posts) if top_posts else {}
+            metrics["render_seconds"] = round(time.perf_counter() - started, 4)
+            run.metrics = dict(metrics)
+            db.commit()
+
+        if run.status != "completed" and not run.message:
+            # Nothing was published that week
+            run.status = "completed"
+            run.completed_at = func.now()
+            db.commit()
+
+        if run.status != "completed":
+            started = time.perf_counter()
+            while True:
+                count, last_id = crud.next_digest_page(db, run.checkpoint_id, batch_size)
+                if not count:
+                    break
+                # The event and the checkpoint commit together, so a resumed run neither
+                # skips nor repeats a page; the dedupe key guards against overlapping runs
+                outbox.enqueue(
+                    db, "digest.deliver", dedupe_key=f"digest:{week}:{last_id}",
+                    run_id=run.id, after_id=run.checkpoint_id, last_id=last_id
+                )
+                run.checkpoint_id = last_id
+                run.enqueued += count
+                db.commit()
+            metrics["enqueue_seconds"] = round(
+                metrics.get("enqueue_seconds", 0) + time.perf_counter() - started, 4
+            )
+            run.metrics = dict(metrics)
+            run.status = "completed"
+            run.completed_at = func.now()
+            db.commit()
+
+        db.refresh(run)
+        return {
+            "week": run.week,
+            "status": run.status,
+            "resumed": resumed,
+            "top_posts": len((run.message or {}).get("data", {}).get("posts", [])),
+            "enqueued": run.enqueued,
+            "delivered": run.delivered,
+            "metrics": run.metrics or {},
+        }
+    finally:
+        db.close()
+
+
+def _load_batch(event: dict) -> Tuple[Optional[dict], List[tuple]]:
+    db = SessionLocal()
+    try:
+        message = db.scalar(select(models.DigestRun.message).where(models.DigestRun.id == event["run_id"]))
+        if not message:
+            return None, []
+        return message, crud.get_digest_targets(db, event["after_id"], event["last_id"])
+    finally:
+        db.close()
+
+
+def _record_delivered(run_id: int, sent: int):
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(models.DigestRun)
+            .where(models.DigestRun.id == run_id)
+            .values(delivered=models.DigestRun.delivered + sent)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def deliver_batch(event: dict):
+    """Outbox handler for one "digest.deliver" page of subscribers"""
+    message, targets = await run_in_threadpool(_load_batch, event)
+    if not targets:
+        return
+    sender = push.PushSender(message, ttl=DIGEST_TTL_SECONDS, urgency="low", topic=message["tag"])
+
+    async def batches():
+        yield targets
+
+    result = await push.fan_out(sender, batches(), push.prune_subscriptions, personalize=personalize)
+    await run_in_threadpool(_record_delivered, event["run_id"], result.sent)
+    logger.info("Digest run %s delivered %d/%d (%d pruned) at %.0f/s",
+                event["run_id"], result.sent, result.matched, result.pruned, result.per_second)
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Build and enqueue the LexLeaks weekly digest")
+    parser.add_argument("--week", help="ISO week such as 2026-W42 (default: last complete week)")
+    parser.add_argument("--batch-size", type=int, default=DIGEST_BATCH_SIZE)
+    parser.add_argument("--top", type=int, default=DIGEST_TOP_POSTS, help="Number of posts in the digest")
+    args = parser.parse_args(argv)
+
+    week = args.week or iso_week(datetime.now(timezone.utc) - timedelta(days=7))
+    print(json.dumps(run_digest(week, args.batch_size, args.top), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Document ingestion: streamed uploads, content hashing and shared storage.
+
+An upload is the raw request body (Content-Type application/pdf), read as it
+arrives and written to a staging file in UPLOAD_WRITE_BYTES blocks, hashing
+each block on the way. Hashing and writing run in the threadpool (both
+release the GIL), and at most one block per upload is held in memory, so a
+file of hundreds of MB costs the worker no more than a small one.
+
+Once the body is complete its SHA-256 gives its content address in storage
+(see storage.py): a file already stored there is not stored again, and the
+staged copy is dropped. The `documents` row, with its redactions and
+published file, belongs to the uploader: each user uploading the same file
+gets their own (a repeat upload by the same user reuses theirs), and nothing
+in the response says whether someone else had stored the file before.
+
+Bodies over DOCUMENT_MAX_BYTES are refused with a 413 as soon as the limit
+is crossed (or up front, from Content-Length), and bodies that are not PDFs
+with a 415 after the first block.
+"""
+import hashlib
+import os
+import tempfile
+from typing import AsyncIterator, Optional
+
+import pymupdf
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from . import crud, models, storage
+
+DOCUMENT_MAX_BYTES = int(os.getenv("DOCUMENT_MAX_BYTES", str(512 * 1024 * 1024)))
+UPLOAD_WRITE_BYTES = int(os.getenv("UPLOAD_WRITE_BYTES", str(1024 * 1024)))
+
+PDF_CONTENT_TYPE = "application/pdf"
+PDF_MAGIC = b"%PDF-"
+
+
+class StagedUpload:
+    """A complete upload waiting in the staging directory"""
+
+    def __init__(self, path: str, sha256: str, size: int):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Documents are limited to {DOCUMENT_MAX_BYTES // (1024 * 1024)} MB",
+    )
+
+
+def check_length(content_length: Optional[str]):
+    """Refuse an oversized upload from its Content-Length, before reading the body"""
+    if content_length and content_length.isdigit() and int(content_length) > DOCUMENT_MAX_BYTES:
+        raise _too_large()
+
+
+def _write_block(file, hasher, block: bytearray):
+    hasher.update(block)
+    file.write(block)
+
+
+def _close_staged(file):
+    file.flush()
+    os.fsync(file.fileno())
+    file.close()
+
+
+async def stage_upload(chunks: AsyncIterator[bytes]) -> StagedUpload:
+    """Stream a request body to a staging file, hashing it on the way"""
+    fd, path = tempfile.mkstemp(dir=storage.get_backend().staging_dir, suffix=".part")
+    file = os.fdopen(fd, "wb")
+    hasher = hashlib.sha256()
+    size = 0
+    checked = False
+    block = bytearray()
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > DOCUMENT_MAX_BYTES:
+                raise _too_large()
+            block += chunk
+            if not checked and len(block) >= len(PDF_MAGIC):
+                _check_magic(block)
+                checked = True
+            if len(block) >= UPLOAD_WRITE_BYTES:
+                block, full = bytearray(), block
+                await run_in_threadpool(_write_block, file, hasher, full)
+        if not checked:
+            _check_magic(block)
+        if block:
+            await run_in_threadpool(_write_block, file, hasher, block)
+        await run_in_threadpool(_close_staged, file)
+    except BaseException:
+        # Includes the client going away mid-upload
+        file.close()
+        os.remove(path)
+        raise
+    return StagedUpload(path, hasher.hexdigest(), size)
+
+
+def _check_magic(head: bytearray):
+    if not head.startswith(PDF_MAGIC):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Only PDF documents can be uploaded",
+        )
+
+
+def count_pages(path: str) -> int:
+    """Page count of a PDF; reads the cross-reference table, not every page"""
+    try:
+        with pymupdf.open(path, filetype="pdf") as pdf:
+            return pdf.page_count
+    except (pymupdf.FileDataError, RuntimeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="The file is not a readable PDF",
+        )
+
+
+def store(
+    db: Session, staged: StagedUpload, post_id: int, filename: str, uploaded_by: int
+) -> models.PostDocument:
+    """Attach a staged upload to a post as the uploader's document, storing the file unless it is stored already"""
+    backend = storage.get_backend()
+    key = storage.document_key(staged.sha256)
+    document = crud.get_document_by_hash(db, staged.sha256, uploaded_by)
+    try:
+        page_count = count_pages(staged.path) if document is None else None
+        # Also repairs a document whose file has gone missing
+        if not backend.exists(key):
+            backend.put(staged.path, key, PDF_CONTENT_TYPE)
+        if document is None:
+            document = crud.create_document(
+                db,
+                sha256=staged.sha256,
+                size=staged.size,
+                published_sha256=staged.sha256,
+                published_size=staged.size,
+                page_count=page_count,
+                content_type=PDF_CONTENT_TYPE,
+                storage_key=key,
+                uploaded_by=uploaded_by,
+            )
+    finally:
+        staged.discard()
+    return crud.attach_document(db, post_id, document.id, filename)
@@ -0,0 +1,191 @@
+"""
+Live update events for posts and impacts.
+
+crud write paths call `emit(db, ...)` before committing. Events are only
+delivered once the transaction commits:
+
+- memory backend (default): queued on the session and handed to the
+  in-process broadcaster from an after_commit hook.
+- postgres backend (EVENTS_BACKEND=postgres): sent with pg_notify inside the
+  transaction, and every worker's listener thread feeds its own broadcaster,
+  so all workers see every event.
+
+The broadcaster fans each event out to SSE subscribers through bounded
+per-client queues; a client that falls behind is evicted and reconnects.
+"""
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+from typing import Callable, Optional, Set
+
+from sqlalchemy import event, func
+from sqlalchemy import select as sql_select
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")  # memory, postgres
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "lexleaks_events")
+# Events buffered per SSE client before it is considered too slow and evicted
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "64"))
+
+
+class Subscription:
+    """One connected SSE client"""
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.evicted = False
+
+
+class Broadcaster:
+    """In-process fan-out of encoded events to every subscriber on one event loop"""
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.evictions = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attach to the event loop serving the SSE connections"""
+        self._loop = loop
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, message: str):
+        """Thread-safe: schedule fan-out of an already encoded event on the bound loop"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._fan_out, message)
+
+    def _fan_out(self, message: str):
+        # Encode the SSE frame once, not once per client
+        frame = sse_frame(message)
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._evict(subscription)
+
+    def _evict(self, subscription: Subscription):
+        # Drop the backlog and wake the client's stream with a None sentinel
+        self._subscribers.discard(subscription)
+        subscription.evicted = True
+        self.evictions += 1
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+
+broadcaster = Broadcaster()
+
+
+def encode_event(event_type: str, data: dict) -> str:
+    """Compact JSON payload shared by NOTIFY and the SSE stream"""
+    return json.dumps({"type": event_type, **data}, separators=(",", ":"), default=str)
+
+
+def sse_frame(message: str) -> str:
+    event_type = json.loads(message)["type"]
+    return f"event: {event_type}\ndata: {message}\n\n"
+
+
+def emit(db: Session, event_type: str, **data):
+    """Queue an event to be delivered when the session's transaction commits"""
+    message = encode_event(event_type, data)
+    if EVENTS_BACKEND == "postgres":
+        # NOTIFY is transactional: listeners only see it after COMMIT
+        db.execute(sql_select(func.pg_notify(EVENTS_CHANNEL, message)))
+    else:
+        # Remember the savepoint (if any) so a rolled back savepoint drops only its own events
+        db.info.setdefault("pending_events", []).append((db.get_nested_transaction(), message))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _deliver_pending_events(session: Session):
+    for _, message in session.info.pop("pending_events", []):
+        broadcaster.publish(message)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_pending_events(session: Session, previous_transaction):
+    if previous_transaction.nested:
+        pending = session.info.get("pending_events", [])
+        session.info["pending_events"] = [
+            (savepoint, message) for savepoint, message in pending
+            if savepoint is not previous_transaction
+        ]
+    else:
+        session.info.pop("pending_events", None)
+
+
+class PostgresListener(threading.Thread):
+    """Forwards NOTIFY payloads on a channel to a callback (by default: EVENTS_CHANNEL to the broadcaster)"""
+
+    def __init__(self, channel: str = EVENTS_CHANNEL, callback: Callable[[str], None] = None, name: str = "events-listener"):
+        super().__init__(name=name, daemon=True)
+        self.channel = channel
+        self.callback = callback or broadcaster.publish
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Listener on %s lost its connection, reconnecting", self.channel)
+                self._stop_event.wait(1)
+
+    def _listen(self):
+        connection = engine.raw_connection()
+        try:
+            dbapi_connection = connection.dbapi_connection
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            while not self._stop_event.is_set():
+                if select.select([dbapi_connection], [], [], 1.0) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    self.callback(dbapi_connection.notifies.pop(0).payload)
+        finally:
+            connection.invalidate()
+
+
+_listener: Optional[PostgresListener] = None
+
+
+def start(loop: asyncio.AbstractEventLoop):
+    """Bind the broadcaster to the app's loop and start the NOTIFY listener if configured"""
+    global _listener
+    broadcaster.bind(loop)
+    if EVENTS_BACKEND == "postgres" and _listener is None:
+        _listener = PostgresListener()
+        _listener.start()
+
+
+def stop():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
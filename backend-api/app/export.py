@@ -0,0 +1,200 @@
+"""
+Streaming export of posts and impacts as NDJSON or CSV.
+
+Rows are read through a server-side cursor (yield_per) and encoded one at a
+time, so memory use does not depend on the size of the tables.
+
+Command line usage (from backend-api/):
+    python -m app.export posts --format ndjson --gzip -o posts.ndjson.gz
+    python -m app.export impacts --format csv --all-statuses
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import zlib
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+# Encoded bytes buffered before a chunk is handed to the client
+CHUNK_SIZE = 64 * 1024
+
+POST_FIELDS = [
+    "id", "title", "slug", "content", "excerpt", "status", "verification_status",
+    "category", "document_url", "author", "published_at", "created_at", "updated_at",
+]
+# CSV cannot nest impacts, so post rows carry a count instead
+POST_CSV_FIELDS = POST_FIELDS + ["impact_count"]
+IMPACT_FIELDS = [
+    "id", "post_id", "title", "description", "date", "type", "status", "created_at", "updated_at",
+]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def iter_post_records(db: Session, status: Optional[str] = "published") -> Iterator[dict]:
+    """Yield posts (with their impacts nested) in id order, one batch of rows at a time"""
+    posts = models.Post.__table__
+    impacts = models.Impact.__table__
+
+    stmt = (
+        select(*[posts.c[name] for name in POST_FIELDS if name != "author"],
+               models.User.username.label("author"))
+        .join(models.User, models.User.id == posts.c.author_id)
+        .order_by(posts.c.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    if status:
+        stmt = stmt.where(posts.c.status == status)
+
+    for partition in db.execute(stmt).mappings().partitions():
+        # One IN-query per batch for the impacts of these posts
+        impacts_by_post = defaultdict(list)
+        impact_rows = db.execute(
+            select(*[impacts.c[name] for name in IMPACT_FIELDS])
+            .where(impacts.c.post_id.in_([row["id"] for row in partition]))
+            .order_by(impacts.c.post_id, impacts.c.date)
+        ).mappings()
+        for impact in impact_rows:
+            impacts_by_post[impact["post_id"]].append(dict(impact))
+
+        for row in partition:
+            record = dict(row)
+            record["impacts"] = impacts_by_post.get(row["id"], [])
+            record["impact_count"] = len(record["impacts"])
+            yield record
+
+
+def iter_impact_records(db: Session, status: Optional[str] = "published") -> Iterator[dict]:
+    """Yield impacts in id order, restricted to posts with the given status"""
+    impacts = models.Impact.__table__
+    posts = models.Post.__table__
+
+    stmt = (
+        select(*[impacts.c[name] for name in IMPACT_FIELDS])
+        .order_by(impacts.c.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    if status:
+        stmt = stmt.join(posts, posts.c.id == impacts.c.post_id).where(posts.c.status == status)
+
+    for row in db.execute(stmt).mappings():
+        yield dict(row)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_ndjson(records: Iterable[dict]) -> Iterator[bytes]:
+    """Encode records as NDJSON, yielding roughly CHUNK_SIZE byte chunks"""
+    buffer = io.StringIO()
+    for record in records:
+        buffer.write(json.dumps(record, default=_json_default, ensure_ascii=False))
+        buffer.write("\n")
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer = io.StringIO()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def encode_csv(records: Iterable[dict], fields: list) -> Iterator[bytes]:
+    """Encode records as CSV with a header row, yielding roughly CHUNK_SIZE byte chunks"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    for record in records:
+        writer.writerow({
+            key: value.isoformat() if isinstance(value, (datetime, date)) else value
+            for key, value in record.items()
+        })
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip a byte stream on the fly"""
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(
+    kind: str,
+    format: str = "ndjson",
+    compress: bool = False,
+    status: Optional[str] = "published",
+) -> Iterator[bytes]:
+    """
+    Stream an export of `kind` ("posts" or "impacts") as encoded bytes.
+    Opens its own session so it can outlive the request's dependencies.
+    """
+    db = SessionLocal()
+    try:
+        if kind == "posts":
+            records = iter_post_records(db, status=status)
+            fields = POST_CSV_FIELDS
+        else:
+            records = iter_impact_records(db, status=status)
+            fields = IMPACT_FIELDS
+
+        chunks = encode_ndjson(records) if format == "ndjson" else encode_csv(records, fields)
+        if compress:
+            chunks = gzip_chunks(chunks)
+        yield from chunks
+    finally:
+        db.close()
+
+
+def export_filename(kind: str, format: str, compress: bool) -> str:
+    return f"lexleaks-{kind}.{format}" + (".gz" if compress else "")
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Export LexLeaks posts or impacts")
+    parser.add_argument("kind", choices=["posts", "impacts"])
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--gzip", action="store_true", help="Gzip the output")
+    parser.add_argument("--status", default="published",
+                        help="Only export posts with this status (default: published)")
+    parser.add_argument("--all-statuses", action="store_true",
+                        help="Export drafts and archived posts as well")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    status = None if args.all_statuses else args.status
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in stream_export(args.kind, args.format, args.gzip, status):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Background text extraction from uploaded documents, for search.
+
+The outbox worker (app/worker.py) runs this stage alongside its own loop.
+Each round claims up to EXTRACT_CLAIM_SIZE documents whose text is pending,
+using FOR UPDATE SKIP LOCKED and a lease, the same way outbox events are
+claimed. For each document it extracts the next EXTRACT_PAGES_PER_ROUND
+pages, split into tasks of EXTRACT_PAGES_PER_TASK pages and run in the PDF
+process pool (see pdfpool.py and pdf.py).
+
+A redacted document's text is extracted from its redacted rendition, never
+from the original (see redaction.py). Its text waits ("waiting") until the
+rendition is ready, and a round that finishes after the redactions changed
+is thrown away.
+
+Progress is incremental. The pages of a round are stored in
+`document_pages`, and `documents.text_pages` moves forward, in one
+transaction. A large document is worked through over several rounds, so
+other documents are not stuck behind it, and a crash or failure loses at
+most one round. A failed round is retried with exponential backoff. After
+EXTRACT_MAX_ATTEMPTS failed rounds in a row the document is marked failed.
+
+Stored pages are searched with the posts the document is attached to (see
+crud._document_text_match). Post listings are invalidated as pages arrive.
+
+Throughput (pages/sec) is logged per round and cumulatively.
+
+    python -m app.extraction bench FILE.pdf [--processes N]
+
+extracts a whole file with the pool and reports pages/sec.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from . import cache, models, pdf, pdfpool, storage
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_ENABLED = os.getenv("EXTRACT_ENABLED", "true").lower() == "true"
+EXTRACT_CLAIM_SIZE = int(os.getenv("EXTRACT_CLAIM_SIZE", "4"))
+EXTRACT_PAGES_PER_TASK = int(os.getenv("EXTRACT_PAGES_PER_TASK", "25"))
+EXTRACT_PAGES_PER_ROUND = int(os.getenv("EXTRACT_PAGES_PER_ROUND", "500"))
+EXTRACT_LEASE_SECONDS = int(os.getenv("EXTRACT_LEASE_SECONDS", "600"))
+EXTRACT_MAX_ATTEMPTS = int(os.getenv("EXTRACT_MAX_ATTEMPTS", "5"))
+EXTRACT_BACKOFF_SECONDS = int(os.getenv("EXTRACT_BACKOFF_SECONDS", "60"))
+EXTRACT_POLL_SECONDS = float(os.getenv("EXTRACT_POLL_SECONDS", "5"))
+
+# (document, pages extracted or None, error or None)
+Outcome = Tuple[models.Document, Optional[List[Tuple[int, str]]], Optional[str]]
+
+totals = {"claims": 0, "pages": 0, "seconds": 0.0, "failures": 0}
+
+def claim(db, limit: int) -> List[models.Document]:
+    """Lease up to `limit` documents with pages left to extract"""
+    due = (
+        select(models.Document.id)
+        .where(models.Document.text_status == "pending", models.Document.text_available_at <= func.now())
+        .order_by(models.Document.text_available_at, models.Document.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    documents = db.scalars(
+        update(models.Document)
+        .where(models.Document.id.in_(due.scalar_subquery()))
+        .values(
+            text_attempts=models.Document.text_attempts + 1,
+            text_available_at=func.now() + timedelta(seconds=EXTRACT_LEASE_SECONDS),
+        )
+        .returning(models.Document)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return sorted(documents, key=lambda document: document.id)
+
+
+def save_pages(db, document: models.Document, pages: List[Tuple[int, str]], through: int):
+    """Store a round's pages and move the document's progress to `through` pages"""
+    finished = through >= (document.page_count or 0)
+    advanced = db.execute(
+        update(models.Document)
+        .where(
+            models.Document.id == document.id,
+            # Not if the redactions changed during the round: then these pages came from a superseded file
+            models.Document.redaction_hash.is_not_distinct_from(document.redaction_hash),
+            models.Document.text_status == "pending",
+            models.Document.text_pages == document.text_pages,
+        )
+        .values(
+            text_pages=through,
+            text_attempts=0,
+            text_error=None,
+            # Not finished: due again right away for the next round
+            text_available_at=func.now(),
+            **({"text_status": "done", "text_extracted_at": func.now()} if finished else {}),
+        )
+    ).rowcount
+    if not advanced:
+        db.rollback()
+        return
+    if pages:
+        stmt = pg_insert(models.DocumentPage).values([
+            {"document_id": document.id, "page_number": number, "text": text} for number, text in pages
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[models.DocumentPage.document_id, models.DocumentPage.page_number],
+            set_={"text": stmt.excluded.text},
+        ))
+        cache.invalidate(db, cache.POSTS)
+    db.commit()
+
+
+def mark_failed(db, document: models.Document, error: str):
+    """Schedule a retry of the round, or give up after the last attempt"""
+    values = {"text_error": error[:2000]}
+    if document.text_attempts >= EXTRACT_MAX_ATTEMPTS:
+        values["text_status"] = "failed"
+    else:
+        delay = min(EXTRACT_BACKOFF_SECONDS * 2 ** (document.text_attempts - 1), 6 * 3600)
+        values["text_available_at"] = func.now() + timedelta(seconds=delay)
+    db.execute(
+        update(models.Document)
+        .where(
+            models.Document.id == document.id,
+            models.Document.redaction_hash.is_not_distinct_from(document.redaction_hash),
+        )
+        .values(**values)
+    )
+    db.commit()
+
+
+def _claim(limit: int) -> List[models.Document]:
+    db = SessionLocal()
+    try:
+        return claim(db, limit)
+    finally:
+        db.close()
+
+
+def _record(outcomes: List[Outcome]):
+    db = SessionLocal()
+    try:
+        for document, pages, error in outcomes:
+            if error is None:
+                save_pages(db, document, pages, _round_end(document))
+            else:
+                mark_failed(db, document, error)
+    finally:
+        db.close()
+
+
+def _round_end(document: models.Document) -> int:
+    return min(document.page_count or 0, document.text_pages + EXTRACT_PAGES_PER_ROUND)
+
+
+async def extract_pages(path: str, first: int, last: int) -> List[Tuple[int, str]]:
+    """Extract pages [first, last) of a local file, EXTRACT_PAGES_PER_TASK pages per pool task"""
+    chunks = await pdfpool.gather(*(
+        (pdf.extract_text, path, start, min(start + EXTRACT_PAGES_PER_TASK, last))
+        for start in range(first, last, EXTRACT_PAGES_PER_TASK)
+    ))
+    return [page for chunk in chunks for page in chunk]
+
+
+def source_key(document: models.Document) -> str:
+    """Storage key of the file readers get, and so the one whose text may be searched"""
+    if document.redaction_hash is None:
+        return document.storage_key
+    return storage.document_key(document.published_sha256)
+
+
+async def _extract_document(document: models.Document) -> Outcome:
+    backend = storage.get_backend()
+    try:
+        path, temporary = await run_in_threadpool(backend.fetch, source_key(document))
+        try:
+            pages = await extract_pages(path, document.text_pages, _round_end(document))
+        finally:
+            if temporary:
+                os.remove(path)
+    except Exception as e:
+        logger.exception("Text extraction for document %s failed on attempt %d",
+                         document.id, document.text_attempts)
+        return document, None, repr(e)
+    return document, pages, None
+
+
+async def run_round(limit: int = EXTRACT_CLAIM_SIZE) -> int:
+    """Extract the next pages of up to `limit` documents; returns the number of documents claimed"""
+    documents = await run_in_threadpool(_claim, limit)
+    if not documents:
+        return 0
+    started = time.monotonic()
+    outcomes = await asyncio.gather(*(_extract_document(document) for document in documents))
+    await run_in_threadpool(_record, outcomes)
+
+    elapsed = time.monotonic() - started
+    pages = sum(len(extracted) for _, extracted, error in outcomes if error is None)
+    failed = sum(1 for _, _, error in outcomes if error is not None)
+    totals["claims"] += len(documents)
+    totals["pages"] += pages
+    totals["seconds"] += elapsed
+    totals["failures"] += failed
+    logger.info(
+        "Extracted %d pages from %d documents (%d failed) in %.2fs: %.1f pages/s, %.1f pages/s overall",
+        pages, len(documents), failed, elapsed, pages / elapsed if elapsed else 0.0, throughput(),
+    )
+    return len(documents)
+
+
+def throughput() -> float:
+    """Pages per second of extraction time since this process started"""
+    return totals["pages"] / totals["seconds"] if totals["seconds"] else 0.0
+
+
+async def run(stopping: asyncio.Event, once: bool = False):
+    """Extraction loop run by the worker until `stopping` is set (or, with once, nothing is due)"""
+    if not EXTRACT_ENABLED:
+        return
+    while not stopping.is_set():
+        try:
+            claimed = await run_round()
+        except Exception:
+            logger.exception("Text extraction round failed")
+            claimed = 0
+        if not claimed:
+            if once:
+                break
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=EXTRACT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def _bench(path: str):
+    count = await pdfpool.run(pdf.page_count, path)
+    # Start the pool's processes before timing
+    await extract_pages(path, 0, min(count, pdfpool.PDF_PROCESSES))
+    started = time.monotonic()
+    pages = await extract_pages(path, 0, count)
+    elapsed = time.monotonic() - started
+    characters = sum(len(text) for _, text in pages)
+    print(f"{count} pages, {characters} characters in {elapsed:.2f}s with {pdfpool.PDF_PROCESSES} processes: "
+          f"{count / elapsed:.1f} pages/s ({count / elapsed / pdfpool.PDF_PROCESSES:.1f} per process)")
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="LexLeaks document text extraction tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("bench", help="Extract a PDF with the process pool and report pages/sec")
+    bench.add_argument("path")
+    bench.add_argument("--processes", type=int, default=pdfpool.PDF_PROCESSES)
+    args = parser.parse_args(argv)
+
+    pdfpool.PDF_PROCESSES = args.processes
+    try:
+        asyncio.run(_bench(args.path))
+    finally:
+        pdfpool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Outbox event handlers, run by the worker (python -m app.worker), never in the
+request that caused the event. Each receives the event payload dict.
+"""
+import logging
+
+from . import digest, push, schemas, webhooks
+from .database import SessionLocal
+from .outbox import handler
+
+logger = logging.getLogger(__name__)
+
+
+@handler("post.published")
+async def notify_new_post(event: dict):
+    """Push a newly published post to subscribers who opted into new posts"""
+    notification = schemas.PushNotificationSend(
+        title="New on LexLeaks",
+        body=event["title"],
+        url=f"/{event['slug']}",
+        tag=f"post-{event['id']}",
+        preference="new_posts",
+    )
+    try:
+        result = await push.send_notification(notification)
+    except push.PushNotConfigured:
+        logger.warning("Push is not configured; skipping notification for post %s", event["id"])
+        return
+    logger.info("Notified %d subscribers of post %s (%d pruned, %d failed)",
+                result.sent, event["id"], result.pruned, result.failed)
+
+
+@handler("digest.deliver")
+async def deliver_digest(event: dict):
+    """Send the weekly digest to one page of subscribers"""
+    try:
+        await digest.deliver_batch(event)
+    except push.PushNotConfigured:
+        logger.warning("Push is not configured; skipping digest delivery for run %s", event["run_id"])
+
+
+def _queue_webhooks(event_type: str, event: dict):
+    db = SessionLocal()
+    try:
+        queued = webhooks.queue_event(db, event_type, event)
+    finally:
+        db.close()
+    if queued:
+        logger.info("Queued %s %s for %d webhooks", event_type, event["id"], queued)
+
+
+@handler("post.published")
+def queue_post_webhooks(event: dict):
+    """Queue the new post for partner webhooks; the worker delivers them"""
+    _queue_webhooks("post.published", event)
+
+
+@handler("impact.created")
+def queue_impact_webhooks(event: dict):
+    """Queue the new impact for partner webhooks; the worker delivers them"""
+    _queue_webhooks("impact.created", event)
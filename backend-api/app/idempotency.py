@@ -0,0 +1,318 @@
+"""
+Idempotency-Key support for mutating requests.
+
+A POST/PUT/PATCH/DELETE carrying an `Idempotency-Key` header is executed at
+most once per (caller, key) within IDEMPOTENCY_TTL_SECONDS:
+
+- the first request claims the key, runs normally, and its response is stored;
+- a replay gets the stored response back (with `Idempotent-Replayed: true`)
+  without re-running the endpoint;
+- a duplicate that arrives while the first is still running waits for it,
+  up to IDEMPOTENCY_WAIT_SECONDS, then gets a 409;
+- reusing a key for a different request body or path is rejected with 422;
+- 5xx responses are not stored, so the client's retry runs again.
+
+A running request holds its key for IDEMPOTENCY_LEASE_SECONDS only, so a
+key whose request died with its process is free again soon; the stored
+response is then kept for the full TTL.
+
+A request without a Content-Length has no body unless it is chunked;
+chunked bodies are buffered like others, up to IDEMPOTENCY_MAX_BODY.
+
+Keys are scoped by the user a valid access token names ("anon" without
+one), so callers cannot replay each other's responses while a client that
+refreshed its token mid-retry still finds its key. The store is chosen with IDEMPOTENCY_BACKEND: "postgres"
+(default, shared by every worker/instance) or "memory" (single process).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from . import auth, models
+from .database import SessionLocal
+
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "postgres")  # postgres, memory
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# How long a request that is still running holds its key
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "120"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# Larger bodies (e.g. bulk NDJSON imports) are passed through without idempotency
+IDEMPOTENCY_MAX_BODY = int(os.getenv("IDEMPOTENCY_MAX_BODY", str(1024 * 1024)))
+
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Response headers worth replaying
+STORED_HEADERS = {"content-type", "location"}
+
+# (status_code, headers, body) of a completed request
+StoredResponse = Tuple[int, Dict[str, str], bytes]
+
+
+class KeyMismatch(Exception):
+    """The key was already used for a different request"""
+
+
+class MemoryIdempotencyStore:
+    """Per-process store; duplicates wait on an asyncio.Event instead of polling"""
+
+    def __init__(self):
+        self._entries: Dict[str, dict] = {}
+
+    def _purge(self, now: float):
+        expired = [key for key, entry in self._entries.items() if entry["expires"] < now]
+        for key in expired:
+            del self._entries[key]
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """Return None if this request now owns the key, else the stored response"""
+        now = time.monotonic()
+        self._purge(now)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = {
+                "fingerprint": fingerprint,
+                "response": None,
+                "done": asyncio.Event(),
+                "expires": now + IDEMPOTENCY_LEASE_SECONDS,
+            }
+            return None
+        if entry["fingerprint"] != fingerprint:
+            raise KeyMismatch()
+        try:
+            await asyncio.wait_for(entry["done"].wait(), timeout=IDEMPOTENCY_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            raise TimeoutError()
+        if entry["response"] is None:
+            # The original request failed and released the key; run this one
+            return await self.claim(key, fingerprint)
+        return entry["response"]
+
+    async def complete(self, key: str, response: StoredResponse):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry["response"] = response
+            entry["expires"] = time.monotonic() + IDEMPOTENCY_TTL_SECONDS
+            entry["done"].set()
+
+    async def release(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry["done"].set()
+
+
+class DatabaseIdempotencyStore:
+    """Postgres-backed store shared by all workers; duplicates poll for completion"""
+
+    POLL_INTERVAL = 0.1
+
+    def _claim(self, key: str, fingerprint: str):
+        now = datetime.now(timezone.utc)
+        table = models.IdempotencyKey.__table__
+        db = SessionLocal()
+        try:
+            # Claim the key, or take over an expired entry, in one statement
+            stmt = pg_insert(table).values(
+                key=key,
+                fingerprint=fingerprint,
+                expires_at=now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.key],
+                set_={
+                    "fingerprint": stmt.excluded.fingerprint,
+                    "expires_at": stmt.excluded.expires_at,
+                    "status_code": None,
+                    "headers": None,
+                    "body": None,
+                },
+                where=table.c.expires_at < func.now(),
+            ).returning(table.c.key)
+            claimed = db.execute(stmt).first() is not None
+            if claimed and random.random() < 0.01:
+                # Occasionally sweep expired keys so the table stays compact
+                db.execute(delete(table).where(table.c.expires_at < func.now()))
+            db.commit()
+            if claimed:
+                return True, None
+            row = db.execute(
+                select(table.c.fingerprint, table.c.status_code, table.c.headers, table.c.body)
+                .where(table.c.key == key)
+            ).first()
+            return False, row
+        finally:
+            db.close()
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            claimed, row = await run_in_threadpool(self._claim, key, fingerprint)
+            if claimed:
+                return None
+            if row is not None:
+                if row.fingerprint != fingerprint:
+                    raise KeyMismatch()
+                if row.status_code is not None:
+                    return row.status_code, json.loads(row.headers or "{}"), row.body or b""
+            # Still in flight (or released between the two statements); wait and retry
+            if time.monotonic() >= deadline:
+                raise TimeoutError()
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    def _complete(self, key: str, response: StoredResponse):
+        status_code, headers, body = response
+        table = models.IdempotencyKey.__table__
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(table)
+                .where(table.c.key == key)
+                .values(
+                    status_code=status_code,
+                    headers=json.dumps(headers),
+                    body=body,
+                    expires_at=func.now() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+                )
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def complete(self, key: str, response: StoredResponse):
+        await run_in_threadpool(self._complete, key, response)
+
+    def _release(self, key: str):
+        table = models.IdempotencyKey.__table__
+        db = SessionLocal()
+        try:
+            db.execute(delete(table).where(table.c.key == key, table.c.status_code.is_(None)))
+            db.commit()
+        finally:
+            db.close()
+
+    async def release(self, key: str):
+        await run_in_threadpool(self._release, key)
+
+
+def create_store():
+    if IDEMPOTENCY_BACKEND == "memory":
+        return MemoryIdempotencyStore()
+    return DatabaseIdempotencyStore()
+
+
+async def _send_json(send, status_code: int, detail: str):
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _replay(messages: list, receive):
+    """A receive callable that returns `messages` first, then reads on"""
+    pending = list(messages)
+
+    async def replay_receive():
+        if pending:
+            return pending.pop(0)
+        return await receive()
+
+    return replay_receive
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware applying Idempotency-Key semantics to mutating requests"""
+
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store or create_store()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(b"idempotency-key")
+        content_length = headers.get(b"content-length")
+        if not idempotency_key or (
+            content_length is not None
+            and (not content_length.isdigit() or int(content_length) > IDEMPOTENCY_MAX_BODY)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        # Buffer the (small) body so it can be fingerprinted and then replayed to the app
+        messages = []
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            messages.append(message)
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if len(body) > IDEMPOTENCY_MAX_BODY:
+                # A chunked body that turned out too large: pass it through after all
+                await self.app(scope, _replay(messages, receive), send)
+                return
+
+        username = auth.bearer_subject(headers.get(b"authorization", b""))
+        caller = f"user:{username}".encode() if username is not None else b"anon"
+        key = hashlib.sha256(caller + b"\0" + idempotency_key).hexdigest()
+        fingerprint = hashlib.sha256(
+            scope["method"].encode() + b"\0" + scope["path"].encode() + b"\0"
+            + scope.get("query_string", b"") + b"\0" + body
+        ).hexdigest()
+
+        try:
+            stored = await self.store.claim(key, fingerprint)
+        except KeyMismatch:
+            await _send_json(send, 422, "Idempotency-Key was already used for a different request")
+            return
+        except TimeoutError:
+            await _send_json(send, 409, "A request with this Idempotency-Key is still in progress")
+            return
+
+        if stored is not None:
+            status_code, stored_headers, stored_body = stored
+            response_headers = [(name.encode(), value.encode()) for name, value in stored_headers.items()]
+            response_headers.append((b"content-length", str(len(stored_body)).encode()))
+            response_headers.append((b"idempotent-replayed", b"true"))
+            await send({"type": "http.response.start", "status": status_code, "headers": response_headers})
+            await send({"type": "http.response.body", "body": stored_body})
+            return
+
+        response = {"status": None, "headers": {}, "body": []}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = {
+                    name.decode("latin-1"): value.decode("latin-1")
+                    for name, value in message.get("headers", [])
+                    if name.decode("latin-1").lower() in STORED_HEADERS
+                }
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, _replay([{"type": "http.request", "body": body, "more_body": False}], receive),
+                           capture_send)
+        except BaseException:
+            await self.store.release(key)
+            raise
+
+        if response["status"] is None or response["status"] >= 500:
+            await self.store.release(key)
+        else:
+            await self.store.complete(key, (response["status"], response["headers"], b"".join(response["body"])))
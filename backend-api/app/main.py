@@ -1,10 +1,14 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from .database import engine
-from . import models
-from .routers import posts, auth, impacts, notifications
+from . import models, admission, cache, events, passwords, pdfpool, push, ratelimit
+from .admission import AdmissionMiddleware
+from .auth import revocations
+from .idempotency import IdempotencyMiddleware
+from .routers import posts, auth, impacts, notifications, export, stream, changes, batch, webhooks, documents
 
 
 # Create database tables
@@ -17,8 +21,19 @@ def create_tables():
 async def lifespan(app: FastAPI):
     # Startup
     create_tables()
+    if passwords.PASSWORD_CALIBRATE:
+        await asyncio.to_thread(passwords.calibrate_and_apply)
+    events.start(asyncio.get_running_loop())
+    cache.start()
+    # Checks reload the revocation list in the background; have it ready for the first ones
+    await asyncio.to_thread(revocations.reload)
     yield
-    # Shutdown (if needed)
+    # Shutdown
+    cache.stop()
+    events.stop()
+    await push.close()
+    # Started by on-request preview rendering, if any
+    pdfpool.shutdown(wait=False)
 
 
 # Create FastAPI application
@@ -29,6 +44,14 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Replay responses for retried writes that carry an Idempotency-Key header.
+# Added before CORS so that replayed responses still get CORS headers.
+app.add_middleware(IdempotencyMiddleware)
+
+# Per-lane concurrency limits, deadlines and load shedding. Outside idempotency so
+# shed requests never claim a key; inside CORS so 503s still carry CORS headers.
+app.add_middleware(AdmissionMiddleware)
+
 # Configure CORS - using allow_origin_regex to support Netlify preview URLs
 app.add_middleware(
     CORSMiddleware,
@@ -43,6 +66,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    # Range headers let the PDF viewer read documents page by page across origins
+    expose_headers=["Idempotent-Replayed", "Retry-After", "Accept-Ranges", "Content-Range", "Content-Length", "ETag"],
 )
 
 # Include routers
@@ -50,6 +75,12 @@ app.include_router(auth.router, prefix="/api")
 app.include_router(posts.router, prefix="/api")
 app.include_router(impacts.router, prefix="/api")
 app.include_router(notifications.router, prefix="/api/notifications")
+app.include_router(export.router, prefix="/api")
+app.include_router(stream.router, prefix="/api")
+app.include_router(changes.router, prefix="/api")
+app.include_router(batch.router, prefix="/api")
+app.include_router(webhooks.router, prefix="/api")
+app.include_router(documents.router, prefix="/api")
 
 
 # Root endpoint
@@ -69,6 +100,30 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/health/cache")
+def cache_health():
+    """Read cache and request coalescing counters for this worker"""
+    return cache.stats()
+
+
+@app.get("/health/ratelimit")
+def ratelimit_health():
+    """Auth rate limit rejections for this worker"""
+    return ratelimit.stats()
+
+
+@app.get("/health/passwords")
+def passwords_health():
+    """Password hash cost in use and background rehashes on this worker"""
+    return passwords.stats()
+
+
+@app.get("/health/admission")
+def admission_health():
+    """Admission lanes: limits, in-flight and queued requests, admitted and shed counts"""
+    return admission.stats()
+
+
 # API info endpoint
 @app.get("/api")
 async def api_info():
@@ -79,6 +134,12 @@ async def api_info():
             "posts": "/api/posts",
             "impacts": "/api/impacts",
             "notifications": "/api/notifications",
+            "export": "/api/export",
+            "stream": "/api/stream",
+            "changes": "/api/changes",
+            "batch": "/api/batch",
+            "webhooks": "/api/webhooks",
+            "documents": "/api/posts/{post_id}/documents",
             "documentation": "/docs"
         }
     } 
\ No newline at end of file
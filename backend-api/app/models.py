@@ -1,8 +1,13 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Text, DateTime, ForeignKey, Boolean, LargeBinary, JSON, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
 
+# Id of the transaction writing a row (xid8, as a bigint). The change feed pages
+# on it: unlike a timestamp, no transaction older than the oldest one still
+# running can commit afterwards (see crud.get_changes).
+CURRENT_XID = text("pg_current_xact_id()::text::bigint")
+
 
 class User(Base):
     """User model for authentication and authorship"""
@@ -36,12 +41,21 @@ class Post(Base):
     author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     published_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+    change_xid = Column(BigInteger, server_default=CURRENT_XID, onupdate=CURRENT_XID, nullable=False, index=True)
     
     # Relationship to user
     author = relationship("User", back_populates="posts")
     # Relationship to impacts
-    impacts = relationship("Impact", back_populates="post", cascade="all, delete-orphan")
+    # Impacts are removed by the database (ON DELETE CASCADE), not loaded and deleted by the ORM
+    impacts = relationship("Impact", back_populates="post", cascade="all, delete-orphan", passive_deletes=True)
+    # Attached documents; links are removed by the database with the post
+    documents = relationship("PostDocument", back_populates="post", passive_deletes=True)
+    
+    __table_args__ = (
+        # Prefix matches (slug LIKE 'base-%') when picking free slugs, whatever the collation
+        Index("ix_posts_slug_pattern", "slug", postgresql_ops={"slug": "varchar_pattern_ops"}),
+    )
 
 
 class Impact(Base):
@@ -54,14 +68,261 @@ class Impact(Base):
     date = Column(DateTime(timezone=True), nullable=False)
     type = Column(String(50), nullable=False)  # legal_action, policy_change, investigation, resignation, reform
     status = Column(String(20), default="pending", nullable=False)  # pending, in_progress, completed
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+    change_xid = Column(BigInteger, server_default=CURRENT_XID, onupdate=CURRENT_XID, nullable=False, index=True)
     
     # Relationship to post
     post = relationship("Post", back_populates="impacts") 
 
 
+class Document(Base):
+    """A file as uploaded by one user, attached to any of their posts; the stored bytes are shared by hash"""
+    __tablename__ = "documents"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), nullable=False)
+    size = Column(BigInteger, nullable=False)  # bytes
+    page_count = Column(Integer, nullable=True)
+    content_type = Column(String(100), default="application/pdf", nullable=False)
+    storage_key = Column(String(200), nullable=False)  # see storage.py
+    uploaded_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Redaction (see redaction.py): hash of the current redaction set, NULL when there is none
+    redaction_hash = Column(String(64), nullable=True)
+    # The file readers get: the original, or its redacted rendition; NULL while that is being rendered
+    published_sha256 = Column(String(64), nullable=True)
+    published_size = Column(BigInteger, nullable=True)
+    # Text extraction for search (see extraction.py)
+    text_status = Column(String(20), default="pending", server_default="pending", nullable=False)  # pending, waiting (for a rendition), done, failed
+    text_pages = Column(Integer, default=0, server_default="0", nullable=False)  # pages extracted so far
+    text_attempts = Column(Integer, default=0, server_default="0", nullable=False)  # failed rounds in a row
+    text_error = Column(Text, nullable=True)
+    text_available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    text_extracted_at = Column(DateTime(timezone=True), nullable=True)
+    # Preview images (see previews.py): rendered for published_sha256 once this equals it
+    preview_sha256 = Column(String(64), nullable=True)
+    preview_attempts = Column(Integer, default=0, server_default="0", nullable=False)  # failed renders in a row
+    preview_error = Column(Text, nullable=True)  # set when rendering gave up
+    preview_available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    posts = relationship("PostDocument", back_populates="document", passive_deletes=True)
+    redactions = relationship("Redaction", order_by="Redaction.id", passive_deletes=True)
+    
+    __table_args__ = (
+        # One document per uploader and file; other uploaders of the file get their own
+        UniqueConstraint("sha256", "uploaded_by"),
+        # Keeps the extraction claim query on pending documents only
+        Index("ix_documents_text_pending", "text_available_at", "id", postgresql_where=text("text_status = 'pending'")),
+        # Preview URLs name the published file; each request is checked against it
+        Index("ix_documents_published_sha256", "published_sha256"),
+        Index(
+            "ix_documents_preview_pending", "preview_available_at", "id",
+            postgresql_where=text("published_sha256 IS NOT NULL AND preview_sha256 IS DISTINCT FROM published_sha256"),
+        ),
+    )
+
+
+class DocumentPage(Base):
+    """Text extracted from one page of a document, searched with the posts it is attached to"""
+    __tablename__ = "document_pages"
+    
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+    page_number = Column(Integer, primary_key=True)  # from 1
+    # Trigram-indexed for ILIKE search; the index (and pg_trgm) are created by the migration
+    text = Column(Text, nullable=False)
+
+
+class Redaction(Base):
+    """A box blacked out of a document: page from 1, and PDF points from the page's top left"""
+    __tablename__ = "redactions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    page = Column(Integer, nullable=False)
+    x = Column(Float, nullable=False)
+    y = Column(Float, nullable=False)
+    width = Column(Float, nullable=False)
+    height = Column(Float, nullable=False)
+    reason = Column(String(200), nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class RedactedDocument(Base):
+    """A document with one set of redactions burned in, kept for as long as that set might be current"""
+    __tablename__ = "redacted_documents"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+    redaction_hash = Column(String(64), nullable=False)
+    boxes = Column(JSON, nullable=False)  # the redaction set as rendered
+    status = Column(String(20), default="pending", server_default="pending", nullable=False)  # pending, ready, failed
+    sha256 = Column(String(64), nullable=True)
+    size = Column(BigInteger, nullable=True)
+    storage_key = Column(String(200), nullable=True)  # once rendered
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    error = Column(Text, nullable=True)
+    available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    rendered_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint("document_id", "redaction_hash"),
+        Index("ix_redacted_documents_pending", "available_at", "id", postgresql_where=text("status = 'pending'")),
+    )
+
+
+class PostDocument(Base):
+    """A document attached to a post, under the file name it was uploaded with"""
+    __tablename__ = "post_documents"
+    
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True, index=True)
+    filename = Column(String(255), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    post = relationship("Post", back_populates="documents")
+    document = relationship("Document", back_populates="posts")
+
+
+class DeletedRecord(Base):
+    """Tombstone for a deleted post or impact, read by the change feed"""
+    __tablename__ = "deleted_records"
+    
+    id = Column(BigInteger, primary_key=True)
+    entity_type = Column(String(20), nullable=False)  # post, impact
+    entity_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    change_xid = Column(BigInteger, server_default=CURRENT_XID, nullable=False, index=True)
+
+
+class IdempotencyKey(Base):
+    """Stored outcome of a request sent with an Idempotency-Key header"""
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String(64), primary_key=True)  # sha256 of caller + client key
+    fingerprint = Column(String(64), nullable=False)  # sha256 of method, path and body
+    status_code = Column(Integer, nullable=True)  # NULL while the request is in flight
+    headers = Column(Text, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class RefreshToken(Base):
+    """One rotation of a login session's refresh token; only its SHA-256 is stored"""
+    __tablename__ = "refresh_tokens"
+    
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)  # the lookup path
+    session_id = Column(String(32), nullable=False, index=True)  # shared by every rotation of one login
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    used_at = Column(DateTime(timezone=True), nullable=True)  # set when rotated
+    revoked_at = Column(DateTime(timezone=True), nullable=True)  # set on logout or reuse
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        # Recent revocations, loaded into each worker's revocation list
+        Index("ix_refresh_tokens_revoked_at", "revoked_at", postgresql_where=text("revoked_at IS NOT NULL")),
+    )
+
+
+class OutboxEvent(Base):
+    """Side effect recorded in the same transaction as the change that caused it"""
+    __tablename__ = "outbox_events"
+    
+    id = Column(BigInteger, primary_key=True)
+    event_type = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False)
+    # At most one event per key, e.g. one "post.published" per post
+    dedupe_key = Column(String(100), unique=True, nullable=True)
+    status = Column(String(20), default="pending", server_default="pending", nullable=False)  # pending, done, failed
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    completed_handlers = Column(JSON, nullable=True)  # handlers that already succeeded
+    last_error = Column(Text, nullable=True)
+    # Not claimable before this time; pushed forward while claimed (lease) and after a failure (backoff)
+    available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_attempt_at = Column(DateTime(timezone=True), nullable=True)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        # Keeps the worker's claim query on pending rows only
+        Index("ix_outbox_events_pending", "available_at", "id", postgresql_where=text("status = 'pending'")),
+    )
+
+
+class Webhook(Base):
+    """Partner endpoint notified of published posts and new impacts"""
+    __tablename__ = "webhooks"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String(500), nullable=False)
+    secret = Column(String(100), nullable=False)  # HMAC-SHA256 signing key
+    description = Column(String(200), nullable=True)
+    # Filters; an empty/NULL category or impact type list matches everything
+    event_types = Column(JSON, nullable=False)  # e.g. ["post.published", "impact.created"]
+    categories = Column(JSON, nullable=True)
+    impact_types = Column(JSON, nullable=True)
+    batch_size = Column(Integer, default=1, nullable=False)  # events per request; 1 = no batching
+    max_concurrency = Column(Integer, default=2, nullable=False)  # requests in flight to this endpoint
+    is_active = Column(Boolean, default=True, nullable=False)
+    consecutive_failures = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    last_success_at = Column(DateTime(timezone=True), nullable=True)
+    disabled_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    deliveries = relationship("WebhookDelivery", back_populates="webhook", passive_deletes=True)
+
+
+class WebhookDelivery(Base):
+    """One event queued for one webhook"""
+    __tablename__ = "webhook_deliveries"
+    
+    id = Column(BigInteger, primary_key=True)
+    webhook_id = Column(Integer, ForeignKey("webhooks.id", ondelete="CASCADE"), nullable=False)
+    event_key = Column(String(100), nullable=False)  # e.g. post.published:42
+    event_type = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String(20), default="pending", server_default="pending", nullable=False)  # pending, delivered, failed
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    last_error = Column(Text, nullable=True)
+    available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    delivered_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    webhook = relationship("Webhook", back_populates="deliveries")
+    
+    __table_args__ = (
+        UniqueConstraint("webhook_id", "event_key"),
+        Index(
+            "ix_webhook_deliveries_webhook_pending", "webhook_id", "available_at", "id",
+            postgresql_where=text("status = 'pending'")
+        ),
+    )
+
+
+class DigestRun(Base):
+    """One weekly digest run; the checkpoint makes an interrupted run resumable"""
+    __tablename__ = "digest_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    week = Column(String(10), unique=True, nullable=False)  # ISO week, e.g. 2026-W42
+    status = Column(String(20), default="running", nullable=False)  # running, completed
+    period_start = Column(DateTime(timezone=True), nullable=False)
+    period_end = Column(DateTime(timezone=True), nullable=False)
+    message = Column(JSON, nullable=True)  # rendered once, shared by every delivery
+    checkpoint_id = Column(Integer, default=0, nullable=False)  # last subscription id enqueued
+    enqueued = Column(Integer, default=0, nullable=False)
+    delivered = Column(Integer, default=0, nullable=False)
+    metrics = Column(JSON, nullable=True)  # seconds spent per phase
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+
 class PushSubscription(Base):
     __tablename__ = "push_subscriptions"
 
@@ -81,4 +342,10 @@ class PushSubscription(Base):
     notify_weekly_digest = Column(Boolean, default=False)
     
     # Relationship
-    user = relationship("User", back_populates="push_subscriptions") 
\ No newline at end of file
+    user = relationship("User", back_populates="push_subscriptions")
+    
+    __table_args__ = (
+        # Keyset scans over opted-in digest subscribers
+        Index("ix_push_subscriptions_weekly_digest", "id",
+              postgresql_where=text("is_active IS true AND notify_weekly_digest IS true")),
+    ) 
\ No newline at end of file
@@ -0,0 +1,87 @@
+import json
+import os
+from typing import Any, AsyncIterator, Callable, List, Tuple, Type, Union
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+
+from . import admission, schemas
+
+# Number of records written per transaction by the bulk import endpoints
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+
+async def iter_ndjson(
+    chunks: AsyncIterator[bytes]
+) -> AsyncIterator[Tuple[int, Union[Any, ValueError]]]:
+    """
+    Parse a newline-delimited JSON body as it arrives.
+    Yields (line_number, object) per non-empty line; lines that fail to parse
+    yield the ValueError instead so callers can report them per record.
+    """
+    buffer = b""
+    line_no = 0
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, _parse_line(line)
+
+    if buffer.strip():
+        yield line_no + 1, _parse_line(buffer)
+
+
+def _parse_line(line: bytes) -> Union[Any, ValueError]:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON: {e}")
+
+
+async def _write(
+    write_batch: Callable[[List[tuple]], List[schemas.ImportResult]], batch: List[tuple]
+) -> List[schemas.ImportResult]:
+    with admission.without_deadline():
+        return await run_in_threadpool(write_batch, batch)
+
+
+async def import_ndjson(
+    chunks: AsyncIterator[bytes],
+    schema: Type[BaseModel],
+    write_batch: Callable[[List[tuple]], List[schemas.ImportResult]],
+) -> schemas.ImportSummary:
+    """
+    Validate NDJSON records against `schema` while the body streams in and hand
+    them to `write_batch` (run in the threadpool) every IMPORT_BATCH_SIZE records.
+    Batches run without the request's deadline: an import takes as long as its
+    data, and one cut off partway would leave earlier batches committed with no
+    results reported for them.
+    """
+    results: List[schemas.ImportResult] = []
+    batch: List[tuple] = []
+
+    async for line, data in iter_ndjson(chunks):
+        if isinstance(data, ValueError):
+            results.append(schemas.ImportResult(line=line, status="error", error=str(data)))
+            continue
+        try:
+            batch.append((line, schema.model_validate(data)))
+        except ValidationError as e:
+            results.append(schemas.ImportResult(
+                line=line, status="error", error=e.errors(include_url=False)[0]["msg"]
+            ))
+            continue
+
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            results.extend(await _write(write_batch, batch))
+            batch = []
+
+    if batch:
+        results.extend(await _write(write_batch, batch))
+
+    results.sort(key=lambda result: result.line)
+    created = sum(1 for result in results if result.status == "created")
+    return schemas.ImportSummary(created=created, failed=len(results) - created, results=results)
@@ -0,0 +1,156 @@
+"""
+Transactional outbox for side effects of writes.
+
+Write paths call `enqueue(db, ...)` before committing, so an outbox event
+exists exactly when the change that caused it was committed, and the request
+does none of the follow-up work itself. The worker (`python -m app.worker`)
+claims pending events with FOR UPDATE SKIP LOCKED and runs the handlers
+registered for their type with `@handler(...)` (see app/handlers.py).
+
+A claim leases the event for OUTBOX_LEASE_SECONDS, so an event whose worker
+died is picked up again; the worker renews the lease while the handlers are
+running (`extend_leases`), so a long push fan-out is never picked up by a
+second worker halfway and sent twice. Failures are retried with exponential backoff;
+handlers that already succeeded for an event are not run again. After
+OUTBOX_MAX_ATTEMPTS the event is marked failed and kept for inspection.
+"""
+import os
+from collections import defaultdict
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func, literal, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_SECONDS = int(os.getenv("OUTBOX_BACKOFF_SECONDS", "10"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+_handlers: Dict[str, List[Callable]] = defaultdict(list)
+
+
+def handler(event_type: str):
+    """Register a function (sync or async) taking the event payload dict"""
+    def register(fn: Callable) -> Callable:
+        _handlers[event_type].append(fn)
+        return fn
+    return register
+
+
+def handlers_for(event_type: str) -> List[Callable]:
+    return _handlers.get(event_type, [])
+
+
+def handler_name(fn: Callable) -> str:
+    return f"{fn.__module__}.{fn.__qualname__}"
+
+
+def enqueue(db: Session, event_type: str, dedupe_key: Optional[str] = None, **payload):
+    """Add an event to the current transaction; a repeated dedupe_key is ignored"""
+    table = models.OutboxEvent.__table__
+    stmt = pg_insert(table).values(event_type=event_type, payload=payload, dedupe_key=dedupe_key)
+    if dedupe_key is not None:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[table.c.dedupe_key])
+    db.execute(stmt)
+
+
+def enqueue_rows(event_type: str, rows, dedupe: bool = True):
+    """
+    INSERT ... SELECT statement enqueuing one event per row of `rows` (a CTE or
+    subquery with an `id` column); the row's columns become the payload.
+    Lets set-based writes enqueue in the same statement, e.g. as another CTE.
+    """
+    payload = func.json_build_object(
+        *[part for column in rows.c for part in (literal(column.name), column)]
+    )
+    dedupe_key = func.concat(f"{event_type}:", rows.c.id) if dedupe else literal(None)
+    return (
+        pg_insert(models.OutboxEvent)
+        .from_select(
+            ["event_type", "payload", "dedupe_key"],
+            select(literal(event_type), payload, dedupe_key).select_from(rows)
+        )
+        .on_conflict_do_nothing(index_elements=[models.OutboxEvent.dedupe_key])
+    )
+
+
+def claim(db: Session, limit: int) -> List[models.OutboxEvent]:
+    """Lease up to `limit` due events; concurrent workers skip each other's rows"""
+    due = (
+        select(models.OutboxEvent.id)
+        .where(models.OutboxEvent.status == "pending", models.OutboxEvent.available_at <= func.now())
+        .order_by(models.OutboxEvent.available_at, models.OutboxEvent.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    events = db.scalars(
+        update(models.OutboxEvent)
+        .where(models.OutboxEvent.id.in_(due.scalar_subquery()))
+        .values(
+            attempts=models.OutboxEvent.attempts + 1,
+            last_attempt_at=func.now(),
+            available_at=func.now() + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+        )
+        .returning(models.OutboxEvent)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return sorted(events, key=lambda event: event.id)
+
+
+def extend_leases(db: Session, events: List[models.OutboxEvent]) -> int:
+    """Renew the lease of claimed events still being processed; returns how many were still ours"""
+    if not events:
+        return 0
+    # A reclaimed event has had its attempts bumped and is no longer ours to extend
+    result = db.execute(
+        update(models.OutboxEvent)
+        .where(
+            tuple_(models.OutboxEvent.id, models.OutboxEvent.attempts).in_(
+                [(event.id, event.attempts) for event in events]
+            ),
+            models.OutboxEvent.status == "pending",
+        )
+        .values(available_at=func.now() + timedelta(seconds=OUTBOX_LEASE_SECONDS))
+    )
+    db.commit()
+    return result.rowcount
+
+
+def mark_done(db: Session, event_ids: List[int]):
+    if not event_ids:
+        return
+    db.execute(
+        update(models.OutboxEvent)
+        .where(models.OutboxEvent.id.in_(event_ids))
+        .values(status="done", processed_at=func.now(), last_error=None)
+    )
+    db.commit()
+
+
+def mark_failed(db: Session, event: models.OutboxEvent, completed_handlers: List[str], error: str):
+    """Record a failed attempt and schedule a retry, or give up after the last attempt"""
+    values = {"completed_handlers": completed_handlers, "last_error": error[:2000]}
+    if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+        values["status"] = "failed"
+    else:
+        delay = min(OUTBOX_BACKOFF_SECONDS * 2 ** (event.attempts - 1), 3600)
+        values["available_at"] = func.now() + timedelta(seconds=delay)
+    db.execute(update(models.OutboxEvent).where(models.OutboxEvent.id == event.id).values(**values))
+    db.commit()
+
+
+def purge_processed(db: Session) -> int:
+    """Drop done events older than OUTBOX_RETENTION_DAYS"""
+    result = db.execute(
+        delete(models.OutboxEvent).where(
+            models.OutboxEvent.status == "done",
+            models.OutboxEvent.processed_at < func.now() - timedelta(days=OUTBOX_RETENTION_DAYS)
+        )
+    )
+    db.commit()
+    return result.rowcount
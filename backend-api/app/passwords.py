@@ -0,0 +1,214 @@
+"""
+Password hashing with a cost tuned to the hardware it runs on.
+
+The hash cost (bcrypt rounds, or argon2 time_cost with PASSWORD_SCHEME=argon2,
+which needs `pip install argon2-cffi`) comes from PASSWORD_HASH_ROUNDS, or,
+with PASSWORD_CALIBRATE=true, from timing verifies at startup: the highest
+cost whose median verify stays within PASSWORD_TARGET_MS is used, never less
+than PASSWORD_MIN_ROUNDS.
+
+Hashes made at a lower cost, or with a scheme other than the configured one
+(bcrypt hashes once argon2 is enabled), are stale. When a user logs in with
+a stale hash the password is rehashed in a background thread, so the login
+itself does not pay for a second hash. The update only applies if the stored
+hash has not changed in the meantime.
+
+Hashes made at a higher cost are left alone: instances calibrated on
+different hardware would otherwise keep rehashing each other's users.
+
+    python -m app.passwords calibrate [--target-ms 250]
+    python -m app.passwords bench [--iterations 10]
+
+print the cost calibration would pick, and the verify latency and logins per
+second per core of each cost.
+"""
+import argparse
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from passlib.context import CryptContext
+from sqlalchemy import update
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_SCHEME = os.getenv("PASSWORD_SCHEME", "bcrypt")  # bcrypt, argon2
+PASSWORD_CALIBRATE = os.getenv("PASSWORD_CALIBRATE", "false").lower() == "true"
+PASSWORD_TARGET_MS = float(os.getenv("PASSWORD_TARGET_MS", "250"))
+PASSWORD_REHASH = os.getenv("PASSWORD_REHASH", "true").lower() == "true"
+ARGON2_MEMORY_KIB = int(os.getenv("ARGON2_MEMORY_KIB", "65536"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+
+# Cost range per scheme: bcrypt rounds are log2 iterations, argon2 rounds are time_cost passes
+COST_RANGES: Dict[str, Tuple[int, int]] = {"bcrypt": (10, 16), "argon2": (1, 10)}
+DEFAULT_ROUNDS = {"bcrypt": 12, "argon2": 3}
+
+PASSWORD_MIN_ROUNDS = int(os.getenv("PASSWORD_MIN_ROUNDS", str(COST_RANGES.get(PASSWORD_SCHEME, (10,))[0])))
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", str(DEFAULT_ROUNDS.get(PASSWORD_SCHEME, 12))))
+
+# Verifies timed per cost when calibrating
+CALIBRATION_SAMPLES = 3
+SAMPLE_PASSWORD = "calibration-Passw0rd!"
+
+
+def build_context(scheme: str = PASSWORD_SCHEME, rounds: int = PASSWORD_HASH_ROUNDS) -> CryptContext:
+    """Context hashing with `scheme` at `rounds`; lower-cost hashes and other schemes need an update"""
+    if scheme not in COST_RANGES:
+        raise ValueError(f"Unknown PASSWORD_SCHEME {scheme!r}; use bcrypt or argon2")
+    settings = {f"{scheme}__default_rounds": rounds, f"{scheme}__min_rounds": rounds}
+    if scheme == "argon2":
+        settings.update(argon2__memory_cost=ARGON2_MEMORY_KIB, argon2__parallelism=ARGON2_PARALLELISM)
+    # bcrypt stays listed so existing hashes keep verifying after a switch to argon2
+    schemes = [scheme] if scheme == "bcrypt" else [scheme, "bcrypt"]
+    return CryptContext(schemes=schemes, deprecated="auto", **settings)
+
+
+context = build_context()
+rounds = PASSWORD_HASH_ROUNDS
+rehashes = {"scheduled": 0, "applied": 0, "skipped": 0, "failed": 0}
+
+
+def configure(new_rounds: int, scheme: str = PASSWORD_SCHEME):
+    """Switch the cost used for new hashes (and the threshold for stale ones)"""
+    global context, rounds
+    context = build_context(scheme, new_rounds)
+    rounds = new_rounds
+
+
+def hash_password(password: str) -> str:
+    return context.hash(password)
+
+
+def verify_password(password: str, hashed_password: str) -> Tuple[bool, bool]:
+    """Return (matches, needs_rehash)"""
+    current = context
+    if not current.verify(password, hashed_password):
+        return False, False
+    return True, current.needs_update(hashed_password)
+
+
+def time_verify(scheme: str, cost: int, samples: int = CALIBRATION_SAMPLES) -> List[float]:
+    """Verify times in milliseconds for a hash of `cost`"""
+    ctx = build_context(scheme, cost)
+    hashed = ctx.hash(SAMPLE_PASSWORD)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        ctx.verify(SAMPLE_PASSWORD, hashed)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def calibrate(target_ms: float = PASSWORD_TARGET_MS, scheme: str = PASSWORD_SCHEME) -> Tuple[int, float]:
+    """Highest cost whose median verify is within target_ms, and that median"""
+    low, high = COST_RANGES[scheme]
+    if scheme == PASSWORD_SCHEME:
+        low = max(low, PASSWORD_MIN_ROUNDS)
+    chosen, chosen_ms = low, None
+    for cost in range(low, high + 1):
+        median_ms = statistics.median(time_verify(scheme, cost))
+        if median_ms > target_ms and chosen_ms is not None:
+            break
+        chosen, chosen_ms = cost, median_ms
+        if median_ms > target_ms:
+            # Even the minimum cost is over target; it is kept regardless
+            break
+    return chosen, chosen_ms
+
+
+def calibrate_and_apply(target_ms: float = PASSWORD_TARGET_MS):
+    """Run calibration and use the result for new hashes (startup, PASSWORD_CALIBRATE=true)"""
+    chosen, median_ms = calibrate(target_ms)
+    configure(chosen)
+    logger.info("Password hashing: %s cost %d, %.0f ms per verify (target %.0f ms)",
+                PASSWORD_SCHEME, chosen, median_ms, target_ms)
+
+
+_rehash_executor: Optional[ThreadPoolExecutor] = None
+_rehash_pending = set()
+_rehash_lock = threading.Lock()
+
+
+def _rehash(user_id: int, password: str, old_hash: str):
+    from . import models
+    from .database import SessionLocal
+
+    try:
+        new_hash = hash_password(password)
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                update(models.User)
+                .where(models.User.id == user_id, models.User.hashed_password == old_hash)
+                .values(hashed_password=new_hash)
+            )
+            db.commit()
+        finally:
+            db.close()
+        rehashes["applied" if result.rowcount else "skipped"] += 1
+    except Exception:
+        rehashes["failed"] += 1
+        logger.exception("Rehashing password for user %s failed", user_id)
+    finally:
+        with _rehash_lock:
+            _rehash_pending.discard(user_id)
+
+
+def schedule_rehash(user_id: int, password: str, old_hash: str):
+    """Rehash a stale password hash in the background; one at a time, once per user"""
+    global _rehash_executor
+    if not PASSWORD_REHASH:
+        return
+    with _rehash_lock:
+        if user_id in _rehash_pending:
+            return
+        _rehash_pending.add(user_id)
+        if _rehash_executor is None:
+            # A single thread keeps rehashing from competing with logins for CPU
+            _rehash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rehash")
+    rehashes["scheduled"] += 1
+    _rehash_executor.submit(_rehash, user_id, password, old_hash)
+
+
+def stats() -> dict:
+    return {"scheme": PASSWORD_SCHEME, "rounds": rounds, "rehashes": dict(rehashes)}
+
+
+def bench(scheme: str, iterations: int, costs: List[int]):
+    print(f"{scheme}: {iterations} verifies per cost")
+    print(f"{'cost':>5} {'median ms':>10} {'p95 ms':>8} {'logins/s/core':>14}")
+    for cost in costs:
+        timings = sorted(time_verify(scheme, cost, iterations))
+        median_ms = statistics.median(timings)
+        p95_ms = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{cost:>5} {median_ms:>10.1f} {p95_ms:>8.1f} {1000 / median_ms:>14.1f}")
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="LexLeaks password hashing tools")
+    parser.add_argument("--scheme", default=PASSWORD_SCHEME, choices=sorted(COST_RANGES))
+    commands = parser.add_subparsers(dest="command", required=True)
+    calibrate_parser = commands.add_parser("calibrate", help="Pick the cost for a target verify latency")
+    calibrate_parser.add_argument("--target-ms", type=float, default=PASSWORD_TARGET_MS)
+    bench_parser = commands.add_parser("bench", help="Verify latency and logins/sec per core for each cost")
+    bench_parser.add_argument("--iterations", type=int, default=10)
+    bench_parser.add_argument("--min-cost", type=int)
+    bench_parser.add_argument("--max-cost", type=int)
+    args = parser.parse_args(argv)
+
+    low, high = COST_RANGES[args.scheme]
+    if args.command == "calibrate":
+        chosen, median_ms = calibrate(args.target_ms, args.scheme)
+        print(f"{args.scheme}: cost {chosen} verifies in {median_ms:.1f} ms (target {args.target_ms:.0f} ms)")
+        print(f"PASSWORD_HASH_ROUNDS={chosen}")
+    else:
+        costs = list(range(args.min_cost or low, (args.max_cost or high - 2) + 1))
+        bench(args.scheme, args.iterations, costs)
+
+
+if __name__ == "__main__":
+    main()
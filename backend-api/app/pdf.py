@@ -0,0 +1,95 @@
+"""
+PDF work that runs in worker processes.
+
+Text extraction, redaction and preview rendering are CPU-bound and hold the
+GIL, so they run in a process pool (see pdfpool.py) rather than in request
+workers or threads. (The API only renders a single preview that was evicted
+from the cache, see previews.py.) This module imports nothing but PyMuPDF,
+so pool processes start quickly and hold no database connections; tasks
+pass file paths, never file contents.
+"""
+import hashlib
+import os
+from typing import Dict, List, Tuple
+
+import pymupdf
+
+
+def page_count(path: str) -> int:
+    with pymupdf.open(path, filetype="pdf") as pdf:
+        return pdf.page_count
+
+
+def extract_text(path: str, first: int, last: int) -> List[Tuple[int, str]]:
+    """(page number, text) of pages [first, last), numbered from 1"""
+    with pymupdf.open(path, filetype="pdf") as pdf:
+        pages = []
+        for index in range(first, min(last, pdf.page_count)):
+            # Content-stream order; sort=True (reading order) is ~20x slower and search does not need it
+            text = pdf[index].get_text("text")
+            # Postgres text cannot hold NUL characters
+            pages.append((index + 1, text.replace("\x00", "").strip()))
+        return pages
+
+
+def redact(source: str, destination: str, boxes: List[Dict[str, float]]) -> Tuple[str, int]:
+    """
+    Burn redaction boxes into a copy of a PDF; returns the copy's (sha256, size).
+
+    Boxes are {page (from 1), x, y, width, height} in PDF points from the top
+    left of the page as displayed, as the viewer draws them. Text, image pixels
+    and line art under a box are removed from the file, not just covered.
+    """
+    with pymupdf.open(source, filetype="pdf") as pdf:
+        by_page: Dict[int, List[Dict[str, float]]] = {}
+        for box in boxes:
+            by_page.setdefault(int(box["page"]) - 1, []).append(box)
+        for index, page_boxes in by_page.items():
+            if not 0 <= index < pdf.page_count:
+                continue
+            page = pdf[index]
+            for box in page_boxes:
+                rect = pymupdf.Rect(box["x"], box["y"], box["x"] + box["width"], box["y"] + box["height"])
+                # Displayed coordinates to the page's own, for rotated pages
+                page.add_redact_annot(rect * page.derotation_matrix, fill=(0, 0, 0))
+            page.apply_redactions(
+                images=pymupdf.PDF_REDACT_IMAGE_PIXELS,
+                # A drawing that is only partly covered would still be in the file
+                graphics=pymupdf.PDF_REDACT_LINE_ART_REMOVE_IF_TOUCHED,
+            )
+        # Author, editing history and the like can identify a source too
+        pdf.set_metadata({})
+        pdf.del_xml_metadata()
+        # A full rewrite: an incremental save would keep the removed objects in the file
+        pdf.save(destination, garbage=4, clean=True, deflate=True)
+
+    hasher = hashlib.sha256()
+    with open(destination, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest(), os.path.getsize(destination)
+
+
+def render_thumbnails(path: str, first: int, last: int, width: int, quality: int, destination: str) -> int:
+    """
+    Render pages [first, last) as JPEGs `width` pixels wide; returns the bytes written.
+
+    `destination` is a file path with a {page} field (numbered from 1). Each
+    image is written next to it and renamed into place, so readers never see
+    part of one.
+    """
+    written = 0
+    with pymupdf.open(path, filetype="pdf") as pdf:
+        for index in range(first, min(last, pdf.page_count)):
+            page = pdf[index]
+            # Very tall pages (receipts, scrolls) are cut off rather than made huge
+            zoom = width / page.rect.width
+            clip = pymupdf.Rect(page.rect.x0, page.rect.y0, page.rect.x1, page.rect.y0 + min(page.rect.height, 4 * page.rect.width))
+            pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), clip=clip, alpha=False)
+            target = destination.format(page=index + 1)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            staged = f"{target}.{os.getpid()}.part"
+            pixmap.save(staged, output="jpeg", jpg_quality=quality)
+            os.replace(staged, target)
+            written += os.path.getsize(target)
+    return written
@@ -0,0 +1,67 @@
+"""
+The process pool shared by the worker's PDF stages.
+
+Text extraction (extraction.py) and redaction rendering (redaction.py) are
+CPU-bound MuPDF work that holds the GIL, so both submit their tasks (the
+functions in pdf.py) to one pool of PDF_PROCESSES processes rather than each
+sizing its own for the same cores. The API process has a pool of its own
+for the preview images it renders on request (previews.ensure); there at
+most PREVIEW_RENDER_CONCURRENCY tasks run at once, and the pool only starts
+processes as it needs them.
+
+The pool is started on first use with the spawn method, so its processes
+inherit no database connections or threads. If a process dies (e.g. MuPDF
+crashes on a hostile file) the pool is broken for good; `run` then drops it,
+so the next task starts a fresh one.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+# EXTRACT_PROCESSES is the older name of this setting
+PDF_PROCESSES = int(os.getenv(
+    "PDF_PROCESSES", os.getenv("EXTRACT_PROCESSES", str(max(1, (os.cpu_count() or 2) - 1)))
+))
+# Pool processes are replaced after this many tasks, bounding MuPDF's memory growth
+PDF_TASKS_PER_CHILD = int(os.getenv("PDF_TASKS_PER_CHILD", os.getenv("EXTRACT_TASKS_PER_CHILD", "200")))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=PDF_TASKS_PER_CHILD,
+        )
+    return _pool
+
+
+def shutdown(wait: bool = True):
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=wait, cancel_futures=True)
+        _pool = None
+
+
+async def gather(*calls: tuple) -> list:
+    """Run (fn, *args) calls in the pool concurrently; results in order"""
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    try:
+        return await asyncio.gather(*(loop.run_in_executor(pool, fn, *args) for fn, *args in calls))
+    except BrokenProcessPool:
+        # Unless another stage has already replaced it
+        if _pool is pool:
+            shutdown(wait=False)
+        raise
+
+
+async def run(fn: Callable[..., Any], *args) -> Any:
+    """Run one call in the pool"""
+    return (await gather((fn, *args)))[0]
@@ -0,0 +1,348 @@
+"""
+Preview images of documents: a card image of the first page and per-page thumbnails.
+
+Previews are rendered from the file readers get (`published_sha256`: the
+redacted rendition of a redacted document, see redaction.py), never from a
+redacted document's original, and are addressed by that file's hash:
+
+    /api/previews/<sha256>/card.jpg          first page, PREVIEW_CARD_WIDTH px wide
+    /api/previews/<sha256>/pages/<n>.jpg     page n, PREVIEW_PAGE_WIDTH px wide
+
+so a URL's content never changes and responses are cached as immutable. A
+request is only served while some document publishes that hash, so previews
+of a file that has since been redacted are not reachable. Post listings give
+each post's card URL (`preview_url`), so a card preview is one small fetch.
+
+Rendering happens at ingestion: the outbox worker (app/worker.py) runs this
+stage alongside its own loop, claiming documents whose previews are not
+rendered for their published file (`preview_sha256` differs) with FOR UPDATE
+SKIP LOCKED and a lease, like text extraction. The card and the first
+PREVIEW_PAGES page thumbnails are rendered in the PDF process pool, in tasks
+of PREVIEW_PAGES_PER_TASK pages. Failures are retried with exponential
+backoff; after PREVIEW_MAX_ATTEMPTS the document is left without previews.
+
+The images live in a disk cache under PREVIEW_CACHE_DIR, laid out by hash.
+It is bounded to PREVIEW_CACHE_MAX_BYTES by evicting least recently used
+files (by mtime, which serving refreshes at most every PREVIEW_TOUCH_SECONDS)
+every PREVIEW_EVICT_SECONDS. An image that is missing (evicted, a later page,
+or an instance with its own cache) is rendered on request in the API's own
+PDF process pool (pdfpool.py), one at a time per image and at most
+PREVIEW_RENDER_CONCURRENCY at once, so MuPDF never runs in a request thread.
+
+The worker writes the cache and the API serves it, so in a deployment where
+they run in separate containers (see the Procfile) PREVIEW_CACHE_DIR must be
+on a volume both mount. Without one nothing breaks, but ingestion rendering
+is wasted: every image is rendered again on its first request to each API
+instance. (The same holds, more strictly, for DOCUMENT_STORAGE=local; see
+storage.py.)
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, update
+
+from . import cache, models, pdf, pdfpool, singleflight, storage
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_ENABLED = os.getenv("PREVIEW_ENABLED", "true").lower() == "true"
+PREVIEW_CACHE_DIR = os.getenv("PREVIEW_CACHE_DIR", os.path.join(storage.DOCUMENT_STORAGE_DIR, "previews"))
+PREVIEW_CACHE_MAX_BYTES = int(os.getenv("PREVIEW_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+PREVIEW_CARD_WIDTH = int(os.getenv("PREVIEW_CARD_WIDTH", "320"))
+PREVIEW_PAGE_WIDTH = int(os.getenv("PREVIEW_PAGE_WIDTH", "160"))
+PREVIEW_QUALITY = int(os.getenv("PREVIEW_QUALITY", "70"))
+PREVIEW_PAGES = int(os.getenv("PREVIEW_PAGES", "50"))
+PREVIEW_PAGES_PER_TASK = int(os.getenv("PREVIEW_PAGES_PER_TASK", "25"))
+PREVIEW_CLAIM_SIZE = int(os.getenv("PREVIEW_CLAIM_SIZE", "4"))
+PREVIEW_LEASE_SECONDS = int(os.getenv("PREVIEW_LEASE_SECONDS", "600"))
+PREVIEW_MAX_ATTEMPTS = int(os.getenv("PREVIEW_MAX_ATTEMPTS", "5"))
+PREVIEW_BACKOFF_SECONDS = int(os.getenv("PREVIEW_BACKOFF_SECONDS", "60"))
+PREVIEW_POLL_SECONDS = float(os.getenv("PREVIEW_POLL_SECONDS", "5"))
+PREVIEW_EVICT_SECONDS = float(os.getenv("PREVIEW_EVICT_SECONDS", "300"))
+PREVIEW_TOUCH_SECONDS = float(os.getenv("PREVIEW_TOUCH_SECONDS", "3600"))
+PREVIEW_RENDER_CONCURRENCY = int(os.getenv("PREVIEW_RENDER_CONCURRENCY", "2"))
+
+# Eviction frees down to this share of the limit, so it does not run on every write
+EVICT_TO = 0.9
+
+# (document, bytes written or None, error or None)
+Outcome = Tuple[models.Document, Optional[int], Optional[str]]
+
+_evict_lock = threading.Lock()
+_last_evict = 0.0
+_render_slots: Optional[asyncio.Semaphore] = None
+
+
+# URLs and cache layout
+
+def card_url(sha256: str) -> str:
+    return f"/api/previews/{sha256}/card.jpg"
+
+
+def _directory(sha256: str) -> str:
+    return os.path.join(PREVIEW_CACHE_DIR, sha256[:2], sha256)
+
+
+def card_path(sha256: str) -> str:
+    return os.path.join(_directory(sha256), "card.jpg")
+
+
+def page_path(sha256: str, page: int) -> str:
+    return os.path.join(_directory(sha256), "pages", f"{page}.jpg")
+
+
+def _page_pattern(sha256: str) -> str:
+    return os.path.join(_directory(sha256), "pages", "{page}.jpg")
+
+
+def lookup(path: str) -> bool:
+    """Whether a cached image exists, marking it recently used"""
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return False
+    if time.time() - mtime > PREVIEW_TOUCH_SECONDS:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted just now
+            return False
+    return True
+
+
+def evict(max_bytes: int = PREVIEW_CACHE_MAX_BYTES) -> Tuple[int, int]:
+    """Delete least recently used images until the cache fits; returns (files, bytes) removed"""
+    entries = []
+    total = 0
+    for root, _, files in os.walk(PREVIEW_CACHE_DIR):
+        for name in files:
+            if name.endswith(".part"):
+                # Being written
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return 0, 0
+    removed = freed = 0
+    target = max_bytes * EVICT_TO
+    for _, size, path in sorted(entries):
+        if total - freed <= target:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        removed += 1
+        freed += size
+        _remove_empty_parents(os.path.dirname(path))
+    logger.info("Evicted %d preview images (%d bytes) to keep the cache under %d bytes", removed, freed, max_bytes)
+    return removed, freed
+
+
+def _remove_empty_parents(directory: str):
+    root = os.path.abspath(PREVIEW_CACHE_DIR)
+    directory = os.path.abspath(directory)
+    while directory != root and directory.startswith(root):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            # Not empty (or already gone)
+            return
+        directory = os.path.dirname(directory)
+
+
+def maybe_evict():
+    """evict(), if it has not run in this process in the last PREVIEW_EVICT_SECONDS"""
+    global _last_evict
+    if time.monotonic() - _last_evict < PREVIEW_EVICT_SECONDS or not _evict_lock.acquire(blocking=False):
+        return
+    try:
+        _last_evict = time.monotonic()
+        evict()
+    finally:
+        _evict_lock.release()
+
+
+# Rendering on request
+
+async def _render_one(sha256: str, page: int, card: bool) -> str:
+    """Render one image of a published file into the cache; returns its path"""
+    backend = storage.get_backend()
+    source, temporary = await run_in_threadpool(backend.fetch, storage.document_key(sha256))
+    try:
+        if card:
+            await pdfpool.run(pdf.render_thumbnails, source, 0, 1, PREVIEW_CARD_WIDTH, PREVIEW_QUALITY,
+                              card_path(sha256))
+        else:
+            await pdfpool.run(pdf.render_thumbnails, source, page - 1, page, PREVIEW_PAGE_WIDTH, PREVIEW_QUALITY,
+                              _page_pattern(sha256))
+    finally:
+        if temporary:
+            await run_in_threadpool(os.remove, source)
+    return card_path(sha256) if card else page_path(sha256, page)
+
+
+async def ensure(sha256: str, page: int, card: bool) -> str:
+    """Path of a cached image, rendering it first if it is missing"""
+    global _render_slots
+    path = card_path(sha256) if card else page_path(sha256, page)
+    if await run_in_threadpool(lookup, path):
+        return path
+    if _render_slots is None:
+        _render_slots = asyncio.Semaphore(PREVIEW_RENDER_CONCURRENCY)
+
+    async def render():
+        async with _render_slots:
+            rendered = await _render_one(sha256, page, card)
+        await run_in_threadpool(maybe_evict)
+        return rendered
+
+    return await singleflight.group.do_async(f"preview:{path}", render)
+
+
+# Rendering at ingestion
+
+def claim(db, limit: int) -> List[models.Document]:
+    """Lease up to `limit` documents whose previews are not rendered for their published file"""
+    due = (
+        select(models.Document.id)
+        .where(
+            models.Document.published_sha256.is_not(None),
+            models.Document.preview_sha256.is_distinct_from(models.Document.published_sha256),
+            models.Document.preview_available_at <= func.now(),
+        )
+        .order_by(models.Document.preview_available_at, models.Document.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    documents = db.scalars(
+        update(models.Document)
+        .where(models.Document.id.in_(due.scalar_subquery()))
+        .values(
+            preview_attempts=models.Document.preview_attempts + 1,
+            preview_available_at=func.now() + timedelta(seconds=PREVIEW_LEASE_SECONDS),
+        )
+        .returning(models.Document)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return sorted(documents, key=lambda document: document.id)
+
+
+def mark_rendered(db, document: models.Document):
+    """Record that the previews of the file published when the document was claimed are cached"""
+    db.execute(
+        update(models.Document)
+        .where(models.Document.id == document.id, models.Document.published_sha256 == document.published_sha256)
+        .values(preview_sha256=document.published_sha256, preview_attempts=0, preview_error=None)
+    )
+    # Listings now carry the card URL
+    cache.invalidate(db, cache.POSTS)
+    db.commit()
+
+
+def mark_failed(db, document: models.Document, error: str):
+    """Schedule a retry, or give up after the last attempt"""
+    if document.preview_attempts >= PREVIEW_MAX_ATTEMPTS:
+        # Nothing more to do for this file; listings show no preview (preview_error is set)
+        values = {"preview_sha256": document.published_sha256, "preview_error": error[:2000]}
+    else:
+        delay = min(PREVIEW_BACKOFF_SECONDS * 2 ** (document.preview_attempts - 1), 6 * 3600)
+        values = {"preview_error": None, "preview_available_at": func.now() + timedelta(seconds=delay)}
+    db.execute(
+        update(models.Document)
+        .where(models.Document.id == document.id, models.Document.published_sha256 == document.published_sha256)
+        .values(**values)
+    )
+    db.commit()
+
+
+def _claim(limit: int) -> List[models.Document]:
+    db = SessionLocal()
+    try:
+        return claim(db, limit)
+    finally:
+        db.close()
+
+
+def _record(outcomes: List[Outcome]):
+    db = SessionLocal()
+    try:
+        for document, _, error in outcomes:
+            if error is None:
+                mark_rendered(db, document)
+            else:
+                mark_failed(db, document, error)
+    finally:
+        db.close()
+
+
+async def _render_document(document: models.Document) -> Outcome:
+    backend = storage.get_backend()
+    sha256 = document.published_sha256
+    try:
+        source, temporary = await run_in_threadpool(backend.fetch, storage.document_key(sha256))
+        try:
+            last = min(document.page_count or 0, PREVIEW_PAGES)
+            written = await pdfpool.gather(
+                (pdf.render_thumbnails, source, 0, 1, PREVIEW_CARD_WIDTH, PREVIEW_QUALITY, card_path(sha256)),
+                *(
+                    (pdf.render_thumbnails, source, first, min(first + PREVIEW_PAGES_PER_TASK, last),
+                     PREVIEW_PAGE_WIDTH, PREVIEW_QUALITY, _page_pattern(sha256))
+                    for first in range(0, last, PREVIEW_PAGES_PER_TASK)
+                ),
+            )
+        finally:
+            if temporary:
+                os.remove(source)
+    except Exception as e:
+        logger.exception("Previews of document %s failed on attempt %d", document.id, document.preview_attempts)
+        return document, None, repr(e)
+    return document, sum(written), None
+
+
+async def run_round(limit: int = PREVIEW_CLAIM_SIZE) -> int:
+    """Render the previews of up to `limit` documents; returns the number claimed"""
+    documents = await run_in_threadpool(_claim, limit)
+    if not documents:
+        return 0
+    started = time.monotonic()
+    outcomes = await asyncio.gather(*(_render_document(document) for document in documents))
+    await run_in_threadpool(_record, outcomes)
+    written = sum(size for _, size, error in outcomes if error is None)
+    failed = sum(1 for _, _, error in outcomes if error is not None)
+    logger.info("Rendered previews of %d documents (%d failed, %d bytes) in %.2fs",
+                len(documents), failed, written, time.monotonic() - started)
+    return len(documents)
+
+
+async def run(stopping: asyncio.Event, once: bool = False):
+    """Preview loop run by the worker until `stopping` is set (or, with once, nothing is due)"""
+    if not PREVIEW_ENABLED:
+        return
+    while not stopping.is_set():
+        try:
+            claimed = await run_round()
+            await run_in_threadpool(maybe_evict)
+        except Exception:
+            logger.exception("Preview round failed")
+            claimed = 0
+        if not claimed:
+            if once:
+                break
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=PREVIEW_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,484 @@
+"""
+Web Push fan-out.
+
+A send streams matching subscriptions from the database in keyset batches
+(the next batch is fetched while the current one is being delivered) and
+posts to the push services over one pooled aiohttp client, with at most
+PUSH_CONCURRENCY requests in flight.
+
+Per send, the payload is serialized once and the VAPID token is signed once
+per push service origin; the body is encrypted per subscription, as every
+subscription has its own keys. 429/5xx responses and network errors are
+retried with exponential backoff (honouring Retry-After), without holding a
+concurrency slot while waiting; subscriptions answered with 404/410 are
+pruned in bulk.
+
+Command line usage (from backend-api/):
+    python -m app.push send --title "Hello" --body "..." --preference new_posts
+    python -m app.push bench --count 5000   # against an in-process mock push service
+    python -m app.push mock --port 8787 &   # or run the mock in its own process
+    python -m app.push bench --count 5000 --push-url http://127.0.0.1:8787
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import re
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+import http_ece
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi.concurrency import run_in_threadpool
+from py_vapid import Vapid
+
+from . import crud, schemas
+from .database import SessionLocal
+
+VAPID_PRIVATE_KEY = os.getenv("VAPID_PRIVATE_KEY")
+VAPID_PUBLIC_KEY = os.getenv("VAPID_PUBLIC_KEY")
+VAPID_SUBJECT = os.getenv("VAPID_SUBJECT", "mailto:admin@lexleaks.com")
+
+# Requests in flight to push services, across all sends in this process
+PUSH_CONCURRENCY = int(os.getenv("PUSH_CONCURRENCY", "256"))
+# Subscriptions fetched per keyset page
+PUSH_BATCH_SIZE = int(os.getenv("PUSH_BATCH_SIZE", "1000"))
+PUSH_MAX_ATTEMPTS = int(os.getenv("PUSH_MAX_ATTEMPTS", "4"))
+PUSH_TIMEOUT_SECONDS = float(os.getenv("PUSH_TIMEOUT_SECONDS", "10"))
+PUSH_BACKOFF_SECONDS = float(os.getenv("PUSH_BACKOFF_SECONDS", "0.5"))
+# VAPID tokens may live up to 24h; re-sign well before that
+VAPID_TOKEN_SECONDS = 12 * 3600
+
+# (subscription id, endpoint, p256dh, auth)
+Target = Tuple[int, str, str, str]
+
+
+class PushNotConfigured(Exception):
+    """VAPID keys are missing"""
+
+
+class VapidSigner:
+    """Signs one VAPID token per push service origin and reuses it until it nears expiry"""
+
+    def __init__(self, vapid: Vapid, subject: str = VAPID_SUBJECT):
+        self.vapid = vapid
+        self.subject = subject
+        self._tokens: Dict[str, Tuple[float, str]] = {}
+
+    def authorization(self, endpoint: str) -> str:
+        parts = urlsplit(endpoint)
+        audience = f"{parts.scheme}://{parts.netloc}"
+        now = time.time()
+        cached = self._tokens.get(audience)
+        if cached is None or cached[0] - now < 3600:
+            expires = int(now) + VAPID_TOKEN_SECONDS
+            headers = self.vapid.sign({"aud": audience, "sub": self.subject, "exp": expires})
+            cached = (expires, headers["Authorization"])
+            self._tokens[audience] = cached
+        return cached[1]
+
+
+_signer: Optional[VapidSigner] = None
+
+
+def get_signer() -> VapidSigner:
+    global _signer
+    if _signer is None:
+        if not VAPID_PRIVATE_KEY:
+            raise PushNotConfigured("VAPID_PRIVATE_KEY is not set")
+        _signer = VapidSigner(Vapid.from_string(VAPID_PRIVATE_KEY))
+    return _signer
+
+
+_client: Optional[aiohttp.ClientSession] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def get_client() -> aiohttp.ClientSession:
+    """Process-wide pooled client; connections to each push service are reused"""
+    global _client, _slots
+    if _client is None or _client.closed:
+        _client = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=PUSH_CONCURRENCY, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=PUSH_TIMEOUT_SECONDS),
+        )
+        _slots = asyncio.Semaphore(PUSH_CONCURRENCY)
+    return _client
+
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+class FanOutStats:
+    def __init__(self):
+        self.matched = 0
+        self.sent = 0
+        self.failed = 0
+        self.pruned = 0
+        self.retried = 0
+        self.started = time.monotonic()
+
+    def result(self) -> schemas.PushSendResult:
+        elapsed = time.monotonic() - self.started
+        return schemas.PushSendResult(
+            matched=self.matched,
+            sent=self.sent,
+            failed=self.failed,
+            pruned=self.pruned,
+            retried=self.retried,
+            elapsed_seconds=round(elapsed, 3),
+            per_second=round(self.matched / elapsed, 1) if elapsed else 0.0,
+        )
+
+
+def _retry_delay(attempt: int, retry_after: Optional[str]) -> float:
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), 30.0)
+    # Exponential backoff with jitter so retries from one send don't arrive in lockstep
+    return PUSH_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+class PushSender:
+    """Delivers one notification to many subscriptions"""
+
+    def __init__(
+        self,
+        message: dict,
+        ttl: int = 86400,
+        urgency: str = "normal",
+        topic: Optional[str] = None,
+        signer: Optional[VapidSigner] = None,
+        client: Optional[aiohttp.ClientSession] = None,
+    ):
+        self.message = message
+        self.payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        self._variants: Dict[tuple, bytes] = {}
+        self.signer = signer or get_signer()
+        self.client = client or get_client()
+        self.headers = {
+            "Content-Type": "application/octet-stream",
+            "Content-Encoding": "aes128gcm",
+            "TTL": str(ttl),
+            "Urgency": urgency,
+        }
+        # Topic lets the push service replace an undelivered message with the same tag
+        if topic and re.fullmatch(r"[A-Za-z0-9_-]{1,32}", topic):
+            self.headers["Topic"] = topic
+        self._server_key = ec.generate_private_key(ec.SECP256R1())
+
+    def payload_for(self, overrides: Optional[dict] = None) -> bytes:
+        """The shared payload, or a variant with some top-level fields replaced (serialized once per variant)"""
+        if not overrides:
+            return self.payload
+        variant = tuple(sorted(overrides.items()))
+        payload = self._variants.get(variant)
+        if payload is None:
+            payload = json.dumps({**self.message, **overrides}, separators=(",", ":")).encode("utf-8")
+            self._variants[variant] = payload
+        return payload
+
+    def encrypt(self, p256dh: str, auth: str, payload: Optional[bytes] = None) -> bytes:
+        """RFC 8291 aes128gcm body for one subscription's keys"""
+        # One ephemeral sender key per send; the salt is fresh for every message
+        return http_ece.encrypt(
+            payload or self.payload,
+            salt=os.urandom(16),
+            private_key=self._server_key,
+            dh=_b64decode(p256dh),
+            auth_secret=_b64decode(auth),
+            version="aes128gcm",
+        )
+
+    async def deliver(self, target: Target, stats: FanOutStats, overrides: Optional[dict] = None) -> bool:
+        """
+        Send to one subscription; returns False if the subscription is gone.
+        Called holding one of the PUSH_CONCURRENCY slots (see fan_out), which is
+        given back while waiting to retry.
+        """
+        subscription_id, endpoint, p256dh, auth = target[:4]
+        try:
+            body = self.encrypt(p256dh, auth, self.payload_for(overrides))
+        except Exception:
+            # Malformed keys can never be delivered to
+            stats.failed += 1
+            return False
+        headers = dict(self.headers, Authorization=self.signer.authorization(endpoint))
+
+        for attempt in range(PUSH_MAX_ATTEMPTS):
+            retry_after = None
+            try:
+                async with self.client.post(endpoint, data=body, headers=headers) as response:
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+                    await response.release()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status = None
+
+            if status is not None and 200 <= status < 300:
+                stats.sent += 1
+                return True
+            if status in (404, 410):
+                return False
+            if status is not None and status < 500 and status != 429:
+                break
+            if attempt + 1 < PUSH_MAX_ATTEMPTS:
+                stats.retried += 1
+                _slots.release()
+                try:
+                    await asyncio.sleep(_retry_delay(attempt, retry_after))
+                finally:
+                    await _slots.acquire()
+
+        stats.failed += 1
+        return True
+
+
+async def fan_out(
+    sender: PushSender,
+    batches: AsyncIterator[List[Target]],
+    prune: Callable[[List[int]], Awaitable[int]],
+    personalize: Optional[Callable[[tuple], Optional[dict]]] = None,
+) -> schemas.PushSendResult:
+    """
+    Deliver to every target from `batches`, keeping up to PUSH_CONCURRENCY requests
+    in flight across batch boundaries, and hand gone subscription ids to `prune`.
+    `personalize(target)` may return message fields to override for that target;
+    targets can carry extra fields after (id, endpoint, p256dh, auth) for it.
+    """
+    get_client()
+    stats = FanOutStats()
+    gone: List[int] = []
+    pending = set()
+
+    async def deliver(target: Target):
+        try:
+            overrides = personalize(target) if personalize else None
+            if not await sender.deliver(target, stats, overrides):
+                gone.append(target[0])
+        finally:
+            _slots.release()
+
+    async def flush_gone():
+        if gone:
+            ids = gone[:]
+            gone.clear()
+            stats.pruned += await prune(ids)
+
+    # Fetch the next page while the current one is being delivered
+    next_batch = asyncio.ensure_future(anext(batches, None))
+    while True:
+        batch = await next_batch
+        if batch is None:
+            break
+        next_batch = asyncio.ensure_future(anext(batches, None))
+        stats.matched += len(batch)
+        for target in batch:
+            await _slots.acquire()
+            task = asyncio.create_task(deliver(target))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if len(gone) >= PUSH_BATCH_SIZE:
+            await flush_gone()
+
+    if pending:
+        await asyncio.gather(*pending)
+    await flush_gone()
+    return stats.result()
+
+
+def _fetch_targets(after_id: int, limit: int, filters: dict) -> List[Target]:
+    db = SessionLocal()
+    try:
+        return crud.get_push_targets(db, after_id=after_id, limit=limit, **filters)
+    finally:
+        db.close()
+
+
+async def iter_subscription_batches(
+    batch_size: int = PUSH_BATCH_SIZE,
+    **filters
+) -> AsyncIterator[List[Target]]:
+    """Keyset-paginate matching active subscriptions; each page uses a short-lived session"""
+    after_id = 0
+    while True:
+        batch = await run_in_threadpool(_fetch_targets, after_id, batch_size, filters)
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        after_id = batch[-1][0]
+
+
+def _prune_subscriptions(subscription_ids: List[int]) -> int:
+    db = SessionLocal()
+    try:
+        return crud.delete_push_subscriptions(db, subscription_ids)
+    finally:
+        db.close()
+
+
+async def prune_subscriptions(subscription_ids: List[int]) -> int:
+    return await run_in_threadpool(_prune_subscriptions, subscription_ids)
+
+
+def notification_message(notification: schemas.PushNotificationSend) -> dict:
+    """The JSON the service worker's push handler receives"""
+    return {
+        "title": notification.title,
+        "body": notification.body,
+        "icon": notification.icon,
+        "badge": notification.badge,
+        "tag": notification.tag,
+        "data": {**(notification.data or {}), "url": notification.url},
+    }
+
+
+async def send_notification(notification: schemas.PushNotificationSend) -> schemas.PushSendResult:
+    """Deliver a notification to every active subscription matching its filters"""
+    sender = PushSender(
+        notification_message(notification),
+        ttl=notification.ttl,
+        urgency=notification.urgency,
+        topic=notification.tag,
+    )
+    batches = iter_subscription_batches(
+        preference=notification.preference,
+        user_ids=notification.user_ids,
+        subscription_ids=notification.subscription_ids,
+    )
+    return await fan_out(sender, batches, prune_subscriptions)
+
+
+# Local mock push service, for benchmarks and tests
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def generate_key_set() -> Tuple[str, str]:
+    """A browser-like (p256dh, auth) pair"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    public = key.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    return _b64(public), _b64(os.urandom(16))
+
+
+async def start_mock_push_service(gone_every: int = 0, port: int = 0):
+    """
+    Serve POST /push/{id} on localhost, answering 201, or 410 for every
+    `gone_every`-th id. Returns (runner, base_url); call runner.cleanup() to stop.
+    """
+    from aiohttp import web
+
+    async def receive(request: web.Request):
+        await request.read()
+        subscription_id = int(request.match_info["id"])
+        if gone_every and subscription_id % gone_every == 0:
+            return web.Response(status=410)
+        return web.Response(status=201)
+
+    app = web.Application()
+    app.router.add_post("/push/{id}", receive)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{bound_port}"
+
+
+async def _bench(
+    count: int, key_sets: int, gone_every: int, push_url: Optional[str] = None
+) -> schemas.PushSendResult:
+    runner, base_url = (None, push_url) if push_url else await start_mock_push_service(gone_every)
+    try:
+        keys = [generate_key_set() for _ in range(min(key_sets, count) or 1)]
+        targets = [
+            (i, f"{base_url}/push/{i}", *keys[i % len(keys)])
+            for i in range(1, count + 1)
+        ]
+
+        async def batches():
+            for start in range(0, len(targets), PUSH_BATCH_SIZE):
+                yield targets[start:start + PUSH_BATCH_SIZE]
+
+        async def prune(ids: List[int]) -> int:
+            return len(ids)
+
+        signer = VapidSigner(Vapid(private_key=ec.generate_private_key(ec.SECP256R1())))
+        sender = PushSender({"title": "Benchmark", "body": "LexLeaks"}, signer=signer)
+        return await fan_out(sender, batches(), prune)
+    finally:
+        await close()
+        if runner is not None:
+            await runner.cleanup()
+
+
+async def _serve_mock(gone_every: int, port: int):
+    runner, base_url = await start_mock_push_service(gone_every, port)
+    print(f"Mock push service listening on {base_url}/push/{{id}}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def _send(notification: schemas.PushNotificationSend) -> schemas.PushSendResult:
+    try:
+        return await send_notification(notification)
+    finally:
+        await close()
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Send LexLeaks push notifications")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    send = commands.add_parser("send", help="Send to subscriptions in the database")
+    send.add_argument("--title", required=True)
+    send.add_argument("--body", required=True)
+    send.add_argument("--url", default="/")
+    send.add_argument("--tag")
+    send.add_argument("--preference", choices=list(crud.PUSH_PREFERENCES))
+
+    bench = commands.add_parser("bench", help="Fan out to a local mock push service")
+    bench.add_argument("--count", type=int, default=5000)
+    bench.add_argument("--key-sets", type=int, default=0,
+                       help="Distinct subscriber key sets (default: one per subscription)")
+    bench.add_argument("--gone-every", type=int, default=50,
+                       help="Answer 410 for every Nth subscription (0 = never)")
+    bench.add_argument("--push-url", help="Use an already running mock push service")
+
+    mock = commands.add_parser("mock", help="Run the mock push service")
+    mock.add_argument("--port", type=int, default=8787)
+    mock.add_argument("--gone-every", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    if args.command == "mock":
+        asyncio.run(_serve_mock(args.gone_every, args.port))
+        return
+    if args.command == "bench":
+        result = asyncio.run(_bench(args.count, args.key_sets or args.count, args.gone_every, args.push_url))
+    else:
+        result = asyncio.run(_send(schemas.PushNotificationSend(
+            title=args.title, body=args.body, url=args.url, tag=args.tag, preference=args.preference
+        )))
+    print(result.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    main()
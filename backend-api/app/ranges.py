@@ -0,0 +1,157 @@
+"""
+Serving stored files with byte ranges, conditional requests and zero-copy transfer.
+
+A PDF viewer reads a large document a page at a time with Range requests, so
+opening page 300 costs a few small reads rather than the whole file:
+
+- `Range: bytes=a-b` (also `a-` and `-n`) gets a 206 with that span; a range
+  starting past the end gets a 416. Requests for several ranges get the whole
+  file (allowed by RFC 9110; PDF.js only ever asks for one);
+- `If-Range` with a stale validator gets the whole file, so a client never
+  splices bytes of two different files;
+- `If-None-Match` matching the ETag gets a 304.
+
+Stored files are content-addressed, so the ETag is the strong hash of the
+content and responses can be cached for a year as immutable.
+
+The bytes are sent, in order of preference:
+
+1. by a front proxy: with DOCUMENT_ACCEL_REDIRECT set (e.g. /_stored/, an
+   nginx `internal` location aliased to DOCUMENT_STORAGE_DIR), the response
+   is an X-Accel-Redirect and nginx sends the file with sendfile(2),
+   handling Range itself;
+2. by the ASGI server with sendfile(2), when it offers the
+   `http.response.zerocopysend` extension;
+3. otherwise in DOWNLOAD_CHUNK_BYTES reads (pread in the threadpool), so
+   memory per download stays at one chunk.
+"""
+import os
+from email.utils import formatdate
+from typing import Mapping, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+DOCUMENT_ACCEL_REDIRECT = os.getenv("DOCUMENT_ACCEL_REDIRECT", "")
+DOWNLOAD_CHUNK_BYTES = int(os.getenv("DOWNLOAD_CHUNK_BYTES", str(256 * 1024)))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested range starts past the end of the file"""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """(first, last) byte positions of a single-range header, or None to send the whole file"""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as the header requires)"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in tags
+
+
+class StoredFileResponse(Response):
+    """A file, or a byte span of it, sent without reading it into memory"""
+
+    def __init__(self, path: str, start: int, length: int, status_code: int, headers: dict, send_body: bool = True):
+        super().__init__(status_code=status_code, headers=headers)
+        self.path = path
+        self.start = start
+        self.length = length
+        self.send_body = send_body
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": ZEROCOPY_EXTENSION, "file": file,
+                    "offset": self.start, "count": self.length, "more_body": False,
+                })
+            return
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            offset, remaining = self.start, self.length
+            while remaining > 0:
+                chunk = await run_in_threadpool(os.pread, fd, min(DOWNLOAD_CHUNK_BYTES, remaining), offset)
+                if not chunk:
+                    raise RuntimeError(f"{self.path} shrank while being sent")
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        finally:
+            os.close(fd)
+
+
+def file_response(
+    request_headers: Mapping[str, str],
+    method: str,
+    path: str,
+    etag: str,
+    content_type: str,
+    accel_path: Optional[str] = None,
+    cache_control: str = IMMUTABLE,
+) -> Response:
+    """Response for a GET/HEAD of a stored file, honouring Range, If-Range and If-None-Match"""
+    stat = os.stat(path)
+    headers = {
+        "accept-ranges": "bytes",
+        "cache-control": cache_control,
+        "etag": etag,
+        "last-modified": formatdate(stat.st_mtime, usegmt=True),
+    }
+    if etag_matches(request_headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    headers["content-type"] = content_type
+    if DOCUMENT_ACCEL_REDIRECT and accel_path is not None:
+        # nginx takes it from here, including Range
+        headers["x-accel-redirect"] = DOCUMENT_ACCEL_REDIRECT.rstrip("/") + "/" + accel_path
+        return Response(status_code=200, headers=headers)
+
+    size = stat.st_size
+    span = None
+    if_range = request_headers.get("if-range")
+    if if_range is None or if_range in (etag, headers["last-modified"]):
+        try:
+            span = parse_range(request_headers.get("range"), size)
+        except RangeNotSatisfiable:
+            headers["content-range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    if span is None:
+        headers["content-length"] = str(size)
+        return StoredFileResponse(path, 0, size, 200, headers, send_body=method != "HEAD")
+    start, end = span
+    headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(end - start + 1)
+    return StoredFileResponse(path, start, end - start + 1, 206, headers, send_body=method != "HEAD")
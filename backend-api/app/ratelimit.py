@@ -0,0 +1,197 @@
+"""
+Token-bucket rate limiting for the password endpoints.
+
+Login and registration run bcrypt, which is deliberately expensive, so they
+are throttled before any hashing happens:
+
+- login: one bucket per client IP and one per username (stuffing from many
+  IPs against one account is caught by the latter);
+- register: one bucket per client IP.
+
+A rule "N/S" allows bursts of N requests and refills N tokens every S
+seconds. Rejected requests get a 429 with Retry-After; rejections are
+counted per rule (see /health/ratelimit).
+
+Buckets live in this process (RATE_LIMIT_BACKEND=memory, so each worker
+limits separately) or in a Redis-protocol store shared by every instance
+(RATE_LIMIT_BACKEND=redis, at CACHE_REDIS_URL). If the shared store is
+unreachable requests are let through rather than locking everyone out.
+
+Client IPs come from request.client, so behind a proxy run uvicorn with
+--forwarded-allow-ips for X-Forwarded-For to be honoured.
+
+Hashing itself runs in the threadpool, at most HASH_CONCURRENCY at a time,
+so even allowed logins cannot stall the event loop or take every thread.
+"""
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory, redis
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+HASH_CONCURRENCY = int(os.getenv("HASH_CONCURRENCY", str(max(1, (os.cpu_count() or 2) // 2))))
+
+
+class Rule:
+    """Bursts of `capacity` requests, refilled at capacity/per_seconds tokens per second"""
+
+    def __init__(self, name: str, spec: str):
+        capacity, per_seconds = spec.split("/")
+        self.name = name
+        self.capacity = float(capacity)
+        self.rate = self.capacity / float(per_seconds)
+
+
+LOGIN_IP = Rule("login-ip", os.getenv("RATE_LIMIT_LOGIN_IP", "20/60"))
+LOGIN_USER = Rule("login-user", os.getenv("RATE_LIMIT_LOGIN_USER", "10/300"))
+REGISTER_IP = Rule("register-ip", os.getenv("RATE_LIMIT_REGISTER_IP", "5/3600"))
+
+
+class MemoryBackend:
+    """
+    Buckets in one OrderedDict per rule, least recently updated first. A bucket
+    left alone for a whole refill period (capacity / rate) is full, the same as
+    no bucket, so each take drops up to PRUNE_PER_TAKE of those from the old
+    end: a bounded amount of work per call. A rule past max_keys buckets loses
+    its least recently updated ones even if they are not full yet.
+    """
+
+    blocking = False
+    PRUNE_PER_TAKE = 2
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, "OrderedDict[str, Tuple[float, float]]"] = {}
+        self._lock = threading.Lock()
+
+    def take(self, rule: Rule, key: str) -> float:
+        """Take a token; returns 0 if allowed, else the seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            buckets = self._buckets.setdefault(rule.name, OrderedDict())
+            tokens, updated = buckets.pop(key, (rule.capacity, now))
+            tokens = min(rule.capacity, tokens + (now - updated) * rule.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rule.rate
+            # Re-inserted at the recent end
+            buckets[key] = (tokens, now)
+            self._prune(rule, buckets, now)
+            return wait
+
+    def _prune(self, rule: Rule, buckets: "OrderedDict[str, Tuple[float, float]]", now: float):
+        refill_seconds = rule.capacity / rule.rate
+        for _ in range(self.PRUNE_PER_TAKE):
+            oldest_key, (_, updated) = next(iter(buckets.items()))
+            if now - updated < refill_seconds and len(buckets) <= self.max_keys:
+                return
+            del buckets[oldest_key]
+
+
+# Refill and take in one round trip; the store's clock is shared by every instance
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBackend:
+    """Buckets shared by every instance, one hash per (rule, key)"""
+
+    blocking = True
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the redis package (pip install redis)")
+        client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self._take = client.register_script(TAKE_SCRIPT)
+
+    def take(self, rule: Rule, key: str) -> float:
+        try:
+            return float(self._take(keys=[f"lexleaks:ratelimit:{rule.name}:{key}"], args=[rule.capacity, rule.rate]))
+        except Exception:
+            logger.warning("Rate limit store unavailable; allowing request", exc_info=True)
+            return 0.0
+
+
+def create_backend():
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisBackend()
+    return MemoryBackend()
+
+
+backend = create_backend()
+rejections: Counter = Counter()
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+async def check(*limits: Tuple[Rule, str]):
+    """Take a token from each (rule, key) bucket in order; raise 429 at the first empty one"""
+    if not RATE_LIMIT_ENABLED:
+        return
+    for rule, key in limits:
+        if backend.blocking:
+            wait = await run_in_threadpool(backend.take, rule, key)
+        else:
+            wait = backend.take(rule, key)
+        if wait > 0:
+            rejections[rule.name] += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts, please try again later",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+
+_hashing_slots: Optional[asyncio.Semaphore] = None
+
+
+async def run_hashing(fn: Callable[..., Any], *args) -> Any:
+    """Run a password-hashing call in the threadpool, at most HASH_CONCURRENCY at once"""
+    global _hashing_slots
+    if _hashing_slots is None:
+        _hashing_slots = asyncio.Semaphore(HASH_CONCURRENCY)
+    async with _hashing_slots:
+        return await run_in_threadpool(fn, *args)
+
+
+def stats() -> dict:
+    return {
+        "backend": RATE_LIMIT_BACKEND,
+        "enabled": RATE_LIMIT_ENABLED,
+        "rejections": dict(rejections),
+        "hash_concurrency": HASH_CONCURRENCY,
+    }
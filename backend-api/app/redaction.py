@@ -0,0 +1,232 @@
+"""
+Redaction: boxes burned into a rendered copy of a document, server-side.
+
+An editor saves a document's redaction boxes (PUT /api/documents/{id}/redactions).
+The set is identified by `redaction_set_hash`, a hash of its geometry (reasons
+are notes for editors and do not change the file). Saving a set:
+
+- records the boxes and the hash on the document;
+- queues a rendition for (document, hash) in `redacted_documents`, unless one
+  already exists. Going back to an earlier set reuses its rendition;
+- withdraws the document (`published_sha256` NULL) until that rendition is
+  ready: the content endpoint answers 503 instead of serving the original,
+  and the extracted text is dropped and waits for the redacted file.
+
+The outbox worker (app/worker.py) runs this stage alongside its own loop,
+claiming pending renditions with FOR UPDATE SKIP LOCKED and a lease, the same
+way text extraction claims documents. Each is rendered in the PDF process
+pool (pdf.redact removes what is under the boxes from the file and rewrites
+it whole) and stored content-addressed, like an upload. If its set is still the
+document's current one, the rendition is then published: the content
+endpoint serves it, and its text is extracted for search. Failures are
+retried with exponential backoff, up to REDACT_MAX_ATTEMPTS.
+
+Readers only ever get the published file; editors can fetch the original
+from /api/documents/{id}/original.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, update
+
+from . import cache, models, pdf, pdfpool, storage
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+REDACT_ENABLED = os.getenv("REDACT_ENABLED", "true").lower() == "true"
+REDACT_CLAIM_SIZE = int(os.getenv("REDACT_CLAIM_SIZE", "2"))
+REDACT_LEASE_SECONDS = int(os.getenv("REDACT_LEASE_SECONDS", "900"))
+REDACT_MAX_ATTEMPTS = int(os.getenv("REDACT_MAX_ATTEMPTS", "5"))
+REDACT_BACKOFF_SECONDS = int(os.getenv("REDACT_BACKOFF_SECONDS", "60"))
+REDACT_POLL_SECONDS = float(os.getenv("REDACT_POLL_SECONDS", "5"))
+
+# Part of every set's hash: bump it when pdf.redact changes, so every document is rendered again
+RENDER_VERSION = 1
+GEOMETRY = ("page", "x", "y", "width", "height")
+
+# (rendition, (sha256, size) or None, error or None)
+Outcome = Tuple[models.RedactedDocument, Optional[Tuple[str, int]], Optional[str]]
+
+
+def canonical_boxes(boxes: Iterable) -> List[dict]:
+    """The geometry of a redaction set (objects or dicts), in a stable order and precision"""
+    canonical = []
+    for box in boxes:
+        get = box.get if isinstance(box, dict) else lambda name: getattr(box, name)
+        canonical.append({
+            "page": int(get("page")),
+            **{name: round(float(get(name)), 2) for name in GEOMETRY[1:]},
+        })
+    return sorted(canonical, key=lambda box: tuple(box[name] for name in GEOMETRY))
+
+
+def redaction_set_hash(boxes: List[dict]) -> Optional[str]:
+    """Hash of canonical boxes, or None for no redactions"""
+    if not boxes:
+        return None
+    encoded = json.dumps([RENDER_VERSION, boxes], separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def claim(db, limit: int) -> List[models.RedactedDocument]:
+    """Lease up to `limit` pending renditions"""
+    due = (
+        select(models.RedactedDocument.id)
+        .where(
+            models.RedactedDocument.status == "pending",
+            models.RedactedDocument.available_at <= func.now(),
+        )
+        .order_by(models.RedactedDocument.available_at, models.RedactedDocument.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    renditions = db.scalars(
+        update(models.RedactedDocument)
+        .where(models.RedactedDocument.id.in_(due.scalar_subquery()))
+        .values(
+            attempts=models.RedactedDocument.attempts + 1,
+            available_at=func.now() + timedelta(seconds=REDACT_LEASE_SECONDS),
+        )
+        .returning(models.RedactedDocument)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return sorted(renditions, key=lambda rendition: rendition.id)
+
+
+def mark_ready(db, rendition: models.RedactedDocument, sha256: str, size: int, key: str):
+    """Record a stored rendition and publish it if its set is still the document's current one"""
+    db.execute(
+        update(models.RedactedDocument)
+        .where(models.RedactedDocument.id == rendition.id)
+        .values(status="ready", sha256=sha256, size=size, storage_key=key, error=None, rendered_at=func.now())
+    )
+    published = db.execute(
+        update(models.Document)
+        .where(
+            models.Document.id == rendition.document_id,
+            models.Document.redaction_hash == rendition.redaction_hash,
+        )
+        .values(
+            published_sha256=sha256,
+            published_size=size,
+            # Extraction of the redacted text can start
+            text_status="pending",
+            text_pages=0,
+            text_attempts=0,
+            text_error=None,
+            text_available_at=func.now(),
+            # And previews of it (see previews.py)
+            preview_attempts=0,
+            preview_error=None,
+            preview_available_at=func.now(),
+        )
+    ).rowcount
+    if published:
+        cache.invalidate(db, cache.document_tag(rendition.document_id))
+    db.commit()
+
+
+def mark_failed(db, rendition: models.RedactedDocument, error: str):
+    """Schedule a retry, or give up after the last attempt"""
+    values = {"error": error[:2000]}
+    if rendition.attempts >= REDACT_MAX_ATTEMPTS:
+        values["status"] = "failed"
+    else:
+        delay = min(REDACT_BACKOFF_SECONDS * 2 ** (rendition.attempts - 1), 6 * 3600)
+        values["available_at"] = func.now() + timedelta(seconds=delay)
+    db.execute(update(models.RedactedDocument).where(models.RedactedDocument.id == rendition.id).values(**values))
+    db.commit()
+
+
+def _claim(limit: int) -> List[models.RedactedDocument]:
+    db = SessionLocal()
+    try:
+        return claim(db, limit)
+    finally:
+        db.close()
+
+
+def _original_key(rendition: models.RedactedDocument) -> str:
+    db = SessionLocal()
+    try:
+        return db.get(models.Document, rendition.document_id).storage_key
+    finally:
+        db.close()
+
+
+def _record(outcomes: List[Outcome]):
+    db = SessionLocal()
+    try:
+        for rendition, result, error in outcomes:
+            if error is None:
+                sha256, size = result
+                mark_ready(db, rendition, sha256, size, storage.document_key(sha256))
+            else:
+                mark_failed(db, rendition, error)
+    finally:
+        db.close()
+
+
+async def _render(rendition: models.RedactedDocument) -> Outcome:
+    backend = storage.get_backend()
+    try:
+        original_key = await run_in_threadpool(_original_key, rendition)
+        source, temporary = await run_in_threadpool(backend.fetch, original_key)
+        fd, destination = tempfile.mkstemp(dir=backend.staging_dir, suffix=".pdf")
+        os.close(fd)
+        try:
+            result = await pdfpool.run(pdf.redact, source, destination, rendition.boxes)
+            await run_in_threadpool(backend.put, destination, storage.document_key(result[0]), "application/pdf")
+        finally:
+            if temporary:
+                os.remove(source)
+            if os.path.exists(destination):
+                os.remove(destination)
+    except Exception as e:
+        logger.exception("Redaction of document %s (set %s) failed on attempt %d",
+                         rendition.document_id, rendition.redaction_hash[:12], rendition.attempts)
+        return rendition, None, repr(e)
+    return rendition, result, None
+
+
+async def run_round(limit: int = REDACT_CLAIM_SIZE) -> int:
+    """Render up to `limit` pending renditions; returns the number claimed"""
+    renditions = await run_in_threadpool(_claim, limit)
+    if not renditions:
+        return 0
+    started = time.monotonic()
+    outcomes = await asyncio.gather(*(_render(rendition) for rendition in renditions))
+    await run_in_threadpool(_record, outcomes)
+    failed = sum(1 for _, _, error in outcomes if error is not None)
+    logger.info("Rendered %d redacted documents (%d failed) in %.2fs",
+                len(renditions), failed, time.monotonic() - started)
+    return len(renditions)
+
+
+async def run(stopping: asyncio.Event, once: bool = False):
+    """Rendering loop run by the worker until `stopping` is set (or, with once, nothing is due)"""
+    if not REDACT_ENABLED:
+        return
+    while not stopping.is_set():
+        try:
+            claimed = await run_round()
+        except Exception:
+            logger.exception("Redaction round failed")
+            claimed = 0
+        if not claimed:
+            if once:
+                break
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=REDACT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
@@ -1,5 +1,5 @@
 # This file makes the routers directory a Python package 
 
-from . import auth, posts, impacts
+from . import auth, posts, impacts, notifications, export, stream, changes, batch, webhooks, documents
 
-__all__ = ["auth", "posts", "impacts"] 
\ No newline at end of file
+__all__ = ["auth", "posts", "impacts", "notifications", "export", "stream", "changes", "batch", "webhooks", "documents"] 
\ No newline at end of file
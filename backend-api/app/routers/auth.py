@@ -1,9 +1,9 @@
-from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from .. import crud, schemas, auth
+from .. import crud, schemas, auth, ratelimit
 from ..database import get_db
 
 router = APIRouter(
@@ -12,15 +12,25 @@ router = APIRouter(
 )
 
 
+async def _check_login_limits(request: Request, username: str):
+    """Throttle by client IP, then by target account, before any password hashing"""
+    await ratelimit.check(
+        (ratelimit.LOGIN_IP, ratelimit.client_ip(request)),
+        (ratelimit.LOGIN_USER, username.lower()[:100]),
+    )
+
+
 @router.post("/login", response_model=schemas.Token)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
     """
-    Authenticate user and return JWT token
+    Authenticate user and return a JWT access token plus a refresh token
     """
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
+    await _check_login_limits(request, form_data.username)
+    user = await ratelimit.run_hashing(crud.authenticate_user, db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -28,35 +38,51 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await run_in_threadpool(auth.create_session_tokens, db, user)
 
 
 @router.post("/login/json", response_model=schemas.Token)
 async def login_json(
+    request: Request,
     login_data: schemas.LoginRequest,
     db: Session = Depends(get_db)
 ):
     """
     Alternative login endpoint that accepts JSON instead of form data
     """
-    user = crud.authenticate_user(db, login_data.username, login_data.password)
+    await _check_login_limits(request, login_data.username)
+    user = await ratelimit.run_hashing(crud.authenticate_user, db, login_data.username, login_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
         )
     
-    access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await run_in_threadpool(auth.create_session_tokens, db, user)
+
+
+@router.post("/refresh", response_model=schemas.Token)
+def refresh(refresh_data: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Exchange a refresh token for a new access token and a new refresh token.
+    No password hashing; each refresh token works once.
+    """
+    tokens = auth.refresh_session_tokens(db, refresh_data.refresh_token)
+    if tokens is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+        )
+    return tokens
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(refresh_data: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    """
+    End a login session: its refresh tokens stop working and its access tokens are rejected
+    """
+    auth.revoke_session(db, refresh_data.refresh_token)
+    return None
 
 
 @router.get("/me", response_model=schemas.UserResponse)
@@ -69,6 +95,7 @@ async def read_users_me(current_user = Depends(auth.get_current_user)):
 
 @router.post("/register", response_model=schemas.UserResponse)
 async def register(
+    request: Request,
     user: schemas.UserCreate,
     db: Session = Depends(get_db),
     # Uncomment the line below to require admin privileges for user creation
@@ -77,6 +104,8 @@ async def register(
     """
     Register a new user (currently open, but can be restricted to admins)
     """
+    await ratelimit.check((ratelimit.REGISTER_IP, ratelimit.client_ip(request)))
+    
     # Check if username already exists
     db_user = crud.get_user_by_username(db, username=user.username)
     if db_user:
@@ -86,4 +115,4 @@ async def register(
         )
     
     # Create user
-    return crud.create_user(db=db, user=user) 
\ No newline at end of file
+    return await ratelimit.run_hashing(crud.create_user, db, user) 
\ No newline at end of file
@@ -0,0 +1,135 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .. import crud, schemas, auth
+from ..database import get_db
+
+router = APIRouter(
+    prefix="/batch",
+    tags=["batch"]
+)
+
+
+class OperationError(Exception):
+    """A batch operation failed with the status its single endpoint would return"""
+
+    def __init__(self, status_code: int, detail: str):
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _post_failure(db: Session, post_id: int, action: str) -> OperationError:
+    if crud.get_post(db, post_id=post_id) is None:
+        return OperationError(404, "Post not found")
+    return OperationError(status.HTTP_403_FORBIDDEN, f"Not enough permissions to {action} this post")
+
+
+def _run_post_operation(db: Session, operation: schemas.BatchOperation, current_user):
+    if operation.op == "create":
+        post = schemas.PostCreate.model_validate(operation.data or {})
+        db_post = crud.create_post(db, post=post, author_id=current_user.id, commit=False)
+        return status.HTTP_201_CREATED, schemas.PostResponse.model_validate(db_post)
+    
+    if operation.op == "update":
+        post = schemas.PostUpdate.model_validate(operation.data or {})
+        db_post = crud.update_post(
+            db, post_id=operation.id, post_update=post,
+            author_id=auth.post_author_scope(current_user), commit=False
+        )
+        if db_post is None:
+            raise _post_failure(db, operation.id, "edit")
+        return status.HTTP_200_OK, schemas.PostResponse.model_validate(db_post)
+    
+    deleted = crud.delete_post(
+        db, post_id=operation.id, author_id=auth.post_author_scope(current_user), commit=False
+    )
+    if not deleted:
+        raise _post_failure(db, operation.id, "delete")
+    return status.HTTP_204_NO_CONTENT, None
+
+
+def _run_impact_operation(db: Session, operation: schemas.BatchOperation, current_user):
+    # Only admins can write impacts
+    if not current_user.is_admin:
+        raise OperationError(status.HTTP_403_FORBIDDEN, f"Only administrators can {operation.op} impacts")
+    
+    if operation.op == "create":
+        impact = schemas.ImpactCreate.model_validate(operation.data or {})
+        try:
+            db_impact = crud.create_impact(db, impact=impact, commit=False)
+        except ValueError as e:
+            raise OperationError(404, str(e))
+        return status.HTTP_201_CREATED, schemas.ImpactResponse.model_validate(db_impact)
+    
+    if operation.op == "update":
+        impact = schemas.ImpactUpdate.model_validate(operation.data or {})
+        db_impact = crud.update_impact(db, impact_id=operation.id, impact_update=impact, commit=False)
+        if db_impact is None:
+            raise OperationError(404, "Impact not found")
+        return status.HTTP_200_OK, schemas.ImpactResponse.model_validate(db_impact)
+    
+    if not crud.delete_impact(db, impact_id=operation.id, commit=False):
+        raise OperationError(404, "Impact not found")
+    return status.HTTP_204_NO_CONTENT, None
+
+
+def _run_operation(db: Session, operation: schemas.BatchOperation, current_user):
+    if operation.op != "create" and operation.id is None:
+        raise OperationError(422, f"id is required for {operation.op} operations")
+    try:
+        if operation.entity == "post":
+            return _run_post_operation(db, operation, current_user)
+        return _run_impact_operation(db, operation, current_user)
+    except ValidationError as e:
+        raise OperationError(422, e.errors(include_url=False)[0]["msg"])
+    except IntegrityError:
+        raise OperationError(409, f"Conflicting {operation.entity} write")
+
+
+@router.post("", response_model=schemas.BatchResponse)
+def run_batch(
+    batch: schemas.BatchRequest,
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_user)
+):
+    """
+    Apply an ordered list of post/impact create, update and delete operations,
+    authenticating once and committing once.
+    - **atomic=false** (default): each operation runs in its own savepoint, so a
+      failed operation is rolled back on its own and the rest still commit.
+    - **atomic=true**: the first failure rolls back the whole batch; later
+      operations are reported with status 424.
+    """
+    results = []
+    failed = False
+    
+    for index, operation in enumerate(batch.operations):
+        if failed and batch.atomic:
+            results.append(schemas.BatchOperationResult(
+                index=index, status=424, error="Skipped after an earlier operation failed"
+            ))
+            continue
+        
+        try:
+            if batch.atomic:
+                code, body = _run_operation(db, operation, current_user)
+            else:
+                with db.begin_nested():
+                    code, body = _run_operation(db, operation, current_user)
+        except OperationError as e:
+            failed = True
+            results.append(schemas.BatchOperationResult(index=index, status=e.status_code, error=e.detail))
+            continue
+        
+        results.append(schemas.BatchOperationResult(
+            index=index, status=code, data=body.model_dump(mode="json") if body is not None else None
+        ))
+    
+    if failed and batch.atomic:
+        db.rollback()
+        return {"committed": False, "results": results}
+    
+    db.commit()
+    return {"committed": True, "results": results}
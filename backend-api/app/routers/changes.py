@@ -0,0 +1,58 @@
+import base64
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from .. import crud, schemas
+from ..config import MAX_PAGE_SIZE
+from ..database import get_db
+
+router = APIRouter(
+    prefix="/changes",
+    tags=["changes"]
+)
+
+
+def encode_token(cursor: Optional[tuple]) -> Optional[str]:
+    """Opaque, URL-safe form of a (change_xid, source rank, id) cursor"""
+    if cursor is None:
+        return None
+    change_xid, rank, row_id = cursor
+    raw = f"{change_xid}|{rank}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_token(token: str) -> Optional[tuple]:
+    try:
+        change_xid, rank, row_id = base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8").split("|")
+        if not change_xid.isdigit():
+            # A token from before the feed paged on transaction ids: sync again from the start
+            datetime.fromisoformat(change_xid)
+            return None
+        return int(change_xid), int(rank), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid change token")
+
+
+@router.get("", response_model=schemas.ChangeFeed)
+def read_changes(
+    since: Optional[str] = Query(None, description="next_token from the previous response; omit for a full sync"),
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """
+    Incremental feed of published posts and their impacts that were created,
+    updated or deleted after `since`. Keep calling with `next_token` while
+    `has_more` is true, then store the last token for the next sync.
+    Posts that are unpublished show up as deletions. When a post appears that
+    the client has not seen before, fetch its impacts with `/api/impacts/?post_ids=`.
+    """
+    cursor = decode_token(since) if since else None
+    changes, next_cursor, has_more = crud.get_changes(db, since=cursor, limit=limit)
+    return {
+        "changes": changes,
+        "next_token": encode_token(next_cursor),
+        "has_more": has_more
+    }
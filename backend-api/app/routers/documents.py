@@ -0,0 +1,272 @@
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, Response
+from sqlalchemy.orm import Session
+
+from .. import cache, crud, documents, previews, ranges, schemas, storage, auth
+from ..database import get_db
+
+router = APIRouter(tags=["documents"])
+
+
+def _check_post_access(db: Session, post_id: int, current_user):
+    """404 for a missing post, 403 for someone else's"""
+    post = crud.get_post(db, post_id=post_id)
+    if post is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    author_id = auth.post_author_scope(current_user)
+    if author_id is not None and post.author_id != author_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions to edit this post"
+        )
+
+
+@router.post(
+    "/posts/{post_id}/documents",
+    response_model=schemas.PostDocumentResponse,
+    status_code=status.HTTP_201_CREATED
+)
+async def upload_document(
+    post_id: int,
+    request: Request,
+    filename: str = Query(..., min_length=1, max_length=255, description="Original file name"),
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_user)
+):
+    """
+    Upload a PDF and attach it to a post (requires authentication).
+    Send the file itself as the request body with Content-Type application/pdf;
+    it is streamed to storage. Uploading a file again attaches your existing copy.
+    """
+    documents.check_length(request.headers.get("content-length"))
+    await run_in_threadpool(_check_post_access, db, post_id, current_user)
+    staged = await documents.stage_upload(request.stream())
+    return await run_in_threadpool(documents.store, db, staged, post_id, filename, current_user.id)
+
+
+@router.get("/posts/{post_id}/documents", response_model=List[schemas.PostDocumentResponse])
+def read_post_documents(post_id: int, db: Session = Depends(get_db)):
+    """
+    List the documents attached to a post
+    """
+    return crud.get_post_documents(db, post_id)
+
+
+@router.delete("/posts/{post_id}/documents/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
+def detach_document(
+    post_id: int,
+    document_id: int,
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_user)
+):
+    """
+    Remove a document from a post (requires authentication)
+    """
+    _check_post_access(db, post_id, current_user)
+    if not crud.detach_document(db, post_id, document_id):
+        raise HTTPException(status_code=404, detail="Document not attached to this post")
+
+
+def _check_document_access(db: Session, document_id: int, current_user, editing: bool = False):
+    """
+    404 for a missing document, 403 unless it is attached to one of the user's posts.
+    One document can be attached to several posts (its uploader's, or any post an
+    admin uploaded it to): changing it (`editing`) also needs the right to edit
+    every one of them.
+    """
+    db_document = crud.get_document(db, document_id)
+    if db_document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    author_id = auth.post_author_scope(current_user)
+    if author_id is not None and not crud.document_attached_to_author(db, document_id, author_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions to edit this document"
+        )
+    if editing and author_id is not None and crud.document_attached_to_others(db, document_id, author_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="This document is also attached to posts you cannot edit"
+        )
+    return db_document
+
+
+def _redaction_set(db: Session, db_document, rendition=None) -> schemas.RedactionSetResponse:
+    if db_document.redaction_hash is not None and rendition is None:
+        rendition = crud.get_rendition(db, db_document.id, db_document.redaction_hash)
+    return schemas.RedactionSetResponse(
+        document=schemas.DocumentResponse.model_validate(db_document),
+        redactions=crud.get_redactions(db, db_document.id),
+        rendition_status=rendition.status if rendition is not None else "none",
+    )
+
+
+@router.get("/documents/{document_id}/redactions", response_model=schemas.RedactionSetResponse)
+def read_redactions(
+    document_id: int,
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_user)
+):
+    """
+    A document's redaction boxes and the state of its redacted file (requires authentication)
+    """
+    return _redaction_set(db, _check_document_access(db, document_id, current_user))
+
+
+@router.put("/documents/{document_id}/redactions", response_model=schemas.RedactionSetResponse)
+def replace_redactions(
+    document_id: int,
+    redaction_set: schemas.RedactionSet,
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_user)
+):
+    """
+    Replace a document's redaction boxes (requires authentication). The redacted
+    file is rendered by the worker; until it is ready the document is not served.
+    An empty list removes every redaction. The redactions apply wherever the
+    document is attached, so authors may only change them on documents no
+    other author's post uses.
+    """
+    _check_document_access(db, document_id, current_user, editing=True)
+    db_document, rendition = crud.replace_redactions(db, document_id, redaction_set.redactions, current_user.id)
+    return _redaction_set(db, db_document, rendition)
+
+
+def _published_or_404(db_document) -> dict:
+    """Cacheable form of what readers get of a document; misses are not cached"""
+    if db_document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"sha256": db_document.published_sha256, "content_type": db_document.content_type}
+
+
+async def _stored_file(request: Request, key: str, etag: str, content_type: str, cache_control: str) -> Response:
+    backend = storage.get_backend()
+    url = backend.download_url(key)
+    if url is not None:
+        # Short-lived presigned URL; only the redirect may be cached, and only briefly
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": "private, max-age=60"})
+    path = backend.path(key)
+    if not await run_in_threadpool(os.path.exists, path):
+        raise HTTPException(status_code=404, detail="Document content is missing")
+    return await run_in_threadpool(
+        ranges.file_response,
+        request.headers,
+        request.method,
+        path,
+        etag,
+        content_type,
+        key,
+        cache_control,
+    )
+
+
+@router.api_route("/documents/{document_id}/content", methods=["GET", "HEAD"], response_class=Response)
+async def download_document(
+    document_id: int,
+    request: Request,
+    v: Optional[str] = Query(None, description="Content hash (the document's sha256), for a cacheable URL"),
+    db: Session = Depends(get_db)
+):
+    """
+    Download a document as readers get it: redacted, if it has redactions.
+    Supports Range/If-Range for partial reads (PDF viewers fetch page by page),
+    and If-None-Match against the content-hash ETag.
+    """
+    # Cached for every range request that follows, until the redactions change
+    document = await cache.get_or_load_async(
+        f"document-content:{document_id}",
+        lambda: _published_or_404(crud.get_document(db, document_id)),
+        tags=[cache.document_tag(document_id)]
+    )
+    if document["sha256"] is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The redacted document is being prepared",
+            headers={"Retry-After": "30"},
+        )
+    # What this URL serves changes with the redactions, so it may only be cached
+    # for good under a URL naming the content
+    cache_control = ranges.IMMUTABLE if v == document["sha256"] else "public, no-cache"
+    return await _stored_file(
+        request, storage.document_key(document["sha256"]), f'"{document["sha256"]}"',
+        document["content_type"], cache_control
+    )
+
+
+@router.api_route("/documents/{document_id}/original", methods=["GET", "HEAD"], response_class=Response)
+async def download_original(
+    document_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_user)
+):
+    """
+    Download a document as uploaded, without its redactions (requires authentication)
+    """
+    db_document = await run_in_threadpool(_check_document_access, db, document_id, current_user)
+    return await _stored_file(
+        request, db_document.storage_key, f'"{db_document.sha256}"', db_document.content_type, "private, no-cache"
+    )
+
+
+def _preview_source_or_404(db_document) -> dict:
+    """Cacheable form of the document publishing a file; misses are not cached"""
+    if db_document is None:
+        raise HTTPException(status_code=404, detail="Preview not found")
+    return {"id": db_document.id, "page_count": db_document.page_count or 0}
+
+
+async def _preview(request: Request, sha256: str, page: int, card: bool, db: Session) -> Response:
+    # Only files some document publishes: never the original of a since-redacted document
+    source = await cache.get_or_load_async(
+        f"preview-source:{sha256}",
+        lambda: _preview_source_or_404(crud.get_published_document(db, sha256)),
+        tags=lambda value: [cache.document_tag(value["id"])]
+    )
+    if not 1 <= page <= source["page_count"]:
+        raise HTTPException(status_code=404, detail="Preview not found")
+    for _ in range(2):
+        path = await previews.ensure(sha256, page, card)
+        try:
+            return await run_in_threadpool(
+                ranges.file_response,
+                request.headers,
+                request.method,
+                path,
+                f'"{sha256}-{"card" if card else page}"',
+                "image/jpeg",
+            )
+        except FileNotFoundError:
+            # Evicted between the lookup and now; render it again
+            continue
+    raise HTTPException(status_code=503, detail="Preview unavailable", headers={"Retry-After": "5"})
+
+
+@router.api_route("/previews/{sha256}/card.jpg", methods=["GET", "HEAD"], response_class=Response)
+async def read_card_preview(
+    request: Request,
+    sha256: str = Path(..., pattern="^[0-9a-f]{64}$"),
+    db: Session = Depends(get_db)
+):
+    """
+    First-page preview of a document, by the hash of its published file
+    (the `preview_url` of post listings). Immutable.
+    """
+    return await _preview(request, sha256, 1, True, db)
+
+
+@router.api_route("/previews/{sha256}/pages/{page}.jpg", methods=["GET", "HEAD"], response_class=Response)
+async def read_page_preview(
+    request: Request,
+    page: int,
+    sha256: str = Path(..., pattern="^[0-9a-f]{64}$"),
+    db: Session = Depends(get_db)
+):
+    """
+    Thumbnail of one page (from 1) of a document, by the hash of its published file. Immutable.
+    """
+    return await _preview(request, sha256, page, False, db)
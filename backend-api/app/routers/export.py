@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+from ..export import MEDIA_TYPES, export_filename, stream_export
+
+router = APIRouter(
+    prefix="/export",
+    tags=["export"]
+)
+
+
+def _export_response(kind: str, format: str, gzip: bool) -> StreamingResponse:
+    media_type = "application/gzip" if gzip else MEDIA_TYPES[format]
+    filename = export_filename(kind, format, gzip)
+    return StreamingResponse(
+        stream_export(kind, format=format, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/posts")
+def export_posts(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$", description="Output format"),
+    gzip: bool = Query(False, description="Gzip the export on the fly")
+):
+    """
+    Stream all published posts, including content and impacts.
+    - **ndjson**: one post per line with its impacts nested.
+    - **csv**: one row per post with an impact_count column.
+    """
+    return _export_response("posts", format, gzip)
+
+
+@router.get("/impacts")
+def export_impacts(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$", description="Output format"),
+    gzip: bool = Query(False, description="Gzip the export on the fly")
+):
+    """
+    Stream all impacts of published posts
+    """
+    return _export_response("impacts", format, gzip)
@@ -1,9 +1,11 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session
 
 from .. import crud, schemas, auth
+from ..config import MAX_PAGE_SIZE
 from ..database import get_db
+from ..ndjson import import_ndjson
 
 router = APIRouter(
     prefix="/impacts",
@@ -16,14 +18,24 @@ def read_impacts(
     skip: int = 0,
     limit: int = 100,
     post_id: Optional[int] = Query(None, description="Filter by post ID"),
+    post_ids: Optional[str] = Query(None, regex=r"^\d+(,\d+)*$", description="Comma-separated post IDs; results are grouped by post"),
     type: Optional[str] = Query(None, regex="^(legal_action|policy_change|investigation|resignation|reform)$"),
     status: Optional[str] = Query(None, regex="^(pending|in_progress|completed)$"),
     db: Session = Depends(get_db)
 ):
     """
-    Retrieve impacts with optional filtering
+    Retrieve impacts with optional filtering.
+    Pass `post_ids` to fetch the impacts of several posts in one request.
     """
-    impacts = crud.get_impacts(db, skip=skip, limit=limit, post_id=post_id, type=type, status=status)
+    impacts = crud.get_impacts(
+        db,
+        skip=skip,
+        limit=min(limit, MAX_PAGE_SIZE),
+        post_id=post_id,
+        type=type,
+        status=status,
+        post_ids=[int(value) for value in post_ids.split(",")] if post_ids else None
+    )
     return impacts
 
 
@@ -49,6 +61,29 @@ def create_impact(
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@router.post("/import", response_model=schemas.ImportSummary)
+async def import_impacts(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_user)
+):
+    """
+    Bulk import impacts from an NDJSON body (one ImpactCreate object per line, admin only)
+    """
+    # Only admins can create impacts
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can import impacts"
+        )
+    
+    return await import_ndjson(
+        request.stream(),
+        schemas.ImpactCreate,
+        lambda batch: crud.import_impacts(db, batch)
+    )
+
+
 @router.get("/{impact_id}", response_model=schemas.ImpactResponse)
 def read_impact(impact_id: int, db: Session = Depends(get_db)):
     """
@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from .. import admission, crud, schemas, auth, push
+from ..database import get_db
+
+router = APIRouter(
+    tags=["notifications"]
+)
+
+
+@router.get("/vapid-public-key")
+def get_vapid_public_key():
+    """
+    Application server key the browser needs to subscribe
+    """
+    if not push.VAPID_PUBLIC_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Push notifications are not configured"
+        )
+    return {"public_key": push.VAPID_PUBLIC_KEY}
+
+
+@router.post("/subscribe", response_model=schemas.PushSubscriptionResponse, status_code=status.HTTP_201_CREATED)
+def subscribe(
+    subscription: schemas.PushSubscriptionCreate,
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_optional_user)
+):
+    """
+    Register a browser push subscription, or refresh it if the endpoint is known.
+    Signed-in users are linked to the subscription.
+    """
+    return crud.upsert_push_subscription(
+        db,
+        subscription,
+        user_id=current_user.id if current_user else None
+    )
+
+
+@router.post("/unsubscribe")
+def unsubscribe(
+    unsubscribe: schemas.PushUnsubscribe,
+    db: Session = Depends(get_db)
+):
+    """
+    Stop sending notifications to a push endpoint
+    """
+    if not crud.deactivate_push_subscription(db, unsubscribe.endpoint):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Subscription not found"
+        )
+    return {"message": "Unsubscribed successfully"}
+
+
+@router.put("/preferences", response_model=schemas.PushSubscriptionResponse)
+def update_preferences(
+    preferences: schemas.PushPreferencesUpdate,
+    db: Session = Depends(get_db)
+):
+    """
+    Update which notifications a subscription receives.
+    The endpoint URL identifies the subscription.
+    """
+    db_subscription = crud.update_push_preferences(db, preferences.endpoint, preferences)
+    if db_subscription is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Subscription not found"
+        )
+    return db_subscription
+
+
+@router.post("/send", response_model=schemas.PushSendResult)
+async def send_notification(
+    notification: schemas.PushNotificationSend,
+    current_user = Depends(auth.get_current_admin_user)
+):
+    """
+    Send a notification to all matching active subscriptions (admin only).
+    Subscriptions the push service reports as gone are pruned. The fan-out
+    runs without the request's deadline: its length grows with the audience.
+    """
+    try:
+        with admission.without_deadline():
+            return await push.send_notification(notification)
+    except push.PushNotConfigured:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Push notifications are not configured"
+        )
@@ -1,10 +1,14 @@
+import json
 from typing import List, Optional
 from datetime import date
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from .. import crud, schemas, auth
-from ..database import get_db
+from .. import cache, crud, schemas, auth
+from ..config import MAX_PAGE_SIZE, STREAM_PAGE_THRESHOLD, STREAM_BATCH_SIZE
+from ..database import get_db, SessionLocal
+from ..ndjson import import_ndjson
 
 router = APIRouter(
     prefix="/posts",
@@ -12,8 +16,33 @@ router = APIRouter(
 )
 
 
+def _stream_posts_with_counts(skip: int, limit: int, filters: dict, ndjson: bool):
+    """
+    Encode a listing page row by row as a JSON array (or NDJSON).
+    Opens its own session because request dependencies are closed before streaming starts.
+    """
+    db = SessionLocal()
+    try:
+        rows = crud.iter_posts_with_counts(
+            db, skip=skip, limit=limit, batch_size=STREAM_BATCH_SIZE, **filters
+        )
+        if not ndjson:
+            yield b"["
+        for index, row in enumerate(rows):
+            encoded = schemas.PostWithCounts.model_validate(row).model_dump_json().encode("utf-8")
+            if ndjson:
+                yield encoded + b"\n"
+            else:
+                yield encoded if index == 0 else b"," + encoded
+        if not ndjson:
+            yield b"]"
+    finally:
+        db.close()
+
+
 @router.get("/", response_model=List[schemas.PostWithCounts])
 def read_posts(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     status: Optional[str] = Query(None, regex="^(draft|published|archived)$"),
@@ -37,11 +66,12 @@ def read_posts(
     - **date_from / date_to**: Filter by a date range (YYYY-MM-DD).
     - **sort_by**: Sort by 'newest', 'oldest', or 'impact' (most impactful).
     - **impact_level**: Filter by impact level - 'high' (5+ impacts), 'medium' (2-4), 'low' (0-1).
+    
+    `limit` is capped at MAX_PAGE_SIZE. Pages larger than STREAM_PAGE_THRESHOLD, or any
+    request sending `Accept: application/x-ndjson`, are streamed row by row.
     """
-    posts = crud.get_posts_with_counts(
-        db, 
-        skip=skip, 
-        limit=limit, 
+    limit = min(limit, MAX_PAGE_SIZE)
+    filters = dict(
         status=status,
         verification_status=verification_status,
         search=search,
@@ -52,7 +82,23 @@ def read_posts(
         sort_by=sort_by,
         impact_level=impact_level
     )
-    return posts
+    
+    ndjson = "application/x-ndjson" in request.headers.get("accept", "")
+    if ndjson or limit > STREAM_PAGE_THRESHOLD:
+        return StreamingResponse(
+            _stream_posts_with_counts(skip, limit, filters, ndjson),
+            media_type="application/x-ndjson" if ndjson else "application/json"
+        )
+    
+    key = "posts:list:" + json.dumps({"skip": skip, "limit": limit, **filters}, sort_keys=True, default=str)
+    return cache.get_or_load(
+        key,
+        lambda: [
+            schemas.PostWithCounts.model_validate(row).model_dump(mode="json")
+            for row in crud.get_posts_with_counts(db, skip=skip, limit=limit, **filters)
+        ],
+        tags=[cache.POSTS]
+    )
 
 
 @router.get("/published", response_model=List[schemas.PostSummary], deprecated=True)
@@ -64,7 +110,7 @@ def read_published_posts(
     """
     Retrieve only published posts for public consumption
     """
-    posts = crud.get_published_posts(db, skip=skip, limit=limit)
+    posts = crud.get_published_posts(db, skip=skip, limit=min(limit, MAX_PAGE_SIZE))
     return posts
 
 
@@ -79,7 +125,7 @@ def search_posts(
     """
     Search posts by title or content
     """
-    posts = crud.search_posts(db, query=q, status=status, skip=skip, limit=limit)
+    posts = crud.search_posts(db, query=q, status=status, skip=skip, limit=min(limit, MAX_PAGE_SIZE))
     return posts
 
 
@@ -95,26 +141,101 @@ def create_post(
     return crud.create_post(db=db, post=post, author_id=current_user.id)
 
 
+@router.post("/import", response_model=schemas.ImportSummary)
+async def import_posts(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_admin_user)
+):
+    """
+    Bulk import posts from an NDJSON body (one PostImport object per line, admin only).
+    Records are parsed as they stream in and written in batched transactions.
+    """
+    return await import_ndjson(
+        request.stream(),
+        schemas.PostImport,
+        lambda batch: crud.import_posts(db, batch, author_id=current_user.id)
+    )
+
+
+@router.post("/bulk", response_model=schemas.PostBulkResult)
+def bulk_post_action(
+    bulk: schemas.PostBulkAction,
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_admin_user)
+):
+    """
+    Apply an action to many posts at once (admin only).
+    - **action**: publish, archive, draft, verify (with verification_status) or delete.
+    - **ids** and/or **filter**: which posts to act on; both are combined with AND.
+    """
+    try:
+        matched = crud.bulk_post_action(db, bulk)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"action": bulk.action, "matched": matched}
+
+
+@router.post("/batch", response_model=List[schemas.PostResponse])
+def read_posts_batch(batch: schemas.PostBatchRequest, db: Session = Depends(get_db)):
+    """
+    Retrieve several posts by id and/or slug in one round trip.
+    Posts come back in request order (ids first, then slugs); unknown ones are omitted.
+    """
+    found = crud.get_posts_by_ids_or_slugs(db, ids=batch.ids, slugs=batch.slugs)
+    by_id = {post.id: post for post in found}
+    by_slug = {post.slug: post for post in found}
+    
+    posts = []
+    seen = set()
+    for post in [by_id.get(post_id) for post_id in batch.ids] + [by_slug.get(slug) for slug in batch.slugs]:
+        if post is not None and post.id not in seen:
+            seen.add(post.id)
+            posts.append(post)
+    return posts
+
+
+def _post_or_404(db_post) -> dict:
+    """Cacheable form of a single post; misses are not cached"""
+    if db_post is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return schemas.PostResponse.model_validate(db_post).model_dump(mode="json")
+
+
 @router.get("/{post_id}", response_model=schemas.PostResponse)
 def read_post(post_id: int, db: Session = Depends(get_db)):
     """
     Retrieve a specific post by ID
     """
-    db_post = crud.get_post(db, post_id=post_id)
-    if db_post is None:
-        raise HTTPException(status_code=404, detail="Post not found")
-    return db_post
+    return cache.get_or_load(
+        f"post:id:{post_id}",
+        lambda: _post_or_404(crud.get_post(db, post_id=post_id)),
+        tags=[cache.post_tag(post_id), cache.POST_DETAILS]
+    )
 
 
 @router.get("/slug/{slug}", response_model=schemas.PostResponse)
-def read_post_by_slug(slug: str, db: Session = Depends(get_db)):
+async def read_post_by_slug(slug: str, db: Session = Depends(get_db)):
     """
-    Retrieve a specific post by slug (for public URLs)
+    Retrieve a specific post by slug (for public URLs).
+    Async so that requests waiting on an identical in-flight lookup hold no thread.
     """
-    db_post = crud.get_post_by_slug(db, slug=slug)
-    if db_post is None:
+    return await cache.get_or_load_async(
+        f"post:slug:{slug}",
+        lambda: _post_or_404(crud.get_post_by_slug(db, slug=slug)),
+        tags=lambda post: [cache.post_tag(post["id"]), cache.POST_DETAILS]
+    )
+
+
+def _raise_write_failure(db: Session, post_id: int, action: str):
+    """Tell a missing post apart from one owned by someone else (failure path only)"""
+    if crud.get_post(db, post_id=post_id) is None:
         raise HTTPException(status_code=404, detail="Post not found")
-    return db_post
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=f"Not enough permissions to {action} this post"
+    )
 
 
 @router.put("/{post_id}", response_model=schemas.PostResponse)
@@ -127,22 +248,12 @@ def update_post(
     """
     Update a post (requires authentication)
     """
-    # Check if post exists
-    db_post = crud.get_post(db, post_id=post_id)
-    if db_post is None:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    # Check if user owns the post or is admin
-    admin_username = "admin"  # This should match your ADMIN_USERNAME
-    if db_post.author_id != current_user.id and current_user.username != admin_username:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions to edit this post"
-        )
-    
-    updated_post = crud.update_post(db=db, post_id=post_id, post_update=post)
+    # Ownership is enforced in the UPDATE's WHERE clause
+    updated_post = crud.update_post(
+        db=db, post_id=post_id, post_update=post, author_id=auth.post_author_scope(current_user)
+    )
     if updated_post is None:
-        raise HTTPException(status_code=404, detail="Post not found")
+        _raise_write_failure(db, post_id, "edit")
     
     return updated_post
 
@@ -156,21 +267,9 @@ def delete_post(
     """
     Delete a post (requires authentication)
     """
-    # Check if post exists
-    db_post = crud.get_post(db, post_id=post_id)
-    if db_post is None:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    # Check if user owns the post or is admin
-    admin_username = "admin"  # This should match your ADMIN_USERNAME
-    if db_post.author_id != current_user.id and current_user.username != admin_username:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions to delete this post"
-        )
-    
-    success = crud.delete_post(db=db, post_id=post_id)
+    # Ownership is enforced in the DELETE's WHERE clause
+    success = crud.delete_post(db=db, post_id=post_id, author_id=auth.post_author_scope(current_user))
     if not success:
-        raise HTTPException(status_code=404, detail="Post not found")
+        _raise_write_failure(db, post_id, "delete")
     
-    return None 
\ No newline at end of file
+    return None
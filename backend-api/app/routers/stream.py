@@ -0,0 +1,55 @@
+import asyncio
+
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+
+from ..events import broadcaster
+
+router = APIRouter(
+    prefix="/stream",
+    tags=["stream"]
+)
+
+# Seconds between keep-alive comments on an idle connection
+HEARTBEAT_INTERVAL = 25
+
+
+async def _event_stream(request: Request):
+    subscription = broadcaster.subscribe()
+    try:
+        # Ask EventSource to wait a bit before reconnecting after an eviction
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                frame = await asyncio.wait_for(subscription.queue.get(), timeout=HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            if frame is None:
+                # Evicted as a slow consumer; the client will reconnect
+                break
+            yield frame
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+@router.get("")
+async def stream_events(request: Request):
+    """
+    Server-Sent Events stream of live updates.
+    Events: post.published, post.updated, post.deleted, posts.changed,
+    impact.created, impact.updated, impact.deleted, impacts.changed.
+    """
+    return StreamingResponse(
+        _event_stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/stats")
+def stream_stats():
+    """Connected SSE clients and slow-consumer evictions on this worker"""
+    return {"subscribers": broadcaster.subscriber_count, "evictions": broadcaster.evictions}
@@ -0,0 +1,89 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from .. import crud, schemas, auth, webhooks
+from ..database import get_db
+
+router = APIRouter(
+    prefix="/webhooks",
+    tags=["webhooks"]
+)
+
+
+@router.get("/", response_model=List[schemas.WebhookResponse])
+def list_webhooks(
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_admin_user)
+):
+    """
+    List partner webhooks with their delivery health (admin only)
+    """
+    return crud.get_webhooks(db)
+
+
+@router.post("/", response_model=schemas.WebhookCreated, status_code=status.HTTP_201_CREATED)
+def create_webhook(
+    webhook: schemas.WebhookCreate,
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_admin_user)
+):
+    """
+    Register a partner webhook (admin only). The signing secret is only
+    returned here; partners verify X-LexLeaks-Signature with it.
+    """
+    return crud.create_webhook(db, webhook)
+
+
+@router.put("/{webhook_id}", response_model=schemas.WebhookResponse)
+def update_webhook(
+    webhook_id: int,
+    webhook_update: schemas.WebhookUpdate,
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_admin_user)
+):
+    """
+    Update a webhook's URL, filters or limits, or re-enable a disabled one (admin only)
+    """
+    db_webhook = crud.update_webhook(db, webhook_id, webhook_update)
+    if db_webhook is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Webhook not found"
+        )
+    return db_webhook
+
+
+@router.delete("/{webhook_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_webhook(
+    webhook_id: int,
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_admin_user)
+):
+    """
+    Delete a webhook and its queued deliveries (admin only)
+    """
+    if not crud.delete_webhook(db, webhook_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Webhook not found"
+        )
+
+
+@router.post("/{webhook_id}/test", status_code=status.HTTP_202_ACCEPTED)
+def test_webhook(
+    webhook_id: int,
+    db: Session = Depends(get_db),
+    current_user = Depends(auth.get_current_admin_user)
+):
+    """
+    Queue a "webhook.test" delivery; the worker sends it on its next round (admin only)
+    """
+    if crud.get_webhook(db, webhook_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Webhook not found"
+        )
+    delivery = webhooks.queue_test_event(db, webhook_id)
+    return {"delivery_id": delivery.id}
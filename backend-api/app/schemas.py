@@ -62,6 +62,40 @@ class PostUpdate(BaseModel):
         return v.strip() if v else v
 
 
+class PostImport(PostCreate):
+    """One NDJSON record of a bulk post import"""
+    published_at: Optional[datetime] = None
+
+
+class PostBatchRequest(BaseModel):
+    """Posts to fetch in one request, by id and/or slug"""
+    ids: List[int] = Field(default_factory=list, max_length=200)
+    slugs: List[str] = Field(default_factory=list, max_length=200)
+
+
+class PostBulkFilter(BaseModel):
+    """Set-based selection of posts for bulk actions; all given fields must match"""
+    status: Optional[str] = Field(None, pattern="^(draft|published|archived)$")
+    verification_status: Optional[str] = Field(None, pattern="^(unverified|verified|disputed)$")
+    category: Optional[str] = Field(None, max_length=50)
+    author_id: Optional[int] = None
+    created_before: Optional[datetime] = None
+    updated_before: Optional[datetime] = None
+
+
+class PostBulkAction(BaseModel):
+    """Apply one action to a set of post ids or to every post matching a filter"""
+    action: str = Field(..., pattern="^(publish|archive|draft|verify|delete)$")
+    verification_status: Optional[str] = Field(None, pattern="^(unverified|verified|disputed)$")
+    ids: Optional[List[int]] = Field(None, max_length=10000)
+    filter: Optional[PostBulkFilter] = None
+
+
+class PostBulkResult(BaseModel):
+    action: str
+    matched: int
+
+
 class PostResponse(PostBase):
     id: int
     slug: str
@@ -96,6 +130,7 @@ class PostSummary(BaseModel):
 class PostWithCounts(PostSummary):
     """Post summary with additional counts"""
     impact_count: int = 0
+    preview_url: Optional[str] = None  # card image of the first attached document, see previews.py
     
     class Config:
         from_attributes = True
@@ -105,6 +140,12 @@ class PostWithCounts(PostSummary):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # access token lifetime in seconds
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str = Field(..., min_length=1, max_length=200)
 
 
 class TokenData(BaseModel):
@@ -156,6 +197,22 @@ class ImpactResponse(ImpactBase):
         from_attributes = True 
 
 
+# Bulk import Schemas
+class ImportResult(BaseModel):
+    """Outcome of a single NDJSON record"""
+    line: int
+    status: str  # created, error
+    id: Optional[int] = None
+    slug: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ImportSummary(BaseModel):
+    created: int
+    failed: int
+    results: List[ImportResult]
+
+
 # Push Notification Schemas
 from typing import Dict, Any
 
@@ -183,6 +240,14 @@ class PushSubscriptionUpdate(BaseModel):
     notify_weekly_digest: Optional[bool] = None
 
 
+class PushPreferencesUpdate(PushSubscriptionUpdate):
+    endpoint: str  # the endpoint URL identifies (and authorizes) the subscription
+
+
+class PushUnsubscribe(BaseModel):
+    endpoint: str
+
+
 class PushSubscriptionResponse(BaseModel):
     id: int
     endpoint: str
@@ -205,4 +270,179 @@ class PushNotificationSend(BaseModel):
     tag: Optional[str] = None
     data: Optional[Dict[str, Any]] = None
     user_ids: Optional[List[int]] = None  # If None, send to all
-    subscription_ids: Optional[List[int]] = None  # Specific subscriptions 
\ No newline at end of file
+    subscription_ids: Optional[List[int]] = None  # Specific subscriptions 
+    preference: Optional[str] = Field(None, pattern="^(new_posts|updates|weekly_digest)$")  # Only opted-in subscriptions
+    ttl: int = Field(86400, ge=0, le=2419200)  # Seconds the push service keeps an undelivered message
+    urgency: str = Field("normal", pattern="^(very-low|low|normal|high)$")
+
+
+class PushSendResult(BaseModel):
+    matched: int
+    sent: int
+    failed: int
+    pruned: int
+    retried: int
+    elapsed_seconds: float
+    per_second: float
+
+
+# Webhook Schemas
+WEBHOOK_EVENT_TYPES = ("post.published", "impact.created")
+
+
+class WebhookFilters(BaseModel):
+    event_types: List[str] = Field(..., min_length=1)
+    categories: Optional[List[str]] = None  # post categories; None matches all
+    impact_types: Optional[List[str]] = None  # impact types; None matches all
+    
+    @field_validator('event_types')
+    @classmethod
+    def validate_event_types(cls, v):
+        if v is not None:
+            unknown = set(v) - set(WEBHOOK_EVENT_TYPES)
+            if unknown:
+                raise ValueError(f"Unknown event types: {', '.join(sorted(unknown))}")
+        return v
+
+
+class WebhookCreate(WebhookFilters):
+    url: str = Field(..., pattern=r"^https?://", max_length=500)
+    description: Optional[str] = Field(None, max_length=200)
+    secret: Optional[str] = Field(None, min_length=16, max_length=100)  # generated if omitted
+    batch_size: int = Field(1, ge=1, le=100)  # events per request; 1 disables batching
+    max_concurrency: int = Field(2, ge=1, le=16)
+
+
+class WebhookUpdate(WebhookFilters):
+    url: Optional[str] = Field(None, pattern=r"^https?://", max_length=500)
+    description: Optional[str] = Field(None, max_length=200)
+    event_types: Optional[List[str]] = Field(None, min_length=1)
+    batch_size: Optional[int] = Field(None, ge=1, le=100)
+    max_concurrency: Optional[int] = Field(None, ge=1, le=16)
+    is_active: Optional[bool] = None  # re-enabling resets the failure count
+
+
+class WebhookResponse(WebhookFilters):
+    id: int
+    url: str
+    description: Optional[str]
+    batch_size: int
+    max_concurrency: int
+    is_active: bool
+    consecutive_failures: int
+    last_error: Optional[str]
+    last_success_at: Optional[datetime]
+    disabled_at: Optional[datetime]
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class WebhookCreated(WebhookResponse):
+    secret: str  # only returned on creation
+
+
+# Document Schemas
+class DocumentResponse(BaseModel):
+    id: int
+    # Of the file readers get: the redacted rendition of a redacted document, never the original.
+    # None while a rendition is being made
+    sha256: Optional[str] = Field(None, validation_alias="published_sha256")
+    size: Optional[int] = Field(None, validation_alias="published_size")
+    redacted: bool = Field(False, validation_alias="redaction_hash")
+    page_count: Optional[int]
+    content_type: str
+    created_at: datetime
+    
+    @field_validator('redacted', mode='before')
+    @classmethod
+    def has_redactions(cls, v):
+        # A redaction set hash, or (re-validating a dump) already a bool
+        return bool(v)
+    
+    class Config:
+        from_attributes = True
+        populate_by_name = True
+
+
+class PostDocumentResponse(BaseModel):
+    post_id: int
+    filename: str
+    created_at: datetime
+    document: DocumentResponse
+    
+    class Config:
+        from_attributes = True
+
+
+class RedactionCreate(BaseModel):
+    """A box in PDF points from the top left of the page as displayed, as DocumentViewer draws it"""
+    page: int = Field(..., ge=1)
+    x: float = Field(..., ge=0)
+    y: float = Field(..., ge=0)
+    width: float = Field(..., gt=0)
+    height: float = Field(..., gt=0)
+    reason: Optional[str] = Field(None, max_length=200)
+
+
+class RedactionResponse(RedactionCreate):
+    id: int
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class RedactionSet(BaseModel):
+    redactions: List[RedactionCreate] = Field(default_factory=list, max_length=2000)
+
+
+class RedactionSetResponse(BaseModel):
+    document: DocumentResponse
+    redactions: List[RedactionResponse]
+    # Of the redacted file: none (no redactions), pending, ready or failed
+    rendition_status: str
+
+
+# Change feed Schemas
+class ChangeEntry(BaseModel):
+    entity: str  # post, impact
+    op: str  # upsert, delete
+    id: int
+    changed_at: datetime
+    post: Optional[PostResponse] = None
+    impact: Optional[ImpactResponse] = None
+
+
+class ChangeFeed(BaseModel):
+    changes: List[ChangeEntry]
+    next_token: Optional[str]
+    has_more: bool
+
+
+
+# Batch mutation Schemas
+class BatchOperation(BaseModel):
+    """One queued create/update/delete of a post or impact"""
+    op: str = Field(..., pattern="^(create|update|delete)$")
+    entity: str = Field(..., pattern="^(post|impact)$")
+    id: Optional[int] = None  # Required for update and delete
+    data: Optional[Dict[str, Any]] = None  # PostCreate/PostUpdate/ImpactCreate/ImpactUpdate fields
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=100)
+    atomic: bool = False  # True: all-or-nothing; False: each operation in its own savepoint
+
+
+class BatchOperationResult(BaseModel):
+    index: int
+    status: int  # HTTP status the single-operation endpoint would have returned
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: List[BatchOperationResult]
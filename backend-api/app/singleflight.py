@@ -0,0 +1,131 @@
+"""
+Single-flight coalescing of identical concurrent reads.
+
+While a call for a key is in flight, other callers for the same key wait for
+its result instead of running the same query again. Works from threadpool
+threads (sync routes, `do`) and event loops (async routes, `do_async`), and
+both kinds of caller share the same in-flight call.
+
+Followers wait at most SINGLEFLIGHT_WAIT_SECONDS; after that they run the
+call themselves rather than queue behind a stuck leader. A leader's
+exception (e.g. a 404) is shared with its followers like a result is.
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+SINGLEFLIGHT_WAIT_SECONDS = float(os.getenv("SINGLEFLIGHT_WAIT_SECONDS", "5"))
+
+
+class _Call:
+    """One in-flight call and everyone waiting for it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        # Async followers, woken through their loop when the call finishes
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def outcome(self) -> Any:
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    def __init__(self, wait_seconds: float = SINGLEFLIGHT_WAIT_SECONDS):
+        self.wait_seconds = wait_seconds
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        # calls: executed by a leader; collapsed: served by another caller's call;
+        # timeouts: followers that gave up waiting and ran the call themselves
+        self.stats = {"calls": 0, "collapsed": 0, "timeouts": 0}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _join(self, key: str) -> Tuple[_Call, bool]:
+        """Return the key's call and whether the caller leads it"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            self.stats["calls"] += 1
+            return call, True
+
+    def _finish(self, key: str, call: _Call, result: Any = None, error: Optional[BaseException] = None):
+        call.result, call.error = result, error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            waiters, call.waiters = call.waiters, []
+            call.done.set()
+        for loop, future in waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_resolve, future)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run `fn()` once for all concurrent callers of `key` (blocking; for threads)"""
+        call, leader = self._join(key)
+        if leader:
+            try:
+                result = fn()
+            except BaseException as e:
+                self._finish(key, call, error=e)
+                raise
+            self._finish(key, call, result)
+            return result
+
+        if not call.done.wait(self.wait_seconds):
+            self._count("timeouts")
+            return fn()
+        if isinstance(call.error, asyncio.CancelledError):
+            # The (async) leader's client went away; that is no reason to fail this request
+            return fn()
+        self._count("collapsed")
+        return call.outcome()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await `fn()` once for all concurrent callers of `key` (for event loops)"""
+        call, leader = self._join(key)
+        if leader:
+            try:
+                result = await fn()
+            except BaseException as e:
+                self._finish(key, call, error=e)
+                raise
+            self._finish(key, call, result)
+            return result
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if not call.done.is_set():
+                call.waiters.append((loop, future))
+            else:
+                future.set_result(None)
+        try:
+            await asyncio.wait_for(future, self.wait_seconds)
+        except asyncio.TimeoutError:
+            self._count("timeouts")
+            return await fn()
+        if isinstance(call.error, asyncio.CancelledError):
+            return await fn()
+        self._count("collapsed")
+        return call.outcome()
+
+
+group = SingleFlight()
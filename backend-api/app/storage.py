@@ -0,0 +1,144 @@
+"""
+Blob storage for uploaded documents and their derivatives.
+
+Blobs are content-addressed: a document lives at documents/<sha256[:2]>/<sha256>,
+so identical uploads map to the same key and writing one twice is harmless.
+Redacted renditions are stored the same way, by their own hash, so a key
+(which a presigned URL shows) reveals nothing about the original.
+
+DOCUMENT_STORAGE selects where blobs go:
+
+- local (default): files under DOCUMENT_STORAGE_DIR. Uploads are staged in
+  its incoming/ directory and renamed into place, which is atomic because
+  both are on the same filesystem;
+- s3: an S3-compatible bucket (DOCUMENT_S3_BUCKET, optionally at
+  DOCUMENT_S3_ENDPOINT; needs `pip install boto3`). Uploads are staged in
+  DOCUMENT_STAGING_DIR and sent with multipart transfers read from disk.
+
+Either way a blob is only written once it is complete and hashed; readers
+never see a partial file.
+
+Blobs are written by the API (uploads) and read and written by the worker
+(text extraction, redaction and previews), which are separate processes and,
+as deployed from the Procfile, separate containers. With local storage both
+must therefore see the same DOCUMENT_STORAGE_DIR: a volume mounted into
+both, or a shared filesystem such as NFS. Where that is not possible use s3.
+"""
+import os
+import tempfile
+from typing import Optional, Tuple
+
+DOCUMENT_STORAGE = os.getenv("DOCUMENT_STORAGE", "local")  # local, s3
+DOCUMENT_STORAGE_DIR = os.getenv("DOCUMENT_STORAGE_DIR", "storage")
+DOCUMENT_STAGING_DIR = os.getenv("DOCUMENT_STAGING_DIR", "")
+DOCUMENT_S3_BUCKET = os.getenv("DOCUMENT_S3_BUCKET", "")
+DOCUMENT_S3_PREFIX = os.getenv("DOCUMENT_S3_PREFIX", "lexleaks/")
+DOCUMENT_S3_ENDPOINT = os.getenv("DOCUMENT_S3_ENDPOINT", "")
+DOCUMENT_S3_URL_SECONDS = int(os.getenv("DOCUMENT_S3_URL_SECONDS", "3600"))
+
+
+def document_key(sha256: str) -> str:
+    return f"documents/{sha256[:2]}/{sha256}"
+
+
+class LocalStorage:
+    """Blobs as files under a root directory"""
+
+    def __init__(self, root: str = DOCUMENT_STORAGE_DIR):
+        self.root = os.path.abspath(root)
+        self.staging_dir = os.path.join(self.root, "incoming")
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def put(self, staged_path: str, key: str, content_type: Optional[str] = None):
+        """Move a complete staged file into place (the staged file is consumed)"""
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(staged_path, target)
+
+    def fetch(self, key: str) -> Tuple[str, bool]:
+        """(path of a local copy, whether the caller must remove it)"""
+        return self.path(key), False
+
+    def download_url(self, key: str) -> Optional[str]:
+        """Local files are served by the API itself (see ranges.py)"""
+        return None
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3Storage:
+    """Blobs as objects in an S3-compatible bucket"""
+
+    def __init__(self, bucket: str = DOCUMENT_S3_BUCKET, prefix: str = DOCUMENT_S3_PREFIX):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("DOCUMENT_STORAGE=s3 requires the boto3 package (pip install boto3)")
+        if not bucket:
+            raise RuntimeError("DOCUMENT_STORAGE=s3 requires DOCUMENT_S3_BUCKET")
+        self.client = boto3.client("s3", endpoint_url=DOCUMENT_S3_ENDPOINT or None)
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client_error = ClientError
+        self.staging_dir = DOCUMENT_STAGING_DIR or tempfile.gettempdir()
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def put(self, staged_path: str, key: str, content_type: Optional[str] = None):
+        """Upload a complete staged file in multipart chunks read from disk, then remove it"""
+        try:
+            self.client.upload_file(
+                staged_path, self.bucket, self.prefix + key, ExtraArgs={"ContentType": content_type or "application/octet-stream"}
+            )
+        finally:
+            os.remove(staged_path)
+
+    def fetch(self, key: str) -> Tuple[str, bool]:
+        """Download to a staging file, streamed to disk; the caller removes it"""
+        fd, path = tempfile.mkstemp(dir=self.staging_dir, suffix=".pdf")
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, self.prefix + key, path)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path, True
+
+    def download_url(self, key: str) -> Optional[str]:
+        """Presigned GET; the bucket serves Range requests itself"""
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self.prefix + key}, ExpiresIn=DOCUMENT_S3_URL_SECONDS
+        )
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+
+_backend: Optional[object] = None
+
+
+def get_backend():
+    """The configured storage, created on first use"""
+    global _backend
+    if _backend is None:
+        _backend = S3Storage() if DOCUMENT_STORAGE == "s3" else LocalStorage()
+    return _backend
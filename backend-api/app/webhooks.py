@@ -0,0 +1,437 @@
+"""
+Outbound webhooks for partner newsrooms.
+
+Outbox handlers (app/handlers.py) turn "post.published" and "impact.created"
+events into one webhook_deliveries row per matching active webhook
+(queue_event). The worker runs dispatch_due() in its own stage (run), which:
+
+- claims due deliveries with FOR UPDATE SKIP LOCKED, leased like the outbox.
+  Each endpoint's share of a claim is capped at what it can be sent within
+  the lease even if every request times out (endpoint_claim_limit), so a
+  lease never runs out mid-round and a slow partner never gets a delivery twice;
+- groups them per webhook and, for partners that opted into batching, sends
+  up to batch_size events in one request as {"events": [...]};
+- sends over one pooled aiohttp client with at most max_concurrency requests
+  in flight per endpoint;
+- signs every body with the webhook secret:
+      X-LexLeaks-Signature: t=<unix time>,v1=<hex HMAC-SHA256 of "<t>.<body>">
+- retries failures with exponential backoff (retry_delay); a delivery that
+  fails WEBHOOK_MAX_ATTEMPTS times is left as "failed" (the dead letters);
+- disables an endpoint after WEBHOOK_DISABLE_AFTER consecutive failed
+  requests, or at once on 410 Gone.
+
+With many endpoints timing out at once, the round is also bounded by the
+shared connection limit: keep WEBHOOK_CLAIM_SIZE at or below
+WEBHOOK_CONCURRENCY * WEBHOOK_LEASE_SECONDS / WEBHOOK_TIMEOUT_SECONDS.
+
+Local stand-in receiver that verifies signatures and prints what it gets:
+    python -m app.webhooks receiver --port 8790 --secret <secret>
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, func, select, true, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Requests in flight to all partners together, per worker process
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "64"))
+# Deliveries claimed per dispatch round
+WEBHOOK_CLAIM_SIZE = int(os.getenv("WEBHOOK_CLAIM_SIZE", "200"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "10"))
+WEBHOOK_BACKOFF_SECONDS = int(os.getenv("WEBHOOK_BACKOFF_SECONDS", "30"))
+WEBHOOK_DISABLE_AFTER = int(os.getenv("WEBHOOK_DISABLE_AFTER", "20"))
+# How long claimed deliveries stay invisible to other workers while a round sends them
+WEBHOOK_LEASE_SECONDS = int(os.getenv("WEBHOOK_LEASE_SECONDS", "300"))
+WEBHOOK_POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", "1"))
+
+SIGNATURE_HEADER = "X-LexLeaks-Signature"
+
+# (webhook, deliveries sent together, error or None, endpoint reported gone)
+Outcome = Tuple[models.Webhook, List[models.WebhookDelivery], Optional[str], bool]
+
+
+def sign(secret: str, timestamp: int, body: bytes) -> str:
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_signature(secret: str, header: str, body: bytes, tolerance: int = 300) -> bool:
+    """What a partner does on receipt: check the HMAC and reject stale timestamps"""
+    try:
+        parts = dict(item.split("=", 1) for item in header.split(","))
+        timestamp = int(parts["t"])
+    except (KeyError, ValueError):
+        return False
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(sign(secret, timestamp, body), header)
+
+
+def retry_delay(attempts: int) -> int:
+    """Seconds to wait before retrying a delivery that has failed `attempts` times"""
+    return min(WEBHOOK_BACKOFF_SECONDS * 2 ** (attempts - 1), 6 * 3600)
+
+
+def requests_per_slot() -> int:
+    """
+    Requests one of an endpoint's slots can make back to back within a lease if
+    each times out, keeping one timeout in hand for the write-back
+    """
+    return max(1, int(WEBHOOK_LEASE_SECONDS // WEBHOOK_TIMEOUT_SECONDS) - 1)
+
+
+def endpoint_claim_limit(webhook: models.Webhook) -> int:
+    """Most deliveries of one endpoint a round may claim"""
+    return requests_per_slot() * webhook.max_concurrency * webhook.batch_size
+
+
+def matches(webhook: models.Webhook, event_type: str, category: Optional[str], impact_type: Optional[str]) -> bool:
+    if event_type not in webhook.event_types:
+        return False
+    if webhook.categories and category not in webhook.categories:
+        return False
+    if event_type == "impact.created" and webhook.impact_types and impact_type not in webhook.impact_types:
+        return False
+    return True
+
+
+def queue_event(db: Session, event_type: str, payload: dict) -> int:
+    """Queue a delivery of the event for every matching active webhook; returns how many"""
+    category = payload.get("category")
+    if event_type == "impact.created":
+        # Partners only hear about impacts on published posts
+        post = db.get(models.Post, payload["post_id"])
+        if post is None or post.status != "published":
+            return 0
+        category = post.category
+        payload = {**payload, "post_slug": post.slug, "category": category}
+
+    webhooks = db.scalars(select(models.Webhook).where(models.Webhook.is_active.is_(True))).all()
+    rows = [
+        {
+            "webhook_id": webhook.id,
+            "event_key": f"{event_type}:{payload['id']}",
+            "event_type": event_type,
+            "payload": payload,
+        }
+        for webhook in webhooks
+        if matches(webhook, event_type, category, payload.get("type"))
+    ]
+    if rows:
+        # The unique (webhook_id, event_key) makes a re-run handler harmless
+        table = models.WebhookDelivery.__table__
+        db.execute(
+            pg_insert(table).values(rows)
+            .on_conflict_do_nothing(index_elements=[table.c.webhook_id, table.c.event_key])
+        )
+    db.commit()
+    return len(rows)
+
+
+def queue_test_event(db: Session, webhook_id: int) -> models.WebhookDelivery:
+    """Queue a "webhook.test" delivery so a partner can check their receiver"""
+    delivery = models.WebhookDelivery(
+        webhook_id=webhook_id,
+        event_key=f"webhook.test:{uuid.uuid4()}",
+        event_type="webhook.test",
+        payload={"message": "Test delivery from LexLeaks"},
+    )
+    db.add(delivery)
+    db.commit()
+    db.refresh(delivery)
+    return delivery
+
+
+def _claim(limit: int) -> Tuple[List[models.WebhookDelivery], Dict[int, models.Webhook]]:
+    db = SessionLocal()
+    try:
+        # Up to endpoint_claim_limit due deliveries of each active endpoint...
+        per_endpoint = (
+            select(models.WebhookDelivery.id, models.WebhookDelivery.available_at)
+            .where(
+                models.WebhookDelivery.webhook_id == models.Webhook.id,
+                models.WebhookDelivery.status == "pending",
+                models.WebhookDelivery.available_at <= func.now()
+            )
+            .order_by(models.WebhookDelivery.available_at, models.WebhookDelivery.id)
+            # endpoint_claim_limit over the endpoint's columns
+            .limit(endpoint_claim_limit(models.Webhook))
+            .with_for_update(skip_locked=True)
+            .lateral()
+        )
+        # ...and the longest waiting of those overall
+        due = (
+            select(per_endpoint.c.id)
+            .select_from(models.Webhook)
+            .join(per_endpoint, true())
+            .where(models.Webhook.is_active.is_(True))
+            .order_by(per_endpoint.c.available_at, per_endpoint.c.id)
+            .limit(limit)
+        )
+        deliveries = db.scalars(
+            update(models.WebhookDelivery)
+            .where(models.WebhookDelivery.id.in_(due.scalar_subquery()))
+            .values(
+                attempts=models.WebhookDelivery.attempts + 1,
+                available_at=func.now() + timedelta(seconds=WEBHOOK_LEASE_SECONDS)
+            )
+            .returning(models.WebhookDelivery)
+            .execution_options(synchronize_session=False)
+        ).all()
+        webhooks = {}
+        if deliveries:
+            webhook_ids = {delivery.webhook_id for delivery in deliveries}
+            webhooks = {
+                webhook.id: webhook
+                for webhook in db.scalars(select(models.Webhook).where(models.Webhook.id.in_(webhook_ids)))
+            }
+        db.commit()
+        return sorted(deliveries, key=lambda delivery: delivery.id), webhooks
+    finally:
+        db.close()
+
+
+def _record(outcomes: List[Outcome]):
+    """Write back every request's outcome: a few set-based statements per dispatch round"""
+    db = SessionLocal()
+    try:
+        delivered = [d.id for _, deliveries, error, _ in outcomes if error is None for d in deliveries]
+        if delivered:
+            db.execute(
+                update(models.WebhookDelivery)
+                .where(models.WebhookDelivery.id.in_(delivered))
+                .values(status="delivered", delivered_at=func.now(), last_error=None)
+            )
+
+        for webhook, deliveries, error, gone in outcomes:
+            if error is None:
+                continue
+            # Deliveries batched together may have been tried a different number of times
+            by_attempts: Dict[int, List[int]] = defaultdict(list)
+            for delivery in deliveries:
+                by_attempts[delivery.attempts].append(delivery.id)
+            for attempts, ids in by_attempts.items():
+                if attempts >= WEBHOOK_MAX_ATTEMPTS:
+                    values = {"status": "failed"}
+                else:
+                    values = {"available_at": func.now() + timedelta(seconds=retry_delay(attempts))}
+                db.execute(
+                    update(models.WebhookDelivery)
+                    .where(models.WebhookDelivery.id.in_(ids))
+                    .values(last_error=error[:2000], **values)
+                )
+
+        # One row update per webhook that was contacted in this round
+        by_webhook: Dict[int, List[Outcome]] = defaultdict(list)
+        for outcome in outcomes:
+            by_webhook[outcome[0].id].append(outcome)
+        for webhook_id, webhook_outcomes in by_webhook.items():
+            failures = [outcome for outcome in webhook_outcomes if outcome[2] is not None]
+            if not failures:
+                values = {"consecutive_failures": 0, "last_success_at": func.now(), "last_error": None}
+            else:
+                failed_total = models.Webhook.consecutive_failures + len(failures)
+                values = {"consecutive_failures": failed_total, "last_error": failures[-1][2][:2000]}
+                if any(outcome[3] for outcome in failures):
+                    values.update(is_active=False, disabled_at=func.now())
+                else:
+                    dead = failed_total >= WEBHOOK_DISABLE_AFTER
+                    values.update(is_active=~dead, disabled_at=case((dead, func.now()), else_=None))
+            db.execute(update(models.Webhook).where(models.Webhook.id == webhook_id).values(**values))
+
+        db.commit()
+        for webhook, _, error, gone in outcomes:
+            if gone:
+                logger.warning("Webhook %s returned 410 Gone and was disabled", webhook.id)
+    finally:
+        db.close()
+
+
+_client: Optional[aiohttp.ClientSession] = None
+# webhook id -> (limit the semaphore was built for, semaphore)
+_endpoint_slots: Dict[int, Tuple[int, asyncio.Semaphore]] = {}
+
+
+def get_client() -> aiohttp.ClientSession:
+    global _client
+    if _client is None or _client.closed:
+        _client = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=WEBHOOK_CONCURRENCY, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=WEBHOOK_TIMEOUT_SECONDS),
+            headers={"User-Agent": "LexLeaks-Webhooks/1.0"},
+        )
+        _endpoint_slots.clear()
+    return _client
+
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def _slots_for(webhook: models.Webhook) -> asyncio.Semaphore:
+    limit, slots = _endpoint_slots.get(webhook.id, (None, None))
+    if limit != webhook.max_concurrency:
+        slots = asyncio.Semaphore(webhook.max_concurrency)
+        _endpoint_slots[webhook.id] = (webhook.max_concurrency, slots)
+    return slots
+
+
+def encode_body(webhook: models.Webhook, deliveries: List[models.WebhookDelivery]) -> bytes:
+    events = [
+        {
+            "id": delivery.id,
+            "type": delivery.event_type,
+            "created_at": delivery.created_at.isoformat() if delivery.created_at else None,
+            "data": delivery.payload,
+        }
+        for delivery in deliveries
+    ]
+    # Partners that opted into batching always get the envelope, even for one event
+    document = {"events": events} if webhook.batch_size > 1 else events[0]
+    return json.dumps(document, separators=(",", ":"), default=str).encode("utf-8")
+
+
+async def _send(webhook: models.Webhook, deliveries: List[models.WebhookDelivery]) -> Outcome:
+    body = encode_body(webhook, deliveries)
+    headers = {
+        "Content-Type": "application/json",
+        "X-LexLeaks-Event": deliveries[0].event_type if len(deliveries) == 1 else "batch",
+        "X-LexLeaks-Delivery": ",".join(str(delivery.id) for delivery in deliveries),
+        SIGNATURE_HEADER: sign(webhook.secret, int(time.time()), body),
+    }
+    async with _slots_for(webhook):
+        try:
+            async with get_client().post(webhook.url, data=body, headers=headers) as response:
+                await response.release()
+                if 200 <= response.status < 300:
+                    return webhook, deliveries, None, False
+                return webhook, deliveries, f"HTTP {response.status}", response.status == 410
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return webhook, deliveries, f"{type(e).__name__}: {e}", False
+
+
+async def dispatch_due(limit: int = WEBHOOK_CLAIM_SIZE) -> int:
+    """Claim due deliveries and send them; returns the number claimed"""
+    deliveries, webhooks = await run_in_threadpool(_claim, limit)
+    if not deliveries:
+        return 0
+
+    grouped: Dict[int, List[models.WebhookDelivery]] = defaultdict(list)
+    for delivery in deliveries:
+        grouped[delivery.webhook_id].append(delivery)
+
+    started = time.monotonic()
+    requests = []
+    for webhook_id, webhook_deliveries in grouped.items():
+        webhook = webhooks[webhook_id]
+        for start in range(0, len(webhook_deliveries), webhook.batch_size):
+            requests.append(_send(webhook, webhook_deliveries[start:start + webhook.batch_size]))
+    outcomes = await asyncio.gather(*requests)
+    await run_in_threadpool(_record, outcomes)
+
+    failed = sum(len(outcome[1]) for outcome in outcomes if outcome[2] is not None)
+    logger.info("Sent %d webhook deliveries in %d requests to %d endpoints (%d failed) in %.3fs",
+                len(deliveries), len(outcomes), len(grouped), failed, time.monotonic() - started)
+    return len(deliveries)
+
+
+async def run(stopping: asyncio.Event, once: bool = False):
+    """Delivery loop run by the worker until `stopping` is set (or, with once, nothing is due)"""
+    while not stopping.is_set():
+        try:
+            claimed = await dispatch_due()
+        except Exception:
+            logger.exception("Webhook dispatch round failed")
+            claimed = 0
+        if claimed < WEBHOOK_CLAIM_SIZE:
+            if once:
+                break
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=WEBHOOK_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+# Stand-in partner receiver for local testing
+
+async def start_receiver(secret: str, port: int = 0, fail_every: int = 0, status: int = 500):
+    """
+    Receive webhooks on POST / at localhost, verifying signatures. Every
+    `fail_every`-th request is answered with `status`. Returns (runner, url, received)
+    where `received` collects the parsed bodies.
+    """
+    from aiohttp import web
+
+    received: List[dict] = []
+    counter = {"requests": 0}
+
+    async def receive(request: web.Request):
+        body = await request.read()
+        counter["requests"] += 1
+        if not verify_signature(secret, request.headers.get(SIGNATURE_HEADER, ""), body):
+            return web.Response(status=401, text="bad signature")
+        if fail_every and counter["requests"] % fail_every == 0:
+            return web.Response(status=status)
+        received.append(json.loads(body))
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_post("/", receive)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{bound_port}/", received
+
+
+async def _serve_receiver(secret: str, port: int, fail_every: int):
+    runner, url, received = await start_receiver(secret, port, fail_every)
+    print(f"Webhook receiver listening on {url}", flush=True)
+    seen = 0
+    try:
+        while True:
+            await asyncio.sleep(0.5)
+            for document in received[seen:]:
+                print(json.dumps(document), flush=True)
+            seen = len(received)
+    finally:
+        await runner.cleanup()
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="LexLeaks webhook tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    receiver = commands.add_parser("receiver", help="Run a local stand-in partner receiver")
+    receiver.add_argument("--secret", required=True)
+    receiver.add_argument("--port", type=int, default=8790)
+    receiver.add_argument("--fail-every", type=int, default=0, help="Answer every Nth request with a 500")
+    args = parser.parse_args(argv)
+
+    asyncio.run(_serve_receiver(args.secret, args.port, args.fail_every))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Outbox worker: runs the side effects of committed writes outside the request.
+
+Usage (from backend-api/):
+    python -m app.worker              # run until SIGTERM/SIGINT
+    python -m app.worker --once       # drain the due events and exit
+
+Partner webhook delivery (app/webhooks.py), document text extraction
+(app/extraction.py), redaction rendering (app/redaction.py) and preview
+rendering (app/previews.py) run alongside, each in its own loop, so slow
+partners never delay events. The PDF stages share one process pool
+(app/pdfpool.py), so CPU-heavy PDF work never delays them either.
+Several workers can run side by side; claims use FOR UPDATE SKIP LOCKED.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import time
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from . import handlers  # noqa: F401  (registers the outbox handlers)
+from . import crud, extraction, models, outbox, pdfpool, previews, push, redaction, webhooks
+from .database import SessionLocal
+
+logger = logging.getLogger("app.worker")
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+# Idle sleep between polls when nothing is due
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+# How often the leases of events being processed are renewed
+OUTBOX_HEARTBEAT_SECONDS = float(os.getenv("OUTBOX_HEARTBEAT_SECONDS", str(outbox.OUTBOX_LEASE_SECONDS / 3)))
+PURGE_INTERVAL_SECONDS = 3600
+REFRESH_TOKEN_RETENTION_DAYS = 7
+
+# (event, completed handler names, error or None)
+Outcome = Tuple[models.OutboxEvent, List[str], Optional[str]]
+
+
+def _claim(limit: int) -> List[models.OutboxEvent]:
+    db = SessionLocal()
+    try:
+        return outbox.claim(db, limit)
+    finally:
+        db.close()
+
+
+def _extend(events: List[models.OutboxEvent]) -> int:
+    db = SessionLocal()
+    try:
+        return outbox.extend_leases(db, events)
+    finally:
+        db.close()
+
+
+async def _keep_leased(events: List[models.OutboxEvent]):
+    """Renew the batch's leases every OUTBOX_HEARTBEAT_SECONDS until cancelled"""
+    while True:
+        await asyncio.sleep(OUTBOX_HEARTBEAT_SECONDS)
+        try:
+            extended = await run_in_threadpool(_extend, events)
+        except Exception:
+            # The next beat tries again; the lease has time left until then
+            logger.exception("Could not renew the leases of %d outbox events", len(events))
+            continue
+        if extended < len(events):
+            logger.warning("%d of %d outbox events in progress were reclaimed by another worker",
+                           len(events) - extended, len(events))
+
+
+def _record(outcomes: List[Outcome]):
+    db = SessionLocal()
+    try:
+        outbox.mark_done(db, [event.id for event, _, error in outcomes if error is None])
+        for event, completed, error in outcomes:
+            if error is not None:
+                outbox.mark_failed(db, event, completed, error)
+    finally:
+        db.close()
+
+
+def _purge() -> Tuple[int, int]:
+    db = SessionLocal()
+    try:
+        events = outbox.purge_processed(db)
+        # Expired refresh tokens are kept a while so reuse of a stolen one is still recognised
+        tokens = crud.purge_refresh_tokens(db, retention=timedelta(days=REFRESH_TOKEN_RETENTION_DAYS))
+        return events, tokens
+    finally:
+        db.close()
+
+
+async def dispatch(event: models.OutboxEvent) -> Outcome:
+    """Run the event's handlers in registration order, skipping ones that already succeeded"""
+    completed = list(event.completed_handlers or [])
+    for fn in outbox.handlers_for(event.event_type):
+        name = outbox.handler_name(fn)
+        if name in completed:
+            continue
+        try:
+            if asyncio.iscoroutinefunction(fn):
+                await fn(event.payload)
+            else:
+                await run_in_threadpool(fn, event.payload)
+        except Exception as e:
+            logger.exception("Outbox event %s (%s) failed in %s on attempt %d",
+                             event.id, event.event_type, name, event.attempts)
+            return event, completed, f"{name}: {e!r}"
+        completed.append(name)
+    return event, completed, None
+
+
+async def run_batch(batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """Claim and process one batch; returns the number of events claimed"""
+    events = await run_in_threadpool(_claim, batch_size)
+    if not events:
+        return 0
+    started = time.monotonic()
+    heartbeat = asyncio.create_task(_keep_leased(events))
+    try:
+        outcomes = await asyncio.gather(*(dispatch(event) for event in events))
+        await run_in_threadpool(_record, outcomes)
+    finally:
+        heartbeat.cancel()
+    failed = sum(1 for _, _, error in outcomes if error is not None)
+    logger.info("Processed %d outbox events (%d failed) in %.3fs",
+                len(events), failed, time.monotonic() - started)
+    return len(events)
+
+
+async def run(batch_size: int = OUTBOX_BATCH_SIZE, once: bool = False):
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    stages = [
+        asyncio.create_task(webhooks.run(stopping, once)),
+        asyncio.create_task(extraction.run(stopping, once)),
+        asyncio.create_task(redaction.run(stopping, once)),
+        asyncio.create_task(previews.run(stopping, once)),
+    ]
+    last_purge = 0.0
+    try:
+        while not stopping.is_set():
+            claimed = await run_batch(batch_size)
+            if time.monotonic() - last_purge > PURGE_INTERVAL_SECONDS:
+                events, tokens = await run_in_threadpool(_purge)
+                if events or tokens:
+                    logger.info("Purged %d processed outbox events and %d expired refresh tokens", events, tokens)
+                last_purge = time.monotonic()
+            if claimed < batch_size:
+                if once:
+                    break
+                # Nothing more is due right now; wait for the next poll or shutdown
+                try:
+                    await asyncio.wait_for(stopping.wait(), timeout=OUTBOX_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        # With --once, wait for the other stages to drain as well
+        await asyncio.gather(*stages)
+    finally:
+        for stage in stages:
+            if not stage.done():
+                stage.cancel()
+        pdfpool.shutdown()
+        await push.close()
+        await webhooks.close()
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Process LexLeaks outbox events")
+    parser.add_argument("--once", action="store_true", help="Process the due events and exit")
+    parser.add_argument("--batch-size", type=int, default=OUTBOX_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(run(args.batch_size, args.once))
+
+
+if __name__ == "__main__":
+    main()
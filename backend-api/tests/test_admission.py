@@ -0,0 +1,120 @@
+"""Lanes and deadlines, through AdmissionMiddleware around a small app"""
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app import admission, auth, ndjson, schemas
+
+
+class Record(BaseModel):
+    title: str
+
+
+class Connection:
+    def __init__(self):
+        self.statements = []
+
+    def exec_driver_sql(self, statement):
+        self.statements.append(statement)
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/api/posts/import")
+    async def import_posts(request: Request):
+        connection = Connection()
+
+        def write_batch(batch):
+            time.sleep(0.1)
+            # What a session opened by the batch would run on its first statement
+            admission._apply_deadline(None, None, connection)
+            return [schemas.ImportResult(line=line, status="created") for line, _ in batch]
+
+        summary = await ndjson.import_ndjson(request.stream(), Record, write_batch)
+        return {"created": summary.created, "statements": connection.statements}
+
+    @app.get("/api/export/posts")
+    def export():
+        def chunks():
+            for _ in range(3):
+                yield f"{admission.remaining_seconds()}\n".encode()
+        return StreamingResponse(chunks())
+
+    @app.get("/api/posts/{post_id}")
+    async def read(post_id: int):
+        before = admission.remaining_seconds()
+        with admission.without_deadline():
+            inside = await run_in_threadpool(admission.remaining_seconds)
+        return {"before": before, "inside": inside, "after": admission.remaining_seconds()}
+
+    return admission.AdmissionMiddleware(app)
+
+
+def get(path: str) -> httpx.Response:
+    async def request():
+        transport = httpx.ASGITransport(app=make_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path)
+    return asyncio.run(request())
+
+
+def scope(method: str, path: str, query: bytes = b"", headers=()) -> dict:
+    return {"type": "http", "method": method, "path": path, "query_string": query, "headers": list(headers)}
+
+
+def test_exports_have_their_own_lane():
+    assert admission.classify(scope("GET", "/api/export/posts")) == "export"
+    assert admission.classify(scope("GET", "/api/posts/search")) == "low"
+    assert admission.classify(scope("GET", "/api/posts/", b"search=court")) == "low"
+    assert "export" in admission.SHEDDABLE_LANES
+
+
+def test_only_verified_tokens_take_the_critical_lane():
+    token = auth.create_access_token({"sub": "editor"})
+    forged = auth.create_access_token({"sub": "editor"})[:-4] + "AAAA"
+
+    def lane(authorization: str):
+        return admission.classify(scope("PUT", "/api/posts/1", headers=[(b"authorization", authorization.encode())]))
+
+    assert lane(f"Bearer {token}") == "critical"
+    assert lane(f"Bearer {forged}") == "normal"
+    assert lane("x") == "normal"
+    assert admission.classify(scope("PUT", "/api/posts/1")) == "normal"
+
+
+def test_streamed_body_runs_without_the_deadline():
+    response = get("/api/export/posts")
+
+    assert response.status_code == 200
+    assert response.text.split() == ["None"] * 3
+
+
+def test_fan_out_block_runs_without_the_deadline():
+    times = get("/api/posts/1").json()
+
+    assert 0 < times["before"] <= admission.LANES["high"].budget_seconds
+    assert times["inside"] is None
+    assert times["after"] is not None
+
+
+def test_import_runs_past_the_lane_budget(monkeypatch):
+    assert admission.classify(scope("POST", "/api/posts/import")) == "upload"
+    assert admission.classify(scope("POST", "/api/impacts/import")) == "upload"
+    monkeypatch.setattr(admission.LANES["upload"], "budget_seconds", 0.15)
+    monkeypatch.setattr(ndjson, "IMPORT_BATCH_SIZE", 1)
+    body = "".join(f'{{"title": "t{i}"}}\n' for i in range(4))
+
+    async def request():
+        transport = httpx.ASGITransport(app=make_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/posts/import", content=body)
+    response = asyncio.run(request())
+
+    assert response.status_code == 200
+    assert response.json() == {"created": 4, "statements": []}
@@ -0,0 +1,116 @@
+"""The in-process revocation list, with its database query stubbed"""
+import sys
+import threading
+import time
+
+import pytest
+
+from app import auth, crud
+
+
+@pytest.fixture
+def revoked_in_db(monkeypatch):
+    """Sessions the stubbed query returns; set `fail` to make it raise, `gate` to hold it"""
+    state = {"sessions": [], "fail": False, "gate": None, "queries": 0}
+    monkeypatch.setattr(auth, "SessionLocal", lambda: type("DB", (), {"close": lambda self: None})())
+
+    def get_revoked_sessions(db, within):
+        state["queries"] += 1
+        if state["gate"] is not None:
+            state["gate"].wait(5)
+        if state["fail"]:
+            raise ConnectionError("database is down")
+        return list(state["sessions"])
+
+    monkeypatch.setattr(crud, "get_revoked_sessions", get_revoked_sessions)
+    return state
+
+
+def wait_for_reload(revocations):
+    deadline = time.monotonic() + 5
+    while revocations._lock.locked() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_check_does_not_wait_for_the_reload(revoked_in_db):
+    revocations = auth.RevocationList()
+    revoked_in_db["sessions"] = ["elsewhere"]
+    revoked_in_db["gate"] = threading.Event()
+
+    started = time.monotonic()
+    assert revocations.is_revoked("elsewhere") is False  # answered from the (empty) current list
+    assert time.monotonic() - started < 1
+
+    revoked_in_db["gate"].set()
+    wait_for_reload(revocations)
+    assert revocations.is_revoked("elsewhere") is True
+
+
+def test_failed_reload_keeps_the_list(revoked_in_db, monkeypatch):
+    revocations = auth.RevocationList()
+    revoked_in_db["sessions"] = ["a"]
+    assert revocations.reload() is True
+
+    revoked_in_db["fail"] = True
+    monkeypatch.setattr(auth, "REVOCATION_REFRESH_SECONDS", 0)
+    assert revocations.is_revoked("a") is True
+    wait_for_reload(revocations)
+    assert revocations.reload() is False
+    assert revocations.is_revoked("a") is True
+
+
+def test_local_revocation_survives_a_reload_that_missed_it(revoked_in_db):
+    revocations = auth.RevocationList()
+    revoked_in_db["gate"] = threading.Event()
+    revocations.is_revoked("x")  # starts a reload, held at the query
+
+    revocations.add("logged-out")
+    revoked_in_db["gate"].set()
+    wait_for_reload(revocations)
+
+    assert revocations.is_revoked("logged-out") is True
+
+
+def test_refresh_token_reuse_revokes_the_session_at_once(monkeypatch):
+    monkeypatch.setattr(auth, "revocations", auth.RevocationList())
+
+    def rotate_refresh_token(db, token, expires_delta, reuse_grace):
+        raise crud.RefreshTokenReused("stolen-session")
+
+    monkeypatch.setattr(crud, "rotate_refresh_token", rotate_refresh_token)
+    monkeypatch.setattr(auth.revocations, "_checked_at", time.monotonic())
+
+    assert auth.refresh_session_tokens(None, "old-token") is None
+    assert auth.revocations.is_revoked("stolen-session") is True
+
+
+def test_concurrent_revocations_survive_reloads(revoked_in_db):
+    revocations = auth.RevocationList()
+    sessions = [f"s{i}" for i in range(8000)]
+    reloading = True
+
+    def reload_continuously():
+        while reloading:
+            revocations.reload()
+
+    def revoke(chunk):
+        for session_id in chunk:
+            revoked_in_db["sessions"].append(session_id)  # committed first, as revoke_session does
+            revocations.add(session_id)
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    reloader = threading.Thread(target=reload_continuously)
+    revokers = [threading.Thread(target=revoke, args=(sessions[i::4],)) for i in range(4)]
+    try:
+        reloader.start()
+        for thread in revokers:
+            thread.start()
+        for thread in revokers:
+            thread.join()
+    finally:
+        reloading = False
+        reloader.join()
+        sys.setswitchinterval(switch_interval)
+
+    assert [session_id for session_id in sessions if not revocations.is_revoked(session_id)] == []
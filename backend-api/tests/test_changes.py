@@ -0,0 +1,75 @@
+"""
+Change feed ordering against a long-running transaction. Needs a scratch
+Postgres database, whose tables it creates and empties:
+
+    TEST_DATABASE_URL=postgresql://localhost/lexleaks_test pytest tests/test_changes.py
+"""
+import os
+
+import pytest
+from sqlalchemy import create_engine, insert, text
+
+from app import cache, crud, events, models, schemas
+from app.database import SessionLocal
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine(TEST_DATABASE_URL)
+    models.Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_BUS", "memory")
+    monkeypatch.setattr(events, "EVENTS_BACKEND", "memory")
+    tables = ", ".join(table.name for table in models.Base.metadata.sorted_tables)
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+    sessions = []
+
+    def open_session():
+        sessions.append(SessionLocal(bind=engine))
+        return sessions[-1]
+    yield open_session
+    for db in sessions:
+        db.close()
+
+
+def post(title: str) -> schemas.PostCreate:
+    return schemas.PostCreate(title=title, content="Body", excerpt="Excerpt", status="published", category="corporate")
+
+
+def test_long_transaction_is_not_skipped(session):
+    slow, fast, reader = session(), session(), session()
+    author_id = fast.scalar(insert(models.User).values(username="reporter", hashed_password="x").returning(models.User.id))
+    fast.commit()
+
+    # Started first and committed last, behind a row the reader could already have seen
+    slow.execute(insert(models.Post).values(
+        title="Slow", slug="slow", content="Body", status="published", author_id=author_id
+    ))
+    crud.create_post(fast, post("Fast"), author_id)
+
+    changes, cursor, _ = crud.get_changes(reader)
+    reader.commit()
+    assert changes == []
+
+    slow.commit()
+    changes, cursor, _ = crud.get_changes(reader)
+    reader.commit()
+    assert [change["post"].title for change in changes] == ["Slow", "Fast"]
+
+    changes, _, _ = crud.get_changes(reader, since=cursor)
+    reader.commit()
+    assert changes == []
+
+    crud.update_post(fast, 1, schemas.PostUpdate(content="Edited"))
+    changes, _, _ = crud.get_changes(reader, since=cursor)
+    assert [change["post"].title for change in changes] == ["Slow"]
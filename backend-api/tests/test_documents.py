@@ -0,0 +1,125 @@
+"""Who may change a shared document's redactions; crud is stubbed, so no database is needed"""
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app import auth, crud, database, documents, models, storage
+from app.main import app
+
+DOCUMENT = models.Document(
+    id=7, sha256="a" * 64, size=10, published_sha256="a" * 64, published_size=10,
+    page_count=1, content_type="application/pdf", created_at=datetime(2026, 10, 1, tzinfo=timezone.utc),
+)
+AUTHOR = SimpleNamespace(id=2, username="reporter")
+ADMIN = SimpleNamespace(id=1, username="admin")
+
+
+@pytest.fixture
+def saved(monkeypatch):
+    """Redaction sets the route saved"""
+    calls = []
+    monkeypatch.setattr(crud, "get_document", lambda db, document_id: DOCUMENT)
+    monkeypatch.setattr(crud, "document_attached_to_author", lambda db, document_id, author_id: True)
+    monkeypatch.setattr(crud, "get_redactions", lambda db, document_id: [])
+
+    def replace_redactions(db, document_id, redactions, user_id):
+        calls.append((document_id, redactions, user_id))
+        return DOCUMENT, None
+
+    monkeypatch.setattr(crud, "replace_redactions", replace_redactions)
+    app.dependency_overrides[database.get_db] = lambda: None
+    yield calls
+    app.dependency_overrides.clear()
+
+
+def put_redactions(user) -> httpx.Response:
+    app.dependency_overrides[auth.get_current_user] = lambda: user
+
+    async def request():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.put(
+                "/api/documents/7/redactions", json={"redactions": []},
+                headers={"Authorization": "Bearer test"},
+            )
+    return asyncio.run(request())
+
+
+def test_author_cannot_change_a_document_shared_with_others(monkeypatch, saved):
+    monkeypatch.setattr(crud, "document_attached_to_others", lambda db, document_id, author_id: True)
+
+    response = put_redactions(AUTHOR)
+
+    assert response.status_code == 403
+    assert saved == []
+
+
+def test_author_can_change_a_document_only_they_use(monkeypatch, saved):
+    monkeypatch.setattr(crud, "document_attached_to_others", lambda db, document_id, author_id: False)
+
+    response = put_redactions(AUTHOR)
+
+    assert response.status_code == 200
+    assert saved == [(7, [], AUTHOR.id)]
+
+
+def test_admin_can_change_any_document(monkeypatch, saved):
+    monkeypatch.setattr(crud, "document_attached_to_others", lambda db, document_id, author_id: True)
+
+    assert put_redactions(ADMIN).status_code == 200
+
+
+
+class Storage:
+    """Already holds every file"""
+
+    def __init__(self, staging_dir):
+        self.staging_dir = staging_dir
+        self.stored = []
+
+    def exists(self, key):
+        return True
+
+    def put(self, staged_path, key, content_type=None):
+        self.stored.append(key)
+
+
+def test_upload_of_a_file_someone_else_stored(monkeypatch, tmp_path):
+    """The uploader gets a document of their own, and is not told the file was known"""
+    backend = Storage(str(tmp_path))
+    created = []
+    monkeypatch.setattr(storage, "get_backend", lambda: backend)
+    monkeypatch.setattr(documents, "count_pages", lambda path: 1)
+    monkeypatch.setattr(crud, "get_post", lambda db, post_id: SimpleNamespace(id=post_id, author_id=AUTHOR.id))
+    monkeypatch.setattr(crud, "get_document_by_hash", lambda db, sha256, uploaded_by: None)
+
+    def create_document(db, **values):
+        created.append(values)
+        return SimpleNamespace(id=8, **values)
+
+    monkeypatch.setattr(crud, "create_document", create_document)
+    monkeypatch.setattr(crud, "attach_document", lambda db, post_id, document_id, filename: SimpleNamespace(
+        post_id=post_id, document_id=document_id, filename=filename, created_at=DOCUMENT.created_at, document=DOCUMENT
+    ))
+    app.dependency_overrides[database.get_db] = lambda: None
+    app.dependency_overrides[auth.get_current_user] = lambda: AUTHOR
+
+    async def request():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/api/posts/3/documents", params={"filename": "memo.pdf"}, content=b"%PDF-1.7 memo",
+                headers={"Authorization": "Bearer test", "Content-Type": "application/pdf"},
+            )
+    try:
+        response = asyncio.run(request())
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 201
+    assert "deduplicated" not in response.json()
+    assert [values["uploaded_by"] for values in created] == [AUTHOR.id]
+    assert backend.stored == []
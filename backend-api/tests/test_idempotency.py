@@ -0,0 +1,124 @@
+"""IdempotencyMiddleware with the in-memory store, around a counting ASGI app"""
+import asyncio
+import json
+
+import pytest
+
+from app import auth, idempotency
+
+
+class CountingApp:
+    """Answers 201 with the body it read and how many requests it has run"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        payload = json.dumps({"calls": self.calls, "length": len(body)}).encode()
+        await send({"type": "http.response.start", "status": 201, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": payload})
+
+
+def request(middleware, method="POST", chunks=(b"{}",), headers=()):
+    """Send one request; `chunks` arrive as separate messages, as with Transfer-Encoding: chunked"""
+    scope = {
+        "type": "http", "method": method, "path": "/api/posts", "query_string": b"",
+        "headers": [(b"idempotency-key", b"key-1"), *headers],
+    }
+    messages = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)] or [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    start = sent[0]
+    replayed = (b"idempotent-replayed", b"true") in start["headers"]
+    return start["status"], json.loads(sent[1]["body"]), replayed
+
+
+@pytest.fixture
+def app():
+    return CountingApp()
+
+
+@pytest.fixture
+def middleware(app):
+    return idempotency.IdempotencyMiddleware(app, idempotency.MemoryIdempotencyStore())
+
+
+def test_replay_returns_the_stored_response(app, middleware):
+    headers = [(b"content-length", b"2")]
+    first = request(middleware, headers=headers)
+    second = request(middleware, headers=headers)
+
+    assert first == (201, {"calls": 1, "length": 2}, False)
+    assert second == (201, {"calls": 1, "length": 2}, True)
+    assert app.calls == 1
+
+
+def test_bodyless_delete_is_idempotent(app, middleware):
+    request(middleware, method="DELETE", chunks=())
+    request(middleware, method="DELETE", chunks=())
+
+    assert app.calls == 1
+
+
+def test_chunked_body_is_idempotent(app, middleware):
+    first = request(middleware, chunks=(b'{"title":', b'"x"}'))
+    second = request(middleware, chunks=(b'{"title":', b'"x"}'))
+
+    assert first[1] == {"calls": 1, "length": 13}
+    assert second[2] is True
+    assert app.calls == 1
+
+
+def test_oversized_chunked_body_passes_through_intact(app, middleware, monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_MAX_BODY", 8)
+    chunks = (b"12345", b"67890", b"abc")
+
+    assert request(middleware, chunks=chunks)[1] == {"calls": 1, "length": 13}
+    assert request(middleware, chunks=chunks)[1] == {"calls": 2, "length": 13}
+
+
+def test_in_flight_claims_are_leased_and_completed_keys_kept(monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_LEASE_SECONDS", 60)
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_TTL_SECONDS", 3600)
+    store = idempotency.MemoryIdempotencyStore()
+
+    async def claim_and_complete():
+        assert await store.claim("key", "fingerprint") is None
+        leased = store._entries["key"]["expires"]
+        await store.complete("key", (201, {}, b""))
+        return leased, store._entries["key"]["expires"]
+
+    leased, kept = asyncio.run(claim_and_complete())
+    assert kept - leased == pytest.approx(3600 - 60, abs=1)
+
+
+def test_key_follows_the_user_across_token_refreshes(app, middleware):
+    def bearer(username, session):
+        token = auth.create_access_token({"sub": username, "sid": session})
+        return [(b"authorization", f"Bearer {token}".encode()), (b"content-length", b"2")]
+
+    first = request(middleware, headers=bearer("editor", "s1"))
+    refreshed = request(middleware, headers=bearer("editor", "s2"))
+    other = request(middleware, headers=bearer("reporter", "s3"))
+    anonymous = request(middleware, headers=[(b"authorization", b"Bearer forged"), (b"content-length", b"2")])
+
+    assert first == (201, {"calls": 1, "length": 2}, False)
+    assert refreshed == (201, {"calls": 1, "length": 2}, True)
+    assert other == (201, {"calls": 2, "length": 2}, False)
+    assert anonymous == (201, {"calls": 3, "length": 2}, False)
@@ -0,0 +1,67 @@
+"""Live events for impact writes; the session is stubbed, so no database is needed"""
+import json
+from datetime import datetime
+
+import pytest
+
+from app import cache, crud, events, models, schemas
+
+IMPACT = models.Impact(
+    id=3, title="Inquiry opened", description="An inquiry was opened", date=datetime(2026, 10, 1),
+    type="investigation", status="pending", post_id=1,
+)
+
+
+class Session:
+    """Answers every write with the impact and the status of its post"""
+
+    def __init__(self, post_status: str):
+        self.row = (IMPACT, post_status)
+        self.info = {}
+
+    def execute(self, statement):
+        return self
+
+    def one(self):
+        return self.row
+
+    first = one
+
+    def get_nested_transaction(self):
+        return None
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def memory_events(monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_BACKEND", "memory")
+    monkeypatch.setattr(cache, "invalidate", lambda db, *tags: None)
+
+
+def emitted(db: Session) -> list:
+    return [json.loads(message) for _, message in db.info.get("pending_events", [])]
+
+
+def write_all(post_status: str) -> Session:
+    db = Session(post_status)
+    crud.create_impact(db, schemas.ImpactCreate(
+        title=IMPACT.title, description=IMPACT.description, date=IMPACT.date,
+        type=IMPACT.type, status=IMPACT.status, post_id=IMPACT.post_id,
+    ))
+    crud.update_impact(db, IMPACT.id, schemas.ImpactUpdate(status="completed"))
+    crud.delete_impact(db, IMPACT.id)
+    return db
+
+
+def test_impacts_of_a_published_post_are_announced():
+    db = write_all("published")
+
+    assert [event["type"] for event in emitted(db)] == ["impact.created", "impact.updated", "impact.deleted"]
+    # The impact's own type travels separately and does not replace the event type
+    assert emitted(db)[0]["impact_type"] == "investigation"
+
+
+def test_impacts_of_a_draft_stay_silent():
+    assert emitted(write_all("draft")) == []
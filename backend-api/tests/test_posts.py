@@ -0,0 +1,52 @@
+"""Which events a post update announces; the session is stubbed, so no database is needed"""
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app import cache, crud, models, schemas
+
+
+class Session:
+    """Answers the UPDATE ... RETURNING with the post and its status before the update"""
+
+    def __init__(self, post: models.Post, previous_status: str):
+        self.row = (post, previous_status)
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return self
+
+    def first(self):
+        return self.row
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture
+def announced(monkeypatch):
+    calls = []
+    monkeypatch.setattr(cache, "invalidate", lambda db, *tags: None)
+    monkeypatch.setattr(crud, "emit", lambda db, event_type, **data: calls.append(event_type))
+    monkeypatch.setattr(crud, "_enqueue_published", lambda db, db_post: calls.append("outbox"))
+    return calls
+
+
+def save(previous_status: str) -> Session:
+    post = models.Post(id=1, slug="leaked-memo", title="Leaked memo", status="published")
+    db = Session(post, previous_status)
+    crud.update_post(db, 1, schemas.PostUpdate(content="Edited", status="published"))
+    return db
+
+
+def test_publishing_a_draft_announces_it(announced):
+    db = save("draft")
+
+    assert announced == ["post.published", "outbox"]
+    assert "FOR UPDATE) AS previous" in db.statements[0]
+
+
+def test_saving_a_published_post_does_not_publish_it_again(announced):
+    save("published")
+
+    assert announced == ["post.updated"]
@@ -0,0 +1,57 @@
+"""The in-process token buckets, on a fake clock"""
+import pytest
+
+from app import ratelimit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_allows_bursts_then_refills(clock):
+    backend = ratelimit.MemoryBackend()
+    rule = ratelimit.Rule("test", "2/10")
+
+    assert backend.take(rule, "a") == 0
+    assert backend.take(rule, "a") == 0
+    assert backend.take(rule, "a") == pytest.approx(5)
+    clock[0] += 5
+    assert backend.take(rule, "a") == 0
+
+
+def test_refilled_buckets_are_dropped_a_few_per_take(clock):
+    backend = ratelimit.MemoryBackend()
+    rule = ratelimit.Rule("test", "2/10")
+    for i in range(10):
+        backend.take(rule, f"old-{i}")
+    clock[0] += 10
+
+    backend.take(rule, "new")
+    assert len(backend._buckets["test"]) == 11 - backend.PRUNE_PER_TAKE
+    for i in range(10):
+        backend.take(rule, f"new-{i}")
+    assert all(not key.startswith("old") for key in backend._buckets["test"])
+
+
+def test_recently_used_buckets_survive_pruning(clock):
+    backend = ratelimit.MemoryBackend()
+    rule = ratelimit.Rule("test", "1/10")
+    backend.take(rule, "limited")
+    clock[0] += 9
+    for i in range(5):
+        backend.take(rule, f"other-{i}")
+
+    assert backend.take(rule, "limited") == pytest.approx(1)
+
+
+def test_size_is_bounded(clock):
+    backend = ratelimit.MemoryBackend(max_keys=100)
+    rule = ratelimit.Rule("test", "1/3600")
+    for i in range(1000):
+        backend.take(rule, str(i))
+
+    assert len(backend._buckets["test"]) == 100
+    assert "999" in backend._buckets["test"] and "0" not in backend._buckets["test"]
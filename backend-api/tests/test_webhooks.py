@@ -0,0 +1,177 @@
+"""
+Dispatch rounds against the stand-in receiver (webhooks.start_receiver).
+
+The claim is stubbed and the write-back runs against a session that records
+its statements, so these need no database; everything in between — signing,
+the HTTP requests, the receiver's verification — is real.
+"""
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app import models, webhooks
+
+SECRET = "partner-secret"
+
+
+class RecordingSession:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def execute(self, statement):
+        self.statements.append(statement)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(webhooks, "SessionLocal", lambda: RecordingSession(recorded))
+    return recorded
+
+
+def make_webhook(**overrides) -> models.Webhook:
+    values = dict(
+        id=1, url="", secret=SECRET, event_types=["post.published"], batch_size=1,
+        max_concurrency=2, is_active=True, consecutive_failures=0,
+    )
+    values.update(overrides)
+    return models.Webhook(**values)
+
+
+def make_deliveries(count: int, attempts: int = 1):
+    return [
+        models.WebhookDelivery(
+            id=i, webhook_id=1, event_key=f"post.published:{i}", event_type="post.published",
+            payload={"id": i, "title": f"Post {i}"}, attempts=attempts,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def dispatch(monkeypatch, webhook, deliveries, **receiver_options):
+    """One dispatch round of `deliveries` to a fresh receiver; returns what it accepted"""
+    async def round_trip():
+        runner, url, received = await webhooks.start_receiver(SECRET, **receiver_options)
+        webhook.url = url
+        monkeypatch.setattr(webhooks, "_claim", lambda limit: (deliveries, {webhook.id: webhook}))
+        try:
+            assert await webhooks.dispatch_due() == len(deliveries)
+        finally:
+            await webhooks.close()
+            await runner.cleanup()
+        return received
+
+    return asyncio.run(round_trip())
+
+
+def updates(statements, table):
+    """Bound values of the UPDATEs recorded against `table`"""
+    return [
+        statement.compile(dialect=postgresql.dialect()).params
+        for statement in statements
+        if statement.table.name == table
+    ]
+
+
+def test_signature_round_trip():
+    body = b'{"id":1}'
+    now = int(time.time())
+    header = webhooks.sign(SECRET, now, body)
+
+    assert webhooks.verify_signature(SECRET, header, body)
+    assert not webhooks.verify_signature(SECRET, header, b'{"id":2}')
+    assert not webhooks.verify_signature("other-secret", header, body)
+    assert not webhooks.verify_signature(SECRET, webhooks.sign(SECRET, now - 600, body), body)
+    assert not webhooks.verify_signature(SECRET, "garbage", body)
+
+
+def test_signed_deliveries_are_accepted(monkeypatch, statements):
+    received = dispatch(monkeypatch, make_webhook(), make_deliveries(3))
+
+    assert sorted(document["data"]["id"] for document in received) == [1, 2, 3]
+    delivered, webhook = updates(statements, "webhook_deliveries"), updates(statements, "webhooks")
+    assert delivered[0]["status"] == "delivered"
+    assert sorted(delivered[0]["id_1"]) == [1, 2, 3]
+    assert webhook[0]["consecutive_failures"] == 0
+
+
+def test_batching_sends_the_envelope(monkeypatch, statements):
+    received = dispatch(monkeypatch, make_webhook(batch_size=2), make_deliveries(3))
+
+    assert sorted(len(document["events"]) for document in received) == [1, 2]
+
+
+def test_bad_signature_is_a_failure(monkeypatch, statements):
+    received = dispatch(monkeypatch, make_webhook(secret="rotated-secret"), make_deliveries(1))
+
+    assert received == []
+    retry = updates(statements, "webhook_deliveries")[0]
+    assert retry["last_error"] == "HTTP 401"
+
+
+def test_failures_are_retried_with_backoff(monkeypatch, statements):
+    deliveries = make_deliveries(1, attempts=1) + make_deliveries(2, attempts=3)[1:]
+    dispatch(monkeypatch, make_webhook(), deliveries, fail_every=1, status=503)
+
+    retries = {params["id_1"][0]: params for params in updates(statements, "webhook_deliveries")}
+    for delivery_id, attempts in ((1, 1), (2, 3)):
+        assert retries[delivery_id]["last_error"] == "HTTP 503"
+        assert "status" not in retries[delivery_id]
+        assert timedelta(seconds=webhooks.retry_delay(attempts)) in retries[delivery_id].values()
+    assert webhooks.retry_delay(3) == 4 * webhooks.retry_delay(1)
+    assert webhooks.retry_delay(100) == 6 * 3600
+
+    webhook = updates(statements, "webhooks")[0]
+    assert webhook["last_error"] == "HTTP 503"
+    assert "is_active" not in webhook  # decided in SQL against the running failure count
+
+
+def test_retry_succeeds_once_the_receiver_recovers(monkeypatch, statements):
+    webhook, deliveries = make_webhook(max_concurrency=1), make_deliveries(1)
+    assert dispatch(monkeypatch, webhook, deliveries, fail_every=1) == []
+
+    deliveries[0].attempts += 1
+    received = dispatch(monkeypatch, webhook, deliveries)
+
+    assert [document["data"]["id"] for document in received] == [1]
+    assert updates(statements, "webhook_deliveries")[-1]["status"] == "delivered"
+
+
+def test_last_attempt_is_dead_lettered(monkeypatch, statements):
+    dispatch(monkeypatch, make_webhook(), make_deliveries(1, attempts=webhooks.WEBHOOK_MAX_ATTEMPTS), fail_every=1)
+
+    dead = updates(statements, "webhook_deliveries")[0]
+    assert dead["status"] == "failed"
+    assert not any(isinstance(value, timedelta) for value in dead.values())
+
+
+def test_gone_disables_the_endpoint(monkeypatch, statements):
+    dispatch(monkeypatch, make_webhook(), make_deliveries(1), fail_every=1, status=410)
+
+    webhook = updates(statements, "webhooks")[0]
+    assert webhook["is_active"] is False
+    assert webhook["last_error"] == "HTTP 410"
+
+
+def test_claim_limit_fits_in_the_lease(monkeypatch):
+    monkeypatch.setattr(webhooks, "WEBHOOK_LEASE_SECONDS", 300)
+    monkeypatch.setattr(webhooks, "WEBHOOK_TIMEOUT_SECONDS", 10.0)
+    webhook = make_webhook(max_concurrency=2, batch_size=5)
+
+    limit = webhooks.endpoint_claim_limit(webhook)
+    assert limit == 29 * 2 * 5
+    # Every request timing out, one slot after another, still ends inside the lease
+    requests = limit / webhook.batch_size / webhook.max_concurrency
+    assert requests * webhooks.WEBHOOK_TIMEOUT_SECONDS < webhooks.WEBHOOK_LEASE_SECONDS
+
+    monkeypatch.setattr(webhooks, "WEBHOOK_LEASE_SECONDS", 5)
+    assert webhooks.endpoint_claim_limit(webhook) == 2 * 5
@@ -0,0 +1,25 @@
+"""Outbox batches keep their leases while handlers run; claims and records are stubbed"""
+import asyncio
+from types import SimpleNamespace
+
+from app import outbox, worker
+
+
+def test_leases_are_renewed_during_a_long_handler(monkeypatch):
+    event = SimpleNamespace(id=1, event_type="post.published", payload={}, completed_handlers=[], attempts=1)
+    extended, recorded = [], []
+
+    async def fan_out(payload):
+        await asyncio.sleep(0.2)
+
+    monkeypatch.setattr(worker, "OUTBOX_HEARTBEAT_SECONDS", 0.05)
+    monkeypatch.setattr(worker, "_claim", lambda limit: [event])
+    monkeypatch.setattr(worker, "_extend", lambda events: extended.append([e.id for e in events]) or len(events))
+    monkeypatch.setattr(worker, "_record", recorded.extend)
+    monkeypatch.setattr(outbox, "handlers_for", lambda event_type: [fan_out])
+
+    assert asyncio.run(worker.run_batch()) == 1
+
+    assert len(extended) >= 2
+    assert set(map(tuple, extended)) == {(1,)}
+    assert [(outcome[0].id, outcome[2]) for outcome in recorded] == [(1, None)]
@@ -0,0 +1,167 @@
+"""
+How many statements each post and impact write sends to Postgres.
+
+The writes are built to take a fixed, small number of round trips (one
+UPDATE ... RETURNING rather than a SELECT and an UPDATE, and so on); these
+tests count the statements with a before_cursor_execute listener so that a
+change adding a query shows up here. They need a scratch Postgres database,
+whose tables they create and empty:
+
+    TEST_DATABASE_URL=postgresql://localhost/lexleaks_test pytest tests/test_write_statements.py
+"""
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event, insert, text
+
+from app import cache, crud, events, models, schemas
+from app.database import SessionLocal
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine(TEST_DATABASE_URL)
+    models.Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine, monkeypatch):
+    # Invalidations and events stay in process, so they add no NOTIFY statements
+    monkeypatch.setattr(cache, "CACHE_BUS", "memory")
+    monkeypatch.setattr(events, "EVENTS_BACKEND", "memory")
+    tables = ", ".join(table.name for table in models.Base.metadata.sorted_tables)
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+    session = SessionLocal(bind=engine)
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def author_id(db):
+    author_id = db.scalar(insert(models.User).values(username="reporter", hashed_password="x").returning(models.User.id))
+    db.commit()
+    return author_id
+
+
+@contextmanager
+def counting(engine):
+    """Collects the first word of each statement sent while the block runs"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split(None, 1)[0].upper())
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def new_post(title: str = "Leaked memo", status: str = "published") -> schemas.PostCreate:
+    return schemas.PostCreate(title=title, content="Body", excerpt="Excerpt", status=status, category="corporate")
+
+
+def new_impact(post_id: int) -> schemas.ImpactCreate:
+    return schemas.ImpactCreate(
+        title="Inquiry opened", description="An inquiry was opened", date=datetime(2026, 10, 1),
+        type="investigation", status="pending", post_id=post_id,
+    )
+
+
+def test_create_draft(engine, db, author_id):
+    with counting(engine) as statements:
+        crud.create_post(db, new_post(status="draft"), author_id)
+
+    # Free slug lookup, INSERT ... ON CONFLICT DO NOTHING RETURNING
+    assert statements == ["SELECT", "INSERT"]
+
+
+def test_create_published_post_enqueues_its_event(engine, db, author_id):
+    with counting(engine) as statements:
+        crud.create_post(db, new_post(), author_id)
+
+    # ...and the outbox row, in the same transaction
+    assert statements == ["SELECT", "INSERT", "INSERT"]
+
+
+def test_create_post_with_a_taken_slug(engine, db, author_id):
+    crud.create_post(db, new_post(status="draft"), author_id)
+
+    with counting(engine) as statements:
+        db_post = crud.create_post(db, new_post(status="draft"), author_id)
+
+    assert db_post.slug == "leaked-memo-1"
+    assert statements == ["SELECT", "INSERT"]
+
+
+def test_update_post(engine, db, author_id):
+    post_id = crud.create_post(db, new_post(status="draft"), author_id).id
+
+    with counting(engine) as statements:
+        crud.update_post(db, post_id, schemas.PostUpdate(content="Edited"), author_id=author_id)
+
+    # One UPDATE ... RETURNING, with the ownership check in its WHERE clause
+    assert statements == ["UPDATE"]
+
+
+def test_update_post_title_and_publish(engine, db, author_id):
+    post_id = crud.create_post(db, new_post(status="draft"), author_id).id
+
+    with counting(engine) as statements:
+        crud.update_post(db, post_id, schemas.PostUpdate(title="New title", status="published"), author_id=author_id)
+
+    assert statements == ["SELECT", "UPDATE", "INSERT"]
+
+
+def test_update_post_of_another_author(engine, db, author_id):
+    post_id = crud.create_post(db, new_post(status="draft"), author_id).id
+
+    with counting(engine) as statements:
+        assert crud.update_post(db, post_id, schemas.PostUpdate(content="Edited"), author_id=author_id + 1) is None
+
+    assert statements == ["UPDATE"]
+
+
+def test_delete_post(engine, db, author_id):
+    post_id = crud.create_post(db, new_post(), author_id).id
+
+    with counting(engine) as statements:
+        assert crud.delete_post(db, post_id, author_id=author_id)
+
+    # DELETE ... RETURNING and the tombstone INSERT, as CTEs of one statement
+    assert statements == ["WITH"]
+
+
+def test_impact_writes(engine, db, author_id):
+    post_id = crud.create_post(db, new_post(), author_id).id
+
+    with counting(engine) as created:
+        impact_id = crud.create_impact(db, new_impact(post_id)).id
+    with counting(engine) as updated:
+        crud.update_impact(db, impact_id, schemas.ImpactUpdate(status="completed"))
+    with counting(engine) as deleted:
+        assert crud.delete_impact(db, impact_id)
+
+    # INSERT ... RETURNING (the post_id foreign key is the existence check), then the
+    # outbox row; the post's publication check for webhooks happens later, in the worker
+    assert created == ["INSERT", "INSERT"]
+    assert updated == ["UPDATE"]
+    assert deleted == ["WITH"]
+
+
+def test_create_impact_for_a_missing_post(engine, db, author_id):
+    with counting(engine) as statements:
+        with pytest.raises(ValueError):
+            crud.create_impact(db, new_impact(post_id=999))
+
+    assert statements == ["INSERT"]
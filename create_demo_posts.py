@@ -293,61 +293,45 @@ def get_auth_token():
         return None
 
 def create_posts(token):
-    """Create demo posts"""
+    """Create demo posts with a single bulk import request"""
     headers = {
         "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
+        "Content-Type": "application/x-ndjson"
     }
     
-    created_count = 0
-    
+    # One NDJSON line per post; published_at is set in the same request
+    lines = []
     for post_data in DEMO_POSTS:
-        # Prepare the post data
         post_payload = {
             "title": post_data["title"],
-            "slug": post_data["slug"],
             "excerpt": post_data["excerpt"],
             "content": post_data["content"],
             "status": post_data["status"]
         }
-        
-        # Create the post
-        response = requests.post(
-            f"{API_BASE_URL}/api/posts/",
-            headers=headers,
-            json=post_payload
-        )
-        
-        if response.status_code == 201 or response.status_code == 200:
-            try:
-                created_post = response.json()
-                print(f"✓ Created post: {post_data['title']}")
-                
-                # If the post should be published and has a published_at date, update it
-                if post_data["status"] == "published" and "published_at" in post_data:
-                    update_payload = {
-                        "published_at": post_data["published_at"].isoformat()
-                    }
-                    update_response = requests.put(
-                        f"{API_BASE_URL}/api/posts/{created_post['id']}",
-                        headers=headers,
-                        json=update_payload
-                    )
-                    if update_response.status_code == 200:
-                        print(f"  → Set published date for post")
-                    else:
-                        print(f"  → Failed to update published date: {update_response.status_code}")
-                
-                created_count += 1
-            except Exception as e:
-                print(f"✗ Failed to parse response for: {post_data['title']}")
-                print(f"  Error: {str(e)}")
-                print(f"  Response: {response.text}")
+        if post_data["status"] == "published" and "published_at" in post_data:
+            post_payload["published_at"] = post_data["published_at"].isoformat()
+        lines.append(json.dumps(post_payload))
+    
+    response = requests.post(
+        f"{API_BASE_URL}/api/posts/import",
+        headers=headers,
+        data="\n".join(lines).encode("utf-8")
+    )
+    
+    if response.status_code != 200:
+        print(f"✗ Bulk import failed: {response.status_code} - {response.text}")
+        return 0
+    
+    summary = response.json()
+    for result in summary["results"]:
+        title = DEMO_POSTS[result["line"] - 1]["title"]
+        if result["status"] == "created":
+            print(f"✓ Created post: {title}")
         else:
-            print(f"✗ Failed to create post: {post_data['title']}")
-            print(f"  Error: {response.status_code} - {response.text}")
+            print(f"✗ Failed to create post: {title}")
+            print(f"  Error: {result['error']}")
     
-    return created_count
+    return summary["created"]
 
 def main():
     print("=== LexLeaks Demo Posts Creator ===\n")
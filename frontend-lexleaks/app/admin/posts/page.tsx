@@ -3,7 +3,7 @@
 import { useState, useEffect } from 'react'
 import Link from 'next/link'
 import { format } from 'date-fns'
-import { getAllPosts, deletePost, PostSummary } from '@/lib/api'
+import { getAllPosts, deletePost, bulkPostAction, PostBulkActionData, PostSummary } from '@/lib/api'
 import { useRouter } from 'next/navigation'
 
 export default function AdminPostsPage() {
@@ -12,6 +12,8 @@ export default function AdminPostsPage() {
   const [loading, setLoading] = useState(true)
   const [filter, setFilter] = useState<'all' | 'published' | 'draft' | 'archived'>('all')
   const [deleting, setDeleting] = useState<number | null>(null)
+  const [selected, setSelected] = useState<Set<number>>(new Set())
+  const [bulkRunning, setBulkRunning] = useState(false)
 
   useEffect(() => {
     fetchPosts()
@@ -43,11 +45,48 @@ export default function AdminPostsPage() {
     }
   }
 
+  const toggleSelected = (id: number) => {
+    setSelected(prev => {
+      const next = new Set(prev)
+      if (next.has(id)) {
+        next.delete(id)
+      } else {
+        next.add(id)
+      }
+      return next
+    })
+  }
+
+  const handleBulkAction = async (action: PostBulkActionData['action']) => {
+    if (selected.size === 0) return
+    if (action === 'delete' && !confirm(`Delete ${selected.size} selected posts?`)) return
+
+    setBulkRunning(true)
+    try {
+      const request: PostBulkActionData = { action, ids: Array.from(selected) }
+      if (action === 'verify') request.verification_status = 'unverified'
+      await bulkPostAction(request)
+      setSelected(new Set())
+      await fetchPosts() // Refresh the list
+    } catch (error) {
+      console.error(`Failed to ${action} posts:`, error)
+      alert(`Failed to ${action} posts`)
+    } finally {
+      setBulkRunning(false)
+    }
+  }
+
   const filteredPosts = posts.filter(post => {
     if (filter === 'all') return true
     return post.status === filter
   })
 
+  const allVisibleSelected = filteredPosts.length > 0 && filteredPosts.every(post => selected.has(post.id))
+
+  const toggleAllVisible = () => {
+    setSelected(allVisibleSelected ? new Set() : new Set(filteredPosts.map(post => post.id)))
+  }
+
   if (loading) {
     return (
       <div className="min-h-screen brand-bg p-8">
@@ -135,6 +174,25 @@ export default function AdminPostsPage() {
           </div>
         </div>
 
+        {/* Bulk Actions */}
+        {selected.size > 0 && (
+          <div className="bg-white rounded-lg shadow-sm mb-6 px-6 py-3 flex items-center gap-3">
+            <span className="text-sm text-gray-600">{selected.size} selected</span>
+            <button onClick={() => handleBulkAction('publish')} disabled={bulkRunning} className="text-sm text-green-700 hover:text-green-900 disabled:opacity-50">
+              Publish
+            </button>
+            <button onClick={() => handleBulkAction('archive')} disabled={bulkRunning} className="text-sm text-gray-700 hover:text-gray-900 disabled:opacity-50">
+              Archive
+            </button>
+            <button onClick={() => handleBulkAction('verify')} disabled={bulkRunning} className="text-sm text-indigo-600 hover:text-indigo-900 disabled:opacity-50">
+              Re-verify
+            </button>
+            <button onClick={() => handleBulkAction('delete')} disabled={bulkRunning} className="text-sm text-red-600 hover:text-red-900 disabled:opacity-50">
+              Delete
+            </button>
+          </div>
+        )}
+
         {/* Posts Table */}
         <div className="bg-white rounded-lg shadow-sm overflow-hidden">
           {filteredPosts.length === 0 ? (
@@ -145,6 +203,14 @@ export default function AdminPostsPage() {
             <table className="min-w-full divide-y divide-gray-200">
               <thead className="bg-gray-50">
                 <tr>
+                  <th className="pl-6 py-3 text-left">
+                    <input
+                      type="checkbox"
+                      checked={allVisibleSelected}
+                      onChange={toggleAllVisible}
+                      aria-label="Select all posts"
+                    />
+                  </th>
                   <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
                     Title
                   </th>
@@ -165,6 +231,14 @@ export default function AdminPostsPage() {
               <tbody className="bg-white divide-y divide-gray-200">
                 {filteredPosts.map((post) => (
                   <tr key={post.id} className="hover:bg-gray-50">
+                    <td className="pl-6 py-4">
+                      <input
+                        type="checkbox"
+                        checked={selected.has(post.id)}
+                        onChange={() => toggleSelected(post.id)}
+                        aria-label={`Select ${post.title}`}
+                      />
+                    </td>
                     <td className="px-6 py-4">
                       <div>
                         <div className="text-sm font-medium text-gray-900">
@@ -8,6 +8,15 @@ import 'react-pdf/dist/Page/TextLayer.css'
 // Set up the worker
 pdfjs.GlobalWorkerOptions.workerSrc = `//unpkg.com/pdfjs-dist@${pdfjs.version}/build/pdf.worker.min.js`
 
+// Fetch only the byte ranges of the pages being viewed instead of the whole file
+// (needs a server that answers Range requests, like /api/documents/{id}/content).
+// Defined once so react-pdf does not reload the document on every render.
+const PDF_OPTIONS = {
+  disableAutoFetch: true,
+  disableStream: true,
+  rangeChunkSize: 65536,
+}
+
 export interface Redaction {
   id: string
   page: number
@@ -423,6 +432,7 @@ export default function DocumentViewer({
         <div className="flex justify-center p-4">
           <Document
             file={documentUrl}
+            options={PDF_OPTIONS}
             onLoadSuccess={onDocumentLoadSuccess}
             onLoadError={onDocumentLoadError}
             loading={null}
@@ -1,5 +1,6 @@
 import Link from 'next/link'
 import { format } from 'date-fns'
+import { apiUrl } from '@/lib/api'
 
 interface PostCardProps {
   post: {
@@ -18,6 +19,7 @@ interface PostCardProps {
       username: string
     }
     impact_count?: number
+    preview_url?: string | null
   }
   showStatus?: boolean
 }
@@ -35,6 +37,20 @@ const categoryColors: Record<string, string> = {
 export default function PostCard({ post, showStatus = false }: PostCardProps) {
   return (
     <article className="bg-white dark:bg-gray-800 rounded-xl shadow-sm border border-gray-200 dark:border-gray-700 hover:shadow-md transition-shadow">
+      {post.preview_url && (
+        <Link href={`/${post.slug}`} aria-hidden="true" tabIndex={-1}>
+          {/* One small cached image rendered by the server; the document itself is not fetched */}
+          <img
+            src={apiUrl(post.preview_url)}
+            alt=""
+            width={320}
+            height={160}
+            loading="lazy"
+            decoding="async"
+            className="w-full h-40 object-cover object-top rounded-t-xl border-b border-gray-200 dark:border-gray-700 bg-gray-100 dark:bg-gray-900"
+          />
+        </Link>
+      )}
       <div className="p-6">
         <div className="flex items-center justify-between mb-3">
           <div className="flex items-center text-sm text-gray-500 dark:text-gray-400">
@@ -48,7 +48,8 @@ export function useBackgroundSync(options: BackgroundSyncOptions = {}) {
     const db = await openDB()
     const tx = db.transaction('pending-submissions', 'readwrite')
     const store = tx.objectStore('pending-submissions')
-    await store.add({ data, timestamp: Date.now() })
+    // Sent as the Idempotency-Key of every attempt; autoincrement ids are reused after a reset
+    await store.add({ data, timestamp: Date.now(), idempotencyKey: crypto.randomUUID() })
   }
 
   const checkPendingSync = async () => {
@@ -25,6 +25,7 @@ export interface PostSummary {
   created_at: string
   published_at?: string
   impact_count?: number
+  preview_url?: string | null  // API path of a first-page image of the post's document
 }
 
 export interface Post extends PostSummary {
@@ -34,6 +35,8 @@ export interface Post extends PostSummary {
 export interface AuthResponse {
   access_token: string
   token_type: string
+  refresh_token?: string
+  expires_in?: number
   user: User
 }
 
@@ -87,27 +90,74 @@ const setAuthToken = (token: string): void => {
 const removeAuthToken = (): void => {
   if (typeof window !== 'undefined') {
     localStorage.removeItem('auth_token')
+    localStorage.removeItem('refresh_token')
   }
 }
 
+const getRefreshToken = (): string | null => {
+  if (typeof window === 'undefined') return null
+  return localStorage.getItem('refresh_token')
+}
+
+const storeTokens = (data: { access_token: string; refresh_token?: string }): void => {
+  setAuthToken(data.access_token)
+  if (data.refresh_token && typeof window !== 'undefined') {
+    localStorage.setItem('refresh_token', data.refresh_token)
+  }
+}
+
+// Refresh tokens work once, so concurrent 401s share a single refresh
+let refreshing: Promise<boolean> | null = null
+
+const refreshAccessToken = (): Promise<boolean> => {
+  const refreshToken = getRefreshToken()
+  if (!refreshToken) return Promise.resolve(false)
+  if (!refreshing) {
+    refreshing = fetch(`${API_BASE_URL}/api/auth/refresh`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    })
+      .then(async (response) => {
+        if (!response.ok) {
+          if (response.status === 401) removeAuthToken()
+          return false
+        }
+        storeTokens(await response.json())
+        return true
+      })
+      .catch(() => false)
+      .finally(() => {
+        refreshing = null
+      })
+  }
+  return refreshing
+}
+
 // API request helper
 const apiRequest = async (
   endpoint: string,
-  options: RequestInit = {}
+  options: RequestInit = {},
+  retried = false
 ): Promise<any> => {
   const token = getAuthToken()
   
   const config: RequestInit = {
+    ...options,
     headers: {
       'Content-Type': 'application/json',
       ...(token && { Authorization: `Bearer ${token}` }),
       ...options.headers,
     },
-    ...options,
   }
 
   const response = await fetch(`${API_BASE_URL}${endpoint}`, config)
   
+  // An expired access token is renewed with the refresh token, then the request is retried once
+  if (response.status === 401 && token && !retried && await refreshAccessToken()) {
+    return apiRequest(endpoint, options, true)
+  }
+  
   if (!response.ok) {
     const errorData = await response.json().catch(() => ({}))
     throw new Error(errorData.detail || `HTTP error! status: ${response.status}`)
@@ -138,11 +188,20 @@ export const login = async (username: string, password: string): Promise<AuthRes
   }
 
   const data = await response.json()
-  setAuthToken(data.access_token)
+  storeTokens(data)
   return data
 }
 
 export const logout = (): void => {
+  const refreshToken = getRefreshToken()
+  if (refreshToken) {
+    // End the session server-side too; the local tokens are dropped either way
+    fetch(`${API_BASE_URL}/api/auth/logout`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    }).catch(() => {})
+  }
   removeAuthToken()
 }
 
@@ -185,6 +244,17 @@ export const getPostBySlug = async (slug: string): Promise<Post> => {
   return apiRequest(`/api/posts/slug/${slug}`)
 }
 
+// Fetch several posts in one round trip; unknown ids/slugs are skipped
+export const getPostsBatch = async (params: {
+  ids?: number[]
+  slugs?: string[]
+}): Promise<Post[]> => {
+  return apiRequest('/api/posts/batch', {
+    method: 'POST',
+    body: JSON.stringify({ ids: params.ids || [], slugs: params.slugs || [] }),
+  })
+}
+
 export const getAllPosts = async (params: {
   limit?: number
   skip?: number
@@ -236,6 +306,30 @@ export const deletePost = async (id: number): Promise<void> => {
   // So we don't try to parse JSON
 }
 
+export interface PostBulkActionData {
+  action: 'publish' | 'archive' | 'draft' | 'verify' | 'delete'
+  verification_status?: 'unverified' | 'verified' | 'disputed'
+  ids?: number[]
+  filter?: {
+    status?: 'draft' | 'published' | 'archived'
+    verification_status?: 'unverified' | 'verified' | 'disputed'
+    category?: string
+    author_id?: number
+    created_before?: string
+    updated_before?: string
+  }
+}
+
+// Apply one action to many posts with a single request; returns how many matched
+export const bulkPostAction = async (
+  data: PostBulkActionData
+): Promise<{ action: string; matched: number }> => {
+  return apiRequest('/api/posts/bulk', {
+    method: 'POST',
+    body: JSON.stringify(data),
+  })
+}
+
 // Admin utilities
 export const isLoggedIn = (): boolean => {
   return getAuthToken() !== null
@@ -270,6 +364,27 @@ export const getImpacts = async (params: {
   return apiRequest(endpoint)
 }
 
+// Fetch the impacts of several posts in one round trip, keyed by post id
+export const getImpactsByPosts = async (
+  postIds: number[],
+  limit: number = 1000
+): Promise<Record<number, Impact[]>> => {
+  const grouped: Record<number, Impact[]> = {}
+  postIds.forEach((id) => { grouped[id] = [] })
+  if (postIds.length === 0) return grouped
+
+  const queryParams = new URLSearchParams()
+  queryParams.append('post_ids', postIds.join(','))
+  queryParams.append('limit', limit.toString())
+
+  const impacts: Impact[] = await apiRequest(`/api/impacts/?${queryParams.toString()}`)
+  impacts.forEach((impact) => {
+    if (!grouped[impact.post_id]) grouped[impact.post_id] = []
+    grouped[impact.post_id].push(impact)
+  })
+  return grouped
+}
+
 export const getImpact = async (id: number): Promise<Impact> => {
   return apiRequest(`/api/impacts/${id}`)
 }
@@ -292,4 +407,147 @@ export const deleteImpact = async (id: number): Promise<void> => {
   return apiRequest(`/api/impacts/${id}`, {
     method: 'DELETE',
   })
-} 
\ No newline at end of file
+} 
+// Live updates (Server-Sent Events)
+export type LiveEventType =
+  | 'post.published'
+  | 'post.updated'
+  | 'post.deleted'
+  | 'posts.changed'
+  | 'impact.created'
+  | 'impact.updated'
+  | 'impact.deleted'
+  | 'impacts.changed'
+
+export interface LiveEvent {
+  type: LiveEventType
+  id?: number
+  post_id?: number
+  [key: string]: any
+}
+
+// Subscribe to live post/impact updates instead of re-polling listings.
+// Returns a function that closes the connection.
+export const subscribeToUpdates = (onEvent: (event: LiveEvent) => void): (() => void) => {
+  const source = new EventSource(`${API_BASE_URL}/api/stream`)
+  const eventTypes: LiveEventType[] = [
+    'post.published', 'post.updated', 'post.deleted', 'posts.changed',
+    'impact.created', 'impact.updated', 'impact.deleted', 'impacts.changed',
+  ]
+  eventTypes.forEach((type) => {
+    source.addEventListener(type, (message) => {
+      onEvent(JSON.parse((message as MessageEvent).data))
+    })
+  })
+  return () => source.close()
+}
+
+// Incremental change feed (offline sync)
+export interface ChangeEntry {
+  entity: 'post' | 'impact'
+  op: 'upsert' | 'delete'
+  id: number
+  changed_at: string
+  post?: Post
+  impact?: Impact
+}
+
+export interface ChangeFeed {
+  changes: ChangeEntry[]
+  next_token: string | null
+  has_more: boolean
+}
+
+// Fetch one page of changes after `since` (omit for a full sync); keep calling
+// with next_token while has_more is true, then persist the last token.
+export const getChanges = async (since?: string | null, limit: number = 500): Promise<ChangeFeed> => {
+  const queryParams = new URLSearchParams()
+  if (since) queryParams.append('since', since)
+  queryParams.append('limit', limit.toString())
+  return apiRequest(`/api/changes?${queryParams.toString()}`)
+}
+
+// Batched mutations (replaying queued offline actions)
+export interface BatchOperation {
+  op: 'create' | 'update' | 'delete'
+  entity: 'post' | 'impact'
+  id?: number
+  data?: PostCreateData | PostUpdateData | ImpactCreateData | ImpactUpdateData
+}
+
+export interface BatchOperationResult {
+  index: number
+  status: number
+  data?: Post | Impact
+  error?: string
+}
+
+// Send queued operations in order with one request and one commit.
+// With atomic=false each operation succeeds or fails on its own.
+// Pass the same idempotencyKey when retrying so a batch is never applied twice.
+export const runBatch = async (
+  operations: BatchOperation[],
+  atomic: boolean = false,
+  idempotencyKey?: string
+): Promise<{ committed: boolean; results: BatchOperationResult[] }> => {
+  return apiRequest('/api/batch', {
+    method: 'POST',
+    headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : undefined,
+    body: JSON.stringify({ operations, atomic }),
+  })
+}
+
+// Documents and their redactions. Redactions are burned into a copy of the
+// document on the server; readers only ever get that copy.
+export interface StoredDocument {
+  id: number
+  sha256: string | null  // of the file readers get; null while its redacted copy is rendered
+  size: number | null
+  redacted: boolean
+  page_count: number | null
+  content_type: string
+  created_at: string
+}
+
+export interface DocumentRedaction {
+  id?: number
+  page: number
+  x: number
+  y: number
+  width: number
+  height: number
+  reason?: string
+}
+
+export interface RedactionSet {
+  document: StoredDocument
+  redactions: DocumentRedaction[]
+  rendition_status: 'none' | 'pending' | 'ready' | 'failed'
+}
+
+// Absolute URL of an API path such as a post's preview_url (an immutable, cacheable image)
+export const apiUrl = (path: string): string => `${API_BASE_URL}${path}`
+
+// Content URL that names the content, so it is cached for good and a new
+// version (e.g. after redaction) is a new URL
+export const documentContentUrl = (document: StoredDocument): string | null => {
+  if (!document.sha256) return null
+  return `${API_BASE_URL}/api/documents/${document.id}/content?v=${document.sha256}`
+}
+
+export const getRedactions = async (documentId: number): Promise<RedactionSet> => {
+  return apiRequest(`/api/documents/${documentId}/redactions`)
+}
+
+// Replaces every box; an empty list removes the redactions
+export const saveRedactions = async (
+  documentId: number,
+  redactions: DocumentRedaction[]
+): Promise<RedactionSet> => {
+  return apiRequest(`/api/documents/${documentId}/redactions`, {
+    method: 'PUT',
+    body: JSON.stringify({
+      redactions: redactions.map(({ page, x, y, width, height, reason }) => ({ page, x, y, width, height, reason })),
+    }),
+  })
+}
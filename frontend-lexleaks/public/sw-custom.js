@@ -30,11 +30,20 @@ async function submitPendingLeaks() {
     
     for (const submission of submissions) {
       try {
+        if (!submission.idempotencyKey) {
+          // Queued before submissions carried their own key: give it one and keep it for retries
+          submission.idempotencyKey = crypto.randomUUID();
+          const keyTx = db.transaction('pending-submissions', 'readwrite');
+          await keyTx.objectStore('pending-submissions').put(submission);
+        }
+
         // Attempt to submit to server
         const response = await fetch('/api/posts', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
+            // Retries of the same queued submission must not create duplicate posts
+            'Idempotency-Key': submission.idempotencyKey,
           },
           body: JSON.stringify(submission.data)
         });